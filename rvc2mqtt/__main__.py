@@ -0,0 +1,54 @@
+"""
+Command line entrypoint
+
+    rvc2mqtt [bridge options]           - run the bridge (default when no subcommand is given)
+    rvc2mqtt replay <log> [options]     - replay a can log thru the pipeline
+    rvc2mqtt simulate [options]         - generate synthetic RV-C traffic
+    rvc2mqtt soak [options]             - long run soak test with memory growth detection
+    rvc2mqtt golden <case>... [options] - compare (or --update) golden output cases
+    rvc2mqtt decode <log>... [options]  - decode can logs to jsonl, csv or parquet
+    rvc2mqtt bench <name> [options]     - benchmarks: decoder, entities, startup and the gate
+
+Each subcommand is the main(argv) of the module named in SUBCOMMANDS.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import importlib
+import sys
+
+# subcommand name -> module with a main(argv) function
+SUBCOMMANDS = {
+    "replay": "rvc2mqtt.replay",
+    "simulate": "rvc2mqtt.simulator",
+    "soak": "rvc2mqtt.soak",
+    "golden": "rvc2mqtt.golden",
+    "decode": "rvc2mqtt.decode",
+    "bench": "rvc2mqtt.benchmark",
+}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        module = importlib.import_module(SUBCOMMANDS[sys.argv[1]])
+        return module.main(sys.argv[2:])
+
+    from rvc2mqtt.app import main as app_main
+    return app_main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
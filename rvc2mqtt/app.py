@@ -31,6 +31,7 @@ import signal
 import time
 import os
 import sys
+import json
 import ruyaml as YAML
 from os import PathLike
 import datetime
@@ -38,11 +39,25 @@ from typing import Optional
 from rvc2mqtt.rvc import RVC_Decoder
 from rvc2mqtt.can_support import CAN_Watcher
 from rvc2mqtt.mqtt import MQTT_Support
+from rvc2mqtt.mqtt_spool import MQTT_Spool
+from rvc2mqtt.metrics import Metrics, MetricsHttpServer
+from rvc2mqtt.latency_trace import LatencyTracer, TracedQueue
+from rvc2mqtt.profiler import ProfilerControl
+from rvc2mqtt.flight_recorder import FlightRecorder, FlightRecorderControl
+from rvc2mqtt.bus_stats import BusStatistics
+from rvc2mqtt.unhandled_census import UnhandledCensus, UnhandledCensusControl
+from rvc2mqtt.watchdog import LoopMonitor, StallWatchdog
+from rvc2mqtt.entity_cpu import EntityCpuAccounting
+from rvc2mqtt.bus_capture import CaptureWriter
+from rvc2mqtt.entity.bus_load import BusLoadSensor
+from rvc2mqtt.trace import Tracer, refresh_tracers
 from rvc2mqtt.plugin_support import PluginSupport
 from rvc2mqtt.mqtt import *
 from rvc2mqtt.entity_factory_support import entity_factory
+from rvc2mqtt.startup_timing import StartupTimer
 
 PATH_TO_FOLDER = os.path.abspath(os.path.dirname(__file__))
+MAIN_LOOP_SLEEP = 0.001
 
 
 def signal_handler(signal, frame):
@@ -54,15 +69,29 @@ def signal_handler(signal, frame):
 
 
 class app(object):
-    def main(self, argsns: argparse.Namespace):
-        """main function.  Sets up the app services, creates
-        the receive thread, and processes messages.
-
-        Runs until kill/term signal is sent
-        """
-
+    def init_pipeline(self, entity_cpu_top: int = 10, bus_trace_sample: int = 1, startup: StartupTimer = None):
+        """ set up the decode and dispatch pipeline (queues, decoder, metrics and
+        tracing) used by message_rx_loop and message_tx_loop.  Shared by the
+        bridge and log replay.  startup times the startup phases (a new timer if None) """
         self.Logger = logging.getLogger("app")
+        self.startup = startup if startup is not None else StartupTimer()
         self.mqtt_client: MQTT_Support = None
+        self.metrics = Metrics()
+        self.latency_tracer = LatencyTracer(self.metrics)
+        self.metrics.add_provider("latency", self.latency_tracer.get_metrics)
+        self.entity_cpu = EntityCpuAccounting(entity_cpu_top)
+        if self.entity_cpu.enabled:
+            self.metrics.add_provider("entity_cpu", self.entity_cpu.get_metrics)
+        self.metrics.add_provider("startup", self.startup.report)
+        self.recorder_control: FlightRecorderControl = None
+        self.unhandled_census = UnhandledCensus()
+        self.unhandled_control: UnhandledCensusControl = None
+        self.entity_list = []
+
+        # Log all rvc bus messages to custom loggers so they can be routed or ignored.
+        # Enabled checks are cached so the per frame cost is near zero when off
+        self.bus_trace = Tracer("rvc_bus_trace", bus_trace_sample)
+        self.unhandled_trace = Tracer("unhandled_rvc")
 
         # make an receive queue of receive can bus messages
         self.rxQueue = queue.Queue()
@@ -71,74 +100,198 @@ class app(object):
         # which can then go thru the app to get encoded
         # and put into the txQueue for the canbus
         # this is a little hacky...so need to revisit
-        self.tx_RVC_Buffer = queue.Queue()
+        # It is traced so messages sent because of an mqtt command record their latency
+        self.tx_RVC_Buffer = TracedQueue(self.latency_tracer)
 
         # make a transmit queue to send can bus messages
         self.txQueue = queue.Queue()
 
-        # thread to receive can bus messages
-        self.receiver = CAN_Watcher(
-            argsns.can_interface, self.rxQueue, self.txQueue)
-        self.receiver.start()
-
         # setup decoder
         self.rvc_decoder = RVC_Decoder()
-        self.rvc_decoder.load_rvc_spec(os.path.join(
-            PATH_TO_FOLDER, 'rvc-spec.yml'))  # load the RVC spec yaml
+        with self.startup.phase("spec_load"):
+            self.rvc_decoder.load_rvc_spec(os.path.join(
+                PATH_TO_FOLDER, 'rvc-spec.yml'))  # load the RVC spec yaml
+
+    def load_entities(self, floorplan: list, plugin_paths: list, entity_factory_list: list = None) -> list:
+        """ create, link and initialize the entities in the floorplan.
+        entity_factory_list is built from the plugins unless given.
+        returns the entity factory list """
+        if entity_factory_list is None:
+            # Enable plugins
+            self.PluginSupport: PluginSupport = PluginSupport(os.path.join(
+                PATH_TO_FOLDER, "entity"), plugin_paths)
+
+            # Use plugins to dynamically prepare the entity factory
+            entity_factory_list = []
+            with self.startup.phase("plugin_register"):
+                self.PluginSupport.register_with_factory_the_entity_plugins(
+                    entity_factory_list)
+
+        # setup entity list using
+        self.entity_list = []
+
+        # initialize objects from the floorplan
+        for item in floorplan:
+            with self.startup.phase("entity_create"):
+                obj = entity_factory(
+                    item, self.mqtt_client, entity_factory_list)
+                if obj is not None:
+                    # add entity links if defined.  This allows one entity to reference another entity
+                    for link in obj.entity_links:
+                        requested_entity = next(filter(lambda entry: entry.link_id == link, self.entity_list), None)
+                        if requested_entity is not None:
+                            obj.add_entity_link(requested_entity)
+
+                    obj.set_rvc_send_queue(self.tx_RVC_Buffer)
+                    if self.mqtt_client is not None and self.mqtt_client.retained_state:
+                        obj.restore_retained_state(self.mqtt_client.retained_state)
+            if obj is not None:
+                with self.startup.phase("entity_initialize"):
+                    obj.initialize()
+                self.entity_list.append(obj)
+        return entity_factory_list
+
+    def main(self, argsns: argparse.Namespace):
+        """main function.  Sets up the app services, creates
+        the receive thread, and processes messages.
+
+        Runs until kill/term signal is sent
+        """
+
+        self.init_pipeline(argsns.entity_cpu_top, argsns.bus_trace_sample, getattr(argsns, "startup", None))
+        self.ha_discovery_rate = argsns.ha_discovery_rate
+        self.ha_discovery_jitter = argsns.ha_discovery_jitter
+        self.metrics_interval = argsns.metrics_interval
+        self._next_metrics_publish = time.monotonic() + self.metrics_interval
+        self.metrics_server = None
+        self.profiler: ProfilerControl = None
+        self.recorder: FlightRecorder = None
+        if argsns.recorder_dir is not None and argsns.recorder_seconds > 0:
+            self.recorder = FlightRecorder(int(argsns.recorder_seconds * FlightRecorder.MAX_FRAMES_PER_SECOND))
+        self.bus_stats: BusStatistics = BusStatistics() if argsns.bus_stats_interval > 0 else None
+        self.bus_load: BusLoadSensor = None
+        self.capture: CaptureWriter = None
+        if argsns.capture_dir is not None:
+            self.capture = CaptureWriter(argsns.capture_dir, argsns.capture_segment_seconds,
+                                         max_segments=argsns.capture_max_segments)
+            self.metrics.add_provider("bus_capture", self.capture.get_metrics)
+
+        # thread to receive can bus messages
+        with self.startup.phase("can_open"):
+            self.receiver = CAN_Watcher(
+                argsns.can_interface, self.rxQueue, self.txQueue, self.metrics, self.recorder, self.bus_stats,
+                self.capture, argsns.can_bustype)
+            self.receiver.start()
+
+        self.metrics.add_gauge("rx_queue_depth", self.rxQueue.qsize)
+        self.metrics.add_gauge("tx_rvc_queue_depth", self.tx_RVC_Buffer.qsize)
+        self.metrics.add_gauge("tx_queue_depth", self.txQueue.qsize)
+        self.metrics.add_gauge("seconds_since_last_frame", self.receiver.seconds_since_last_frame)
+
+        # measure main loop lag and report loops that stop running
+        self.loop_monitor = LoopMonitor("main_loop", self.metrics, MAIN_LOOP_SLEEP)
+        self.watchdog: StallWatchdog = None
+        if argsns.stall_timeout > 0:
+            self.watchdog = StallWatchdog([self.loop_monitor, self.receiver.loop_monitor], self.metrics, argsns.stall_timeout)
+            self.watchdog.start()
+        if argsns.metrics_port > 0:
+            try:
+                self.metrics_server = MetricsHttpServer(self.metrics, argsns.metrics_port)
+                self.metrics_server.start()
+            except Exception as e:
+                self.Logger.error(f"Failed to start metrics server on port {argsns.metrics_port}: {e}")
 
         # setup the mqtt broker connection
         if argsns.mqtt_host is not None:
-            self.mqtt_client = MqttInitalize(
-                argsns.mqtt_host, argsns.mqtt_port, argsns.mqtt_user, argsns.mqtt_pass, argsns.mqtt_client_id, argsns.mqtt_topic_base)
+            spool = None
+            if argsns.mqtt_spool_file is not None:
+                try:
+                    spool = MQTT_Spool(argsns.mqtt_spool_file, argsns.mqtt_spool_max_topics,
+                                       replay_rate=argsns.mqtt_spool_replay_rate)
+                except Exception as e:
+                    self.Logger.error(f"Failed to open mqtt spool {argsns.mqtt_spool_file}: {e}")
+
+            with self.startup.phase("mqtt_connect"):
+                self.mqtt_client = MqttInitalize(
+                    argsns.mqtt_host, argsns.mqtt_port, argsns.mqtt_user, argsns.mqtt_pass, argsns.mqtt_client_id, argsns.mqtt_topic_base,
+                    argsns.mqtt_workers, argsns.mqtt_topic_alias_max, spool)
             if self.mqtt_client:
+                self.mqtt_client.set_metrics(self.metrics)
+                self.mqtt_client.set_latency_tracer(self.latency_tracer)
+                self.mqtt_client.set_cpu_accounting(self.entity_cpu)
                 self.mqtt_client.register(f"{MQTT_Support.HA_AUTO_BASE}/status", self.on_ha_birth_message)
+                self.profiler = ProfilerControl(self.mqtt_client, argsns.profile_dir)
+                if self.recorder is not None:
+                    self.recorder_control = FlightRecorderControl(self.recorder, self.mqtt_client, argsns.recorder_dir,
+                                                                  argsns.can_interface)
                 self.mqtt_client.client.loop_start()
 
-        # Enable plugins
-        self.PluginSupport: PluginSupport = PluginSupport(os.path.join(
-            PATH_TO_FOLDER, "entity"), argsns.plugin_paths)
+                # optionally load our last published state so startup doesn't publish placeholders
+                if argsns.mqtt_bootstrap_timeout > 0:
+                    topic_filters = argsns.mqtt_bootstrap_topics or self.mqtt_client.state_topic_filters()
+                    with self.startup.phase("mqtt_bootstrap"):
+                        self.mqtt_client.bootstrap_retained_state(topic_filters, argsns.mqtt_bootstrap_timeout)
 
-        # Use plugins to dynamically prepare the entity factory
-        entity_factory_list = []
-        self.PluginSupport.register_with_factory_the_entity_plugins(
-            entity_factory_list)
+        entity_factory_list = self.load_entities(argsns.fp, argsns.plugin_paths)
 
-        # setup entity list using
-        self.entity_list = []
+        # built-in bus load entity
+        if self.mqtt_client is not None and self.bus_stats is not None:
+            self.bus_load = BusLoadSensor({"interface": argsns.can_interface, "instance_name": f"{argsns.can_interface} bus"},
+                                          self.mqtt_client, self.bus_stats, argsns.bus_stats_interval)
+            self.bus_load.set_rvc_send_queue(self.tx_RVC_Buffer)
+            self.bus_load.initialize()
 
-        # initialize objects from the floorplan
-        for item in argsns.fp:
-            obj = entity_factory(
-                item, self.mqtt_client, entity_factory_list)
-            if obj is not None:
-                # add entity links if defined.  This allows one entity to reference another entity
-                for link in obj.entity_links:
-                    requested_entity = next(filter(lambda entry: entry.link_id == link, self.entity_list), None)
-                    if requested_entity is not None:
-                        obj.add_entity_link(requested_entity)
-
-                obj.set_rvc_send_queue(self.tx_RVC_Buffer)
-                obj.initialize()
-                self.entity_list.append(obj)
+        if self.mqtt_client is not None:
+            self.unhandled_control = UnhandledCensusControl(self.unhandled_census, self.mqtt_client,
+                                                            argsns.unhandled_report_interval, entity_factory_list)
+            self.mqtt_client.finish_startup()
+
+        self.startup.finish()
+        self.Logger.info(f"Startup took {self.startup.format()}")
 
         # Our RVC message loop here
         while True:
+            self.loop_monitor.tick()
             # process any received messages
             self.message_rx_loop()
             self.message_tx_loop()
-            time.sleep(0.001)
+            self.publish_metrics()
+            if self.profiler is not None:
+                self.profiler.poll()
+            if self.bus_load is not None:
+                self.bus_load.poll()
+            if self.unhandled_control is not None:
+                self.unhandled_control.poll()
+            if self.mqtt_client is not None and self.mqtt_client.spool is not None:
+                self.mqtt_client.spool.poll()
+            time.sleep(MAIN_LOOP_SLEEP)
 
     def on_ha_birth_message(self, topic, payload, properties=None):
         """Re-publish HA discovery configs when Home Assistant comes online."""
         if payload == "online":
             self.Logger.info("Home Assistant birth message received - republishing discovery configs")
-            for entity in self.entity_list:
-                entity.publish_ha_discovery_config()
+            self.mqtt_client.republish_ha_discovery(self.ha_discovery_rate, self.ha_discovery_jitter)
+
+    def publish_metrics(self):
+        """ periodically publish the metrics snapshot on the bridge info topic """
+        if self.metrics_interval <= 0 or self.mqtt_client is None:
+            return
+        now = time.monotonic()
+        if now < self._next_metrics_publish:
+            return
+        self._next_metrics_publish = now + self.metrics_interval
+        self.mqtt_client.send_bridge_info(json.dumps(self.metrics.snapshot()))
 
     def close(self):
         """Shutdown the app and any threads"""
         if self.receiver:
             self.receiver.kill_received = True
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        if self.capture is not None:
+            self.capture.close()
         if self.mqtt_client is not None:
             self.mqtt_client.shutdown()
             self.mqtt_client.client.loop_stop()
@@ -154,10 +307,14 @@ class app(object):
         rvc_dict["arbitration_id"] = self.rvc_decoder._rvc_to_can_frame(
             rvc_dict)
 
-        self.Logger.debug(f"Sending Msg: {str(rvc_dict)}")
-        logging.getLogger("rvc_bus_trace").debug(str(rvc_dict))
+        self.Logger.debug("Sending Msg: %s", rvc_dict)
+        if self.bus_trace.enabled:
+            self.bus_trace.trace("%s", rvc_dict)
 
         # put into canbus watcher
+        rvc_dict["tx_queued_time"] = time.perf_counter()
+        if "cmd_received_time" in rvc_dict:
+            self.metrics.observe("cmd_to_tx_queue_latency", rvc_dict["tx_queued_time"] - rvc_dict["cmd_received_time"])
         self.txQueue.put(rvc_dict)
 
     def message_rx_loop(self):
@@ -166,30 +323,69 @@ class app(object):
             return
 
         message = self.rxQueue.get()
+        dgn = "{0:05X}".format((message.arbitration_id >> 8) & 0x1FFFF)
+        self.metrics.inc("frames_received", dgn)
+        self.latency_tracer.begin_frame(message.timestamp, dgn)
 
+        start = time.perf_counter()
         try:
             MsgDict = self.rvc_decoder.rvc_decode(
                 message.arbitration_id,
                 "".join("{0:02X}".format(x) for x in message.data),
             )
         except Exception as e:
+            self.latency_tracer.end_frame(None, 0, 0)
+            self.metrics.inc("frames_decode_failed", dgn)
             self.Logger.warning(f"Failed to decode msg. {message}: {e}")
+            if self.recorder_control is not None:
+                self.recorder_control.trigger("decode_error")
             return
+        decoded = time.perf_counter()
+        self.metrics.observe("decode_latency", decoded - start)
+        self.metrics.inc("frames_decoded", dgn)
 
-        # Log all rvc bus messages to custom logger so it can be routed or ignored
-        logging.getLogger("rvc_bus_trace").debug(str(MsgDict))
+        if self.bus_trace.enabled:
+            self.bus_trace.trace("%s", MsgDict)
 
         # Find if this is a device entity in our list
         # Pass to object
 
-        for item in self.entity_list:
-            if item.process_rvc_msg(MsgDict):
-                # Should we allow processing by more than one obj.
-                ##
-                return
+        item = self._dispatch_rvc(MsgDict)
+        if item is not None:
+            # Should we allow processing by more than one obj.
+            ##
+            dispatched = time.perf_counter()
+            self.metrics.observe("dispatch_latency", dispatched - decoded)
+            self.metrics.inc("frames_dispatched", dgn)
+            self.latency_tracer.end_frame(item.id, decoded - start, dispatched - decoded)
+            return
+
+        dispatched = time.perf_counter()
+        self.metrics.observe("dispatch_latency", dispatched - decoded)
+        self.metrics.inc("frames_unhandled", dgn)
+        self.latency_tracer.end_frame(None, decoded - start, dispatched - decoded)
+
+        # count instead of logging every frame.  Only log the first of each kind
+        if self.unhandled_census.record(MsgDict) and self.unhandled_trace.enabled:
+            self.unhandled_trace.trace("Msg %s", MsgDict)
 
-        # Use a custom logger so it can be routed easily or ignored
-        logging.getLogger("unhandled_rvc").debug(f"Msg {str(MsgDict)}")
+
+    def _dispatch_rvc(self, MsgDict: dict):
+        """ pass the message to each entity until one handles it.  Returns that entity or None.
+        Per entity cpu time is only measured when entity cpu accounting is enabled """
+        if not self.entity_cpu.enabled:
+            for item in self.entity_list:
+                if item.process_rvc_msg(MsgDict):
+                    return item
+            return None
+
+        for item in self.entity_list:
+            cpu_start = time.thread_time()
+            handled = item.process_rvc_msg(MsgDict)
+            self.entity_cpu.record_rvc(item, time.thread_time() - cpu_start, handled)
+            if handled:
+                return item
+        return None
 
 
 def configure_logging(verbosity: int, config_file: Optional[os.PathLike]):
@@ -199,6 +395,7 @@ def configure_logging(verbosity: int, config_file: Optional[os.PathLike]):
                 content = load_the_config(config_file)
                 print("Trying to configuring  Logging from config file")
                 logging.config.dictConfig(content["logger"])
+                refresh_tracers()
                 return
             except Exception as e:
                 print("Exception trying to setup loggers: " + str(e.args))
@@ -208,6 +405,7 @@ def configure_logging(verbosity: int, config_file: Optional[os.PathLike]):
     log_format = "%(levelname)s %(asctime)s - %(message)s"
     logging.basicConfig(stream=sys.stdout,
                         format=log_format, level=logging.ERROR)
+    refresh_tracers()
 
 
 def load_the_config(config_file_path: Optional[os.PathLike]):
@@ -218,6 +416,22 @@ def load_the_config(config_file_path: Optional[os.PathLike]):
             return yaml.load(content.read())
 
 
+def load_floorplans(floorplan: Optional[os.PathLike], floorplan2: Optional[os.PathLike] = None) -> list:
+    """ combined floorplan list from the main and optional second floorplan file """
+    fp = []
+    if floorplan is not None:
+        if os.path.isfile(floorplan):
+            c = load_the_config(floorplan)
+            if "floorplan" in c:
+                fp.extend(c["floorplan"])
+
+    if floorplan2 is not None:
+        d = load_the_config(floorplan2)
+        if "floorplan" in d:
+            fp.extend(d["floorplan"])
+    return fp
+
+
 def main():
     """Entrypoint.
     Get the config and run the app
@@ -225,6 +439,8 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--interface", "--INTERFACE", dest="can_interface",
                         help="can interface name like can0", default=os.environ.get("CAN_INTERFACE_NAME", "can0"))
+    parser.add_argument("--CAN_BUSTYPE", "--can_bustype", dest="can_bustype",
+                        help="python-can interface type like socketcan", default=os.environ.get("CAN_BUSTYPE", "socketcan"))
     parser.add_argument("-f", "--floorplan", "--FLOORPLAN",
                         dest="floorplan", help="floorplan file path", default=os.environ.get("FLOORPLAN_FILE_1"))
     parser.add_argument("-g", "--floorplan2",
@@ -245,6 +461,70 @@ def main():
                         help="topic base for mqtt", default=os.environ.get("MQTT_TOPIC_BASE", "rvc2mqtt"))
     parser.add_argument("--MQTT_CLIENT_ID", "--mqtt_client_id", dest="mqtt_client_id",
                         help="client id for mqtt", default=os.environ.get("MQTT_CLIENT_ID", "bridge"))
+    parser.add_argument("--MQTT_WORKERS", "--mqtt_workers", dest="mqtt_workers",
+                        help="number of threads handling inbound mqtt messages", type=int, default=os.environ.get("MQTT_WORKERS", "1"))
+    parser.add_argument("--MQTT_TOPIC_ALIAS_MAX", "--mqtt_topic_alias_max", dest="mqtt_topic_alias_max",
+                        help="max mqtt v5 topic aliases to use (limited by broker). 0 to disable", type=int,
+                        default=os.environ.get("MQTT_TOPIC_ALIAS_MAX", "64"))
+    parser.add_argument("--MQTT_SPOOL_FILE", "--mqtt_spool_file", dest="mqtt_spool_file",
+                        help="filepath of sqlite spool for retained state while mqtt broker is offline",
+                        default=os.environ.get("MQTT_SPOOL_FILE"))
+    parser.add_argument("--MQTT_SPOOL_MAX_TOPICS", "--mqtt_spool_max_topics", dest="mqtt_spool_max_topics",
+                        help="max number of topics kept in the spool", type=int,
+                        default=os.environ.get("MQTT_SPOOL_MAX_TOPICS", "2000"))
+    parser.add_argument("--MQTT_SPOOL_REPLAY_RATE", "--mqtt_spool_replay_rate", dest="mqtt_spool_replay_rate",
+                        help="spooled messages per second to publish after reconnect", type=float,
+                        default=os.environ.get("MQTT_SPOOL_REPLAY_RATE", "50"))
+    parser.add_argument("--MQTT_BOOTSTRAP_TIMEOUT", "--mqtt_bootstrap_timeout", dest="mqtt_bootstrap_timeout",
+                        help="seconds to wait loading retained state from the broker at startup. 0 to disable", type=float,
+                        default=os.environ.get("MQTT_BOOTSTRAP_TIMEOUT", "0"))
+    parser.add_argument("--MQTT_BOOTSTRAP_TOPIC", "--mqtt_bootstrap_topic", dest="mqtt_bootstrap_topics",
+                        action="append", help="topic filter to load retained state from.  Add multiple times for more. Default is all device state topics",
+                        default=[t for t in os.environ.get("MQTT_BOOTSTRAP_TOPICS", "").split(",") if t])
+    parser.add_argument("--HA_DISCOVERY_RATE", "--ha_discovery_rate", dest="ha_discovery_rate",
+                        help="HA discovery configs per second to republish when Home Assistant restarts", type=float,
+                        default=os.environ.get("HA_DISCOVERY_RATE", "10"))
+    parser.add_argument("--HA_DISCOVERY_JITTER", "--ha_discovery_jitter", dest="ha_discovery_jitter",
+                        help="max random delay in seconds before republishing HA discovery configs", type=float,
+                        default=os.environ.get("HA_DISCOVERY_JITTER", "2"))
+    parser.add_argument("--METRICS_INTERVAL", "--metrics_interval", dest="metrics_interval",
+                        help="seconds between publishing metrics on the bridge info topic. 0 to disable", type=float,
+                        default=os.environ.get("METRICS_INTERVAL", "60"))
+    parser.add_argument("--METRICS_PORT", "--metrics_port", dest="metrics_port",
+                        help="local port to serve Prometheus metrics on. 0 to disable", type=int,
+                        default=os.environ.get("METRICS_PORT", "0"))
+    parser.add_argument("--PROFILE_DIR", "--profile_dir", dest="profile_dir",
+                        help="directory to write profiler reports to", default=os.environ.get("PROFILE_DIR"))
+    parser.add_argument("--RECORDER_DIR", "--recorder_dir", dest="recorder_dir",
+                        help="directory to write flight recorder dumps to.  Recorder is disabled if not set",
+                        default=os.environ.get("RECORDER_DIR"))
+    parser.add_argument("--RECORDER_SECONDS", "--recorder_seconds", dest="recorder_seconds",
+                        help="seconds of bus traffic kept by the flight recorder", type=float,
+                        default=os.environ.get("RECORDER_SECONDS", "60"))
+    parser.add_argument("--BUS_STATS_INTERVAL", "--bus_stats_interval", dest="bus_stats_interval",
+                        help="seconds between publishing bus load statistics. 0 (default) disables", type=float,
+                        default=os.environ.get("BUS_STATS_INTERVAL", "0"))
+    parser.add_argument("--UNHANDLED_REPORT_INTERVAL", "--unhandled_report_interval", dest="unhandled_report_interval",
+                        help="seconds between publishing the census of unhandled messages. 0 to only publish on request", type=float,
+                        default=os.environ.get("UNHANDLED_REPORT_INTERVAL", "300"))
+    parser.add_argument("--STALL_TIMEOUT", "--stall_timeout", dest="stall_timeout",
+                        help="seconds without a main loop or can watcher iteration before reporting a stall. 0 to disable", type=float,
+                        default=os.environ.get("STALL_TIMEOUT", "10"))
+    parser.add_argument("--ENTITY_CPU_TOP", "--entity_cpu_top", dest="entity_cpu_top",
+                        help="number of entities using the most cpu time to include in the metrics. 0 (default) disables the per entity cpu timing", type=int,
+                        default=os.environ.get("ENTITY_CPU_TOP", "0"))
+    parser.add_argument("--CAPTURE_DIR", "--capture_dir", dest="capture_dir",
+                        help="directory for a continuous binary capture of the can bus.  Disabled if not set",
+                        default=os.environ.get("CAPTURE_DIR"))
+    parser.add_argument("--CAPTURE_SEGMENT_SECONDS", "--capture_segment_seconds", dest="capture_segment_seconds",
+                        help="seconds of bus traffic in each capture segment file", type=float,
+                        default=os.environ.get("CAPTURE_SEGMENT_SECONDS", "3600"))
+    parser.add_argument("--CAPTURE_MAX_SEGMENTS", "--capture_max_segments", dest="capture_max_segments",
+                        help="number of capture segment files to keep. 0 to keep all", type=int,
+                        default=os.environ.get("CAPTURE_MAX_SEGMENTS", "168"))
+    parser.add_argument("--BUS_TRACE_SAMPLE", "--bus_trace_sample", dest="bus_trace_sample",
+                        help="only log every Nth message to the rvc_bus_trace logger", type=int,
+                        default=os.environ.get("BUS_TRACE_SAMPLE", "1"))
     parser.add_argument("--MQTT_CA", "--mqtt_ca", dest="mqtt_ca",
                         help="ca for mqtt", default=os.environ.get("MQTT_CA"))
     parser.add_argument("--MQTT_CERT", "--mqtt_cert", dest="mqtt_cert",
@@ -267,19 +547,10 @@ def main():
                                      "%A, %B %d, %Y %I:%M%p")
     )
 
+    args.startup = StartupTimer()
     try:
-        fp = []
-        if args.floorplan is not None:
-            if os.path.isfile(args.floorplan):
-                c = load_the_config(args.floorplan)
-                if "floorplan" in c:
-                    fp.extend(c["floorplan"])
-
-        if args.floorplan2 is not None:
-            d = load_the_config(args.floorplan2)
-            if "floorplan" in d:
-                fp.extend(d["floorplan"])
-        args.fp = fp
+        with args.startup.phase("floorplan_load"):
+            args.fp = load_floorplans(args.floorplan, args.floorplan2)
     except Exception as e:
         logging.critical(f"Floorplan failure: {str(e)}")
 
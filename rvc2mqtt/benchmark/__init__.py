@@ -0,0 +1,102 @@
+"""
+Benchmarks for the bridge hot paths
+
+Each benchmark produces a json serializable result dict with an `environment`
+section so numbers from different machines and commits can be compared.
+
+    rvc2mqtt bench decoder --output decoder.json
+    python -m rvc2mqtt.benchmark decoder --rounds 50
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+
+RVC_SPEC_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rvc-spec.yml")
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """ nearest rank percentile (0 - 100) of an already sorted list """
+    if len(sorted_values) == 0:
+        return 0.0
+    rank = max(1, int(math.ceil(p / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def timing_summary(durations_ns: list) -> dict:
+    """ mean / p50 / p99 / max in microseconds for a list of per operation durations """
+    values = sorted(durations_ns)
+    count = len(values)
+    mean = (sum(values) / count) if count else 0.0
+    return {"count": count,
+            "mean_us": round(mean / 1000.0, 3),
+            "p50_us": round(percentile(values, 50) / 1000.0, 3),
+            "p99_us": round(percentile(values, 99) / 1000.0, 3),
+            "max_us": round((values[-1] if count else 0) / 1000.0, 3)}
+
+
+def _git_revision() -> str:
+    """ short commit hash of the checkout, with -dirty if tracked files have uncommitted changes """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=cwd, timeout=5)
+        if out.returncode != 0:
+            return None
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True,
+                                cwd=cwd, timeout=5)
+        return out.stdout.strip() + ("-dirty" if status.stdout.strip() else "")
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> dict:
+    """ where and when a benchmark ran """
+    return {"timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "git_revision": _git_revision()}
+
+
+def write_result(result: dict, path: os.PathLike = None):
+    """ write result as json to path or stdout when path is None """
+    text = json.dumps(result, indent=2, default=str)
+    if path is None:
+        print(text)
+    else:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+
+
+def main(argv: list = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    commands = {"decoder": "rvc2mqtt.benchmark.decoder",
+                "entities": "rvc2mqtt.benchmark.entities",
+                "gate": "rvc2mqtt.benchmark.gate",
+                "startup": "rvc2mqtt.benchmark.startup"}
+    if len(argv) == 0 or argv[0] not in commands:
+        print(f"usage: rvc2mqtt bench {{{','.join(commands)}}} [options]")
+        return 2
+    import importlib
+    return importlib.import_module(commands[argv[0]]).main(argv[1:])
@@ -0,0 +1,211 @@
+"""
+Decoder throughput benchmark
+
+Builds a corpus that covers every DGN in rvc-spec.yml, including alias entries,
+dgn_h only entries (ACK, requests), every `usefirstbyte` sub-table and the
+proprietary Timberline, G12 and APS-500 DGNs.  Each variant gets a "not
+available" (all 0xFF) frame and some seeded random payloads.
+
+Measured:
+  - frames per second decoding the whole corpus in a tight loop
+  - mean / p50 / p99 latency per DGN variant
+  - peak bytes allocated while decoding one frame (tracemalloc), per DGN variant
+
+    rvc2mqtt bench decoder --rounds 20 --output decoder.json
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import collections
+import logging
+import random
+import time
+import tracemalloc
+from rvc2mqtt.rvc import RVC_Decoder
+from rvc2mqtt.benchmark import RVC_SPEC_FILE, environment, timing_summary, write_result
+
+CorpusFrame = collections.namedtuple("CorpusFrame", ["dgn", "name", "variant", "vendor",
+                                                     "arbitration_id", "data"])
+
+# spec entries that are not from the RV-C standard.  matched against name and comment
+VENDORS = {"timberline": "timberline", "g12": "g12", "aps-500": "aps500", "aps_": "aps500"}
+
+
+def _vendor(entry: dict) -> str:
+    text = (str(entry.get("name", "")) + " " + str(entry.get("comment", ""))).lower()
+    for (marker, vendor) in VENDORS.items():
+        if marker in text:
+            return vendor
+    return "rvc"
+
+
+def build_corpus(decoder: RVC_Decoder, payloads_per_variant: int = 4, seed: int = 0) -> list:
+    """ list of CorpusFrame covering every spec entry """
+    rng = random.Random(seed)
+    corpus = []
+    for (key, entry) in decoder.spec.items():
+        if not isinstance(entry, dict) or "name" not in entry:
+            continue
+        key = str(key)
+        try:
+            int(key, 16)
+        except ValueError:
+            continue        # placeholder entries that can never be on the bus
+        if len(key) == 3:
+            # only the upper part is defined.  lower byte is the destination address
+            dgn = key + "FF"
+            variants = [("dgn_h", None)]
+        else:
+            dgn = key
+            variants = [("alias" if "alias" in entry else "base", None)]
+        if entry.get("usefirstbyte") == 1:
+            variants = [(f"firstbyte:{k}", int(k, 16)) for k in entry.keys()
+                        if isinstance(k, str) and len(k) == 2]
+
+        arbitration_id = decoder._rvc_to_can_frame({"dgn": dgn})
+        for (variant, first_byte) in variants:
+            for n in range(payloads_per_variant):
+                data = bytearray(b"\xff" * 8) if n == 0 else bytearray(rng.getrandbits(8) for _ in range(8))
+                if first_byte is not None:
+                    data[0] = first_byte
+                corpus.append(CorpusFrame(key, entry["name"], variant, _vendor(entry),
+                                          arbitration_id, data.hex().upper()))
+    return corpus
+
+
+def measure_throughput(decoder: RVC_Decoder, corpus: list, rounds: int) -> dict:
+    decode = decoder.rvc_decode
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for f in corpus:
+            decode(f.arbitration_id, f.data)
+    elapsed = time.perf_counter() - start
+    frames = rounds * len(corpus)
+    return {"frames": frames, "elapsed_s": round(elapsed, 4),
+            "frames_per_sec": round(frames / elapsed, 1) if elapsed > 0 else 0.0}
+
+
+def measure_latency(decoder: RVC_Decoder, corpus: list, rounds: int) -> dict:
+    """ per frame durations (ns) grouped by (dgn, variant) """
+    decode = decoder.rvc_decode
+    clock = time.perf_counter_ns
+    durations = collections.defaultdict(list)
+    for _ in range(rounds):
+        for f in corpus:
+            t0 = clock()
+            decode(f.arbitration_id, f.data)
+            durations[(f.dgn, f.variant)].append(clock() - t0)
+    return durations
+
+
+def measure_allocations(decoder: RVC_Decoder, corpus: list) -> dict:
+    """ peak traced bytes while decoding each frame, max over the frames of a (dgn, variant) """
+    peaks = {}
+    decode = decoder.rvc_decode
+    # warm up caches so only steady state allocations are counted
+    for f in corpus:
+        decode(f.arbitration_id, f.data)
+    tracemalloc.start()
+    try:
+        for f in corpus:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            decode(f.arbitration_id, f.data)
+            peak = tracemalloc.get_traced_memory()[1] - base
+            k = (f.dgn, f.variant)
+            peaks[k] = max(peaks.get(k, 0), peak)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def run(decoder: RVC_Decoder = None, rounds: int = 20, payloads_per_variant: int = 4, seed: int = 0,
+        allocations: bool = True) -> dict:
+    """ run the decoder benchmark and return the json serializable result """
+    if decoder is None:
+        decoder = RVC_Decoder()
+        decoder.load_rvc_spec(RVC_SPEC_FILE)
+    corpus = build_corpus(decoder, payloads_per_variant, seed)
+
+    # decode failures log at warning/error.  that is part of the cost but not the output
+    rvc_logger = logging.getLogger(RVC_Decoder.__module__)
+    level = rvc_logger.level
+    rvc_logger.setLevel(logging.CRITICAL)
+    try:
+        throughput = measure_throughput(decoder, corpus, rounds)
+        durations = measure_latency(decoder, corpus, rounds)
+        peaks = measure_allocations(decoder, corpus) if allocations else {}
+    finally:
+        rvc_logger.setLevel(level)
+
+    dgns = []
+    seen = set()
+    for f in corpus:
+        k = (f.dgn, f.variant)
+        if k in seen:
+            continue
+        seen.add(k)
+        entry = {"dgn": f.dgn, "name": f.name, "variant": f.variant, "vendor": f.vendor}
+        entry.update(timing_summary(durations[k]))
+        if allocations:
+            entry["peak_alloc_bytes"] = peaks.get(k, 0)
+        dgns.append(entry)
+
+    summary = dict(throughput)
+    summary.update(timing_summary([d for v in durations.values() for d in v]))
+    summary["dgn_count"] = len({f.dgn for f in corpus})
+    summary["variant_count"] = len(dgns)
+    if allocations:
+        summary["peak_alloc_bytes_mean"] = round(sum(peaks.values()) / len(peaks), 1) if peaks else 0
+
+    return {"benchmark": "decoder",
+            "environment": environment(),
+            "settings": {"rounds": rounds, "payloads_per_variant": payloads_per_variant, "seed": seed,
+                         "corpus_frames": len(corpus)},
+            "summary": summary,
+            "dgns": dgns}
+
+
+def format_result(result: dict, top: int = 10) -> str:
+    s = result["summary"]
+    lines = [f"{s['dgn_count']} dgns, {s['variant_count']} variants, {s['frames']} frames: "
+             f"{s['frames_per_sec']} frames/s",
+             f"latency  mean {s['mean_us']} us  p50 {s['p50_us']} us  p99 {s['p99_us']} us  max {s['max_us']} us"]
+    if "peak_alloc_bytes_mean" in s:
+        lines.append(f"peak allocation per frame  mean {s['peak_alloc_bytes_mean']} bytes")
+    lines.append(f"slowest {top} by p99:")
+    for d in sorted(result["dgns"], key=lambda d: d["p99_us"], reverse=True)[:top]:
+        lines.append(f"  {d['dgn']:<6} {d['name'][:36]:<36} {d['variant']:<13} p99 {d['p99_us']} us")
+    return "\n".join(lines)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="rvc2mqtt bench decoder", description="rvc_decode throughput benchmark")
+    parser.add_argument("--rounds", type=int, default=20, help="passes over the corpus")
+    parser.add_argument("--payloads", type=int, default=4, help="payloads per dgn variant")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no_allocations", dest="allocations", action="store_false",
+                        help="skip the tracemalloc pass")
+    parser.add_argument("-o", "--output", help="write the json result to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    result = run(rounds=args.rounds, payloads_per_variant=args.payloads, seed=args.seed,
+                 allocations=args.allocations)
+    write_result(result, args.output)
+    if args.output is not None:
+        print(format_result(result))
+    return 0
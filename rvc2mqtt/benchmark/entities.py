@@ -0,0 +1,240 @@
+"""
+Per entity processing benchmark
+
+Creates every entity plugin in rvc2mqtt/entity from a realistic floorplan
+entry (entity_fixtures.yaml) with an in-process fake mqtt client, then replays
+the recorded frames for that entity thru process_rvc_msg and the recorded
+commands thru process_mqtt_msg.
+
+Measured per entity:
+  - rvc messages per second, mean / p99 latency and mqtt publishes per message
+  - mqtt commands per second, mean / p99 latency and can frames queued per command
+
+Frames are decoded once up front so only entity code (and the mqtt publish path
+it drives) is timed.  Modules that fail to import on this python are reported
+as skipped.
+
+    rvc2mqtt bench entities --rounds 200 --output entities.json
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import queue
+import time
+import can
+import ruyaml as YAML
+from rvc2mqtt.rvc import RVC_Decoder
+from rvc2mqtt.mqtt_fake import make_fake_mqtt_support
+from rvc2mqtt.benchmark import RVC_SPEC_FILE, environment, timing_summary, write_result
+
+FIXTURE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "entity_fixtures.yaml")
+
+
+def load_fixtures(path: os.PathLike = FIXTURE_FILE) -> list:
+    with open(path, "r") as f:
+        return YAML.YAML(typ='safe').load(f)
+
+
+def parse_frame(frame: str) -> tuple:
+    """ (arbitration_id, data hex string) from candump style 19FFFD42#01780801D4C43577 """
+    (arbitration_id, _, data) = frame.partition("#")
+    return (int(arbitration_id, 16), data.upper())
+
+
+def fixture_factory_list(fixtures: list) -> tuple:
+    """ (entity factory list, skipped) for the fixture classes that import on this python """
+    factory_list = []
+    skipped = []
+    for fixture in fixtures:
+        try:
+            module = importlib.import_module("rvc2mqtt.entity." + fixture["module"])
+        except (ImportError, SyntaxError) as e:
+            skipped.append({"entity": f"{fixture['module']}.{fixture['class']}", "error": f"{type(e).__name__}: {e}"})
+            continue
+        cls = getattr(module, fixture["class"])
+        factory_list.append((cls.FACTORY_MATCH_ATTRIBUTES, cls))
+    return (factory_list, skipped)
+
+
+def fixture_floorplan(fixtures: list, factory_list: list) -> list:
+    """ floorplan of every fixture entity that can be created """
+    classes = {cls.__name__ + cls.__module__ for (_, cls) in factory_list}
+    return [dict(f["floorplan"]) for f in fixtures
+            if f["class"] + "rvc2mqtt.entity." + f["module"] in classes]
+
+
+def fixture_frames(fixtures: list) -> list:
+    """ can.Message for every fixture frame, in fixture order """
+    messages = []
+    for fixture in fixtures:
+        for frame in fixture.get("frames") or []:
+            (arbitration_id, data) = parse_frame(frame)
+            messages.append(can.Message(arbitration_id=arbitration_id, data=bytes.fromhex(data),
+                                        is_extended_id=True))
+    return messages
+
+
+class EntityBench(object):
+    """ one entity created from a fixture entry with its decoded messages and commands """
+
+    def __init__(self, fixture: dict, decoder: RVC_Decoder):
+        self.fixture = fixture
+        module = importlib.import_module("rvc2mqtt.entity." + fixture["module"])
+        cls = getattr(module, fixture["class"])
+
+        self.mqtt_support = make_fake_mqtt_support()
+        self.client = self.mqtt_support.client
+        self.tx_queue = queue.Queue()
+        self.entity = cls(dict(fixture["floorplan"]), self.mqtt_support)
+        self.entity.set_rvc_send_queue(self.tx_queue)
+        self.entity.initialize()
+
+        self.messages = [decoder.rvc_decode(*parse_frame(f)) for f in fixture.get("frames") or []]
+        registered = list(self.mqtt_support.registered_mqtt_devices.keys())
+        self.commands = []
+        for (suffix, payload) in fixture.get("commands") or []:
+            topic = next((t for t in registered if t == suffix or t.endswith("/" + suffix)), None)
+            if topic is None:
+                raise Exception(f"{fixture['class']} did not register a topic ending in {suffix}")
+            self.commands.append((topic, str(payload)))
+
+    def _drain(self) -> int:
+        n = 0
+        while True:
+            try:
+                self.tx_queue.get_nowait()
+                n += 1
+            except queue.Empty:
+                return n
+
+    def run_rvc(self, rounds: int) -> dict:
+        process = self.entity.process_rvc_msg
+        clock = time.perf_counter_ns
+        durations = []
+        processed = 0
+        published = self.client.publish_count
+        for _ in range(rounds):
+            for m in self.messages:
+                t0 = clock()
+                if process(m):
+                    processed += 1
+                durations.append(clock() - t0)
+            self.client.clear()
+        self._drain()
+        return self._result(durations, processed, "publishes_per_message",
+                            self.client.publish_count - published)
+
+    def run_mqtt(self, rounds: int) -> dict:
+        process = self.entity.process_mqtt_msg
+        clock = time.perf_counter_ns
+        durations = []
+        tx = 0
+        published = self.client.publish_count
+        for _ in range(rounds):
+            for (topic, payload) in self.commands:
+                t0 = clock()
+                process(topic, payload)
+                durations.append(clock() - t0)
+            tx += self._drain()
+            self.client.clear()
+        result = self._result(durations, None, "tx_per_command", tx)
+        result["publishes_per_command"] = round((self.client.publish_count - published) / len(durations), 3) \
+            if durations else 0.0
+        return result
+
+    def _result(self, durations: list, processed: int, per_name: str, per_count: int) -> dict:
+        total_s = sum(durations) / 1e9
+        result = {"ops_per_sec": round(len(durations) / total_s, 1) if total_s > 0 else 0.0}
+        result.update(timing_summary(durations))
+        if processed is not None:
+            result["processed"] = processed
+        result[per_name] = round(per_count / len(durations), 3) if durations else 0.0
+        return result
+
+
+def run(fixtures: list = None, rounds: int = 200, decoder: RVC_Decoder = None, only: list = None) -> dict:
+    """ run the entity benchmark and return the json serializable result """
+    if decoder is None:
+        decoder = RVC_Decoder()
+        decoder.load_rvc_spec(RVC_SPEC_FILE)
+    if fixtures is None:
+        fixtures = load_fixtures()
+
+    entities = []
+    skipped = []
+    for fixture in fixtures:
+        if only and fixture["class"] not in only and fixture["module"] not in only:
+            continue
+        name = f"{fixture['module']}.{fixture['class']}"
+        try:
+            bench = EntityBench(fixture, decoder)
+        except (ImportError, SyntaxError) as e:
+            skipped.append({"entity": name, "error": f"{type(e).__name__}: {e}"})
+            continue
+        entry = {"entity": name, "class": fixture["class"], "module": fixture["module"],
+                 "messages": len(bench.messages), "commands": len(bench.commands)}
+        try:
+            if bench.messages:
+                entry["rvc"] = bench.run_rvc(rounds)
+            if bench.commands:
+                entry["mqtt"] = bench.run_mqtt(rounds)
+        except Exception as e:
+            # an entity that throws on recorded traffic is a bug to report, not a number
+            entry["error"] = f"{type(e).__name__}: {e}"
+        entities.append(entry)
+
+    return {"benchmark": "entities",
+            "environment": environment(),
+            "settings": {"rounds": rounds},
+            "entities": entities,
+            "skipped": skipped}
+
+
+def format_result(result: dict) -> str:
+    lines = [f"{'entity':<52} {'rvc msg/s':>10} {'p99 us':>8} {'pub/msg':>8} {'cmd/s':>10} {'p99 us':>8} {'tx/cmd':>7}"]
+    for e in result["entities"]:
+        rvc = e.get("rvc", {})
+        mqtt = e.get("mqtt", {})
+        lines.append(f"{e['entity'][:52]:<52} {rvc.get('ops_per_sec', ''):>10} {rvc.get('p99_us', ''):>8} "
+                     f"{rvc.get('publishes_per_message', ''):>8} {mqtt.get('ops_per_sec', ''):>10} "
+                     f"{mqtt.get('p99_us', ''):>8} {mqtt.get('tx_per_command', ''):>7}")
+        if "error" in e:
+            lines.append(f"  error: {e['error']}")
+    for s in result["skipped"]:
+        lines.append(f"skipped {s['entity']}: {s['error']}")
+    return "\n".join(lines)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="rvc2mqtt bench entities", description="entity processing benchmark")
+    parser.add_argument("--rounds", type=int, default=200, help="passes over each entity's frames and commands")
+    parser.add_argument("--fixtures", default=FIXTURE_FILE, help="entity fixture yaml file")
+    parser.add_argument("--entity", dest="only", action="append",
+                        help="only this entity class or module.  Can be given more than once")
+    parser.add_argument("-o", "--output", help="write the json result to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    # entities log every command at info.  keep the console quiet
+    logging.basicConfig(level=logging.WARNING)
+    result = run(load_fixtures(args.fixtures), args.rounds, only=args.only)
+    write_result(result, args.output)
+    if args.output is not None:
+        print(format_result(result))
+    return 0
@@ -0,0 +1,238 @@
+"""
+Performance regression gate
+
+Measures the bridge hot paths and compares them to a checked-in baseline
+(baseline.json next to this file):
+
+  decode    - rvc_decode per frame over the decoder benchmark corpus
+  dispatch  - app.message_rx_loop per frame (decode, entity match and entity
+              processing with publishes to the fake mqtt client) for a coach
+              built from the entity fixtures
+  publish   - MQTT_Client.publish per call thru the fake mqtt client
+              (suppression, spool check, metrics, latency tracing)
+  startup   - init_pipeline (spec load), plugin registration (every entity
+              module executed by PluginSupport) and creating and initializing
+              the fixture coach entities
+
+Machines differ, so every number is divided by the time of a fixed pure python
+calibration loop run right before and after it.  A metric fails when its normalized
+value is more than `tolerance` (default 25%) above the baseline.  Interpreter
+versions differ by more than that, so the baseline records the python version
+(major.minor) it was measured with and a comparison on another version is refused.
+Record the baseline on the python CI runs the gate with.
+
+    rvc2mqtt bench gate                 # compare, exit code 1 on regression, 2 on another python
+    rvc2mqtt bench gate --update        # measure and write a new baseline
+
+The opt-in test target runs the same comparison:
+
+    RVC2MQTT_PERF_GATE=1 pytest test/perf_gate_test.py
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import time
+from rvc2mqtt.app import app
+from rvc2mqtt.rvc import RVC_Decoder
+from rvc2mqtt.mqtt_fake import make_fake_mqtt_support
+from rvc2mqtt.replay import Replay
+from rvc2mqtt.golden import plugin_factory_list
+from rvc2mqtt.benchmark import RVC_SPEC_FILE, environment, write_result
+from rvc2mqtt.benchmark import decoder as decoder_bench
+from rvc2mqtt.benchmark import entities as entity_bench
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.25
+METRICS = ("decode", "dispatch", "publish", "startup")
+
+
+def python_version() -> str:
+    """ major.minor of the running interpreter """
+    return "{0}.{1}".format(*sys.version_info[:2])
+
+
+def calibrate(repeats: int = 5) -> float:
+    """ ns for a fixed pure python workload (dict, string and int work like the
+    decoder does).  Fastest of repeats to ignore scheduling noise """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        d = {}
+        for i in range(20000):
+            s = "{0:02X}".format(i & 0xFF) + "{0:02X}".format((i >> 8) & 0xFF)
+            d[s] = int(s, 16) * 0.05
+            d.get(s[:2], None)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return float(best)
+
+
+def _fixture_bridge(fixtures: list, factory_list: list = None) -> app:
+    """ bridge for the fixture coach.  Entities come from factory_list, the
+    fixture classes if None """
+    (fixture_factories, _) = entity_bench.fixture_factory_list(fixtures)
+    bridge = app()
+    # no per entity cpu accounting: the bridge default is off
+    bridge.init_pipeline(entity_cpu_top=0)
+    bridge.mqtt_client = make_fake_mqtt_support(keep=1)
+    bridge.mqtt_client.set_metrics(bridge.metrics)
+    bridge.mqtt_client.set_latency_tracer(bridge.latency_tracer)
+    bridge.load_entities(entity_bench.fixture_floorplan(fixtures, fixture_factories), [],
+                         factory_list if factory_list is not None else fixture_factories)
+    return bridge
+
+
+def measure_decode(decoder: RVC_Decoder, corpus: list) -> float:
+    r = decoder_bench.measure_throughput(decoder, corpus, 10)
+    return r["elapsed_s"] * 1e9 / r["frames"]
+
+
+def measure_dispatch(bridge: app, fixtures: list, rounds: int = 20) -> float:
+    messages = [m for _ in range(rounds) for m in entity_bench.fixture_frames(fixtures)]
+    report = Replay(bridge, speed=0).run(messages)
+    return report["elapsed_s"] * 1e9 / report["frames"]
+
+
+def measure_publish(bridge: app, count: int = 5000) -> float:
+    publish = bridge.mqtt_client.client.publish
+    topics = [bridge.mqtt_client.make_device_topic_string(f"gate-{n}", "value", True) for n in range(20)]
+    start = time.perf_counter_ns()
+    for n in range(count):
+        publish(topics[n % len(topics)], str(n), retain=True)
+    return (time.perf_counter_ns() - start) / count
+
+
+def measure_startup(fixtures: list) -> float:
+    start = time.perf_counter_ns()
+    # register the plugins like the bridge does.  PluginSupport executes every
+    # entity module again so plugin registration is part of the time
+    _fixture_bridge(fixtures, plugin_factory_list())
+    return float(time.perf_counter_ns() - start)
+
+
+def measure(repeats: int = 5) -> dict:
+    """ ns of each metric and its ratio to calibration runs right before and after it.
+    The lowest ratio over repeats is kept: the run least disturbed by the rest of
+    the machine, and a slow or fast patch of the machine moves both numbers """
+    # entities log commands and unhandled frames.  Logging is not what is measured
+    logging.disable(logging.CRITICAL)
+    try:
+        fixtures = entity_bench.load_fixtures()
+        decoder = RVC_Decoder()
+        decoder.load_rvc_spec(RVC_SPEC_FILE)
+        corpus = decoder_bench.build_corpus(decoder, payloads_per_variant=2)
+
+        samples = {name: [] for name in METRICS}
+        calibration = []
+        for _ in range(repeats):
+            bridge = _fixture_bridge(fixtures)
+            runs = {"decode": lambda: measure_decode(decoder, corpus),
+                    "dispatch": lambda: measure_dispatch(bridge, fixtures),
+                    "publish": lambda: measure_publish(bridge),
+                    "startup": lambda: measure_startup(fixtures)}
+            for name in METRICS:
+                # like timeit, keep gc pauses out of the numbers
+                gc.collect()
+                gc.disable()
+                try:
+                    before = calibrate(2)
+                    value = runs[name]()
+                    cal = (before + calibrate(2)) / 2
+                finally:
+                    gc.enable()
+                calibration.append(cal)
+                samples[name].append((value / cal, value))
+    finally:
+        logging.disable(logging.NOTSET)
+
+    metrics = {}
+    for (name, values) in samples.items():
+        (normalized, value) = min(values)
+        metrics[name] = {"ns": round(value, 1), "normalized": round(normalized, 9)}
+    return {"calibration_ns": min(calibration), "python_version": python_version(), "metrics": metrics}
+
+
+def compare(current: dict, baseline: dict, tolerance: float = None) -> list:
+    """ one result per baseline metric: name, baseline and current normalized values,
+    ratio (current / baseline) and whether it regressed past the tolerance.
+    A per metric "tolerance" in the baseline overrides the default.
+    Raises ValueError if the two were measured on different python versions """
+    if current.get("python_version") != baseline.get("python_version"):
+        raise ValueError(f"Baseline was recorded on python {baseline.get('python_version')} but this is python "
+                         f"{current.get('python_version')}.  Run the gate on the baseline's python or record a new baseline")
+    results = []
+    for (name, base) in baseline["metrics"].items():
+        cur = current["metrics"].get(name)
+        if cur is None:
+            continue
+        limit = base.get("tolerance", baseline.get("tolerance", DEFAULT_TOLERANCE)) if tolerance is None else tolerance
+        ratio = cur["normalized"] / base["normalized"] if base["normalized"] > 0 else 1.0
+        results.append({"metric": name,
+                        "baseline": base["normalized"],
+                        "current": cur["normalized"],
+                        "ratio": round(ratio, 3),
+                        "tolerance": limit,
+                        "regressed": ratio > 1.0 + limit})
+    return results
+
+
+def load_baseline(path: os.PathLike = BASELINE_FILE) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def format_comparison(results: list) -> str:
+    lines = [f"{'metric':<10} {'baseline':>12} {'current':>12} {'ratio':>7}  result"]
+    for r in results:
+        verdict = f"REGRESSED (> {1 + r['tolerance']:.2f})" if r["regressed"] else "ok"
+        lines.append(f"{r['metric']:<10} {r['baseline']:>12.6f} {r['current']:>12.6f} {r['ratio']:>7.3f}  {verdict}")
+    return "\n".join(lines)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="rvc2mqtt bench gate", description="performance regression gate")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline json file")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help=f"allowed slowdown as a fraction.  Default from the baseline or {DEFAULT_TOLERANCE}")
+    parser.add_argument("--repeats", type=int, default=5, help="measurements per metric.  The fastest relative to calibration is used")
+    parser.add_argument("--update", action="store_true", help="write the measurement as the new baseline")
+    parser.add_argument("-o", "--output", help="also write the measurement and comparison as json to this file")
+    args = parser.parse_args(argv)
+
+    current = measure(args.repeats)
+    current["environment"] = environment()
+
+    if args.update:
+        current["tolerance"] = DEFAULT_TOLERANCE if args.tolerance is None else args.tolerance
+        write_result(current, args.baseline)
+        print(f"Wrote baseline {args.baseline}")
+        return 0
+
+    try:
+        results = compare(current, load_baseline(args.baseline), args.tolerance)
+    except ValueError as e:
+        print(e)
+        return 2
+    print(format_comparison(results))
+    if args.output is not None:
+        write_result({"benchmark": "gate", "measurement": current, "comparison": results}, args.output)
+    return 1 if any(r["regressed"] for r in results) else 0
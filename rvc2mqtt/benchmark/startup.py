@@ -0,0 +1,243 @@
+"""
+Startup benchmark
+
+Runs the bridge startup sequence in fresh python processes (so imports and
+plugin loading are cold, like a restart) against the in-process broker and
+reports the time of each phase:
+
+  import             - import rvc2mqtt.app and everything it pulls in
+  floorplan_load     - floorplan yaml (the entity fixtures unless -f is given)
+  spec_load          - rvc-spec.yml
+  mqtt_connect       - MqttInitalize (tcp connect and CONNECT)
+  mqtt_connack       - waiting for the broker to accept the connection
+  plugin_register    - pkgutil walk and exec_module of every entity plugin
+  entity_create      - entity construction from the floorplan
+  entity_initialize  - initialize() of every entity (first publishes and requests)
+
+with the median, min and max over the runs, plus an import time profile
+(python -X importtime) of the modules that cost the most.
+
+    rvc2mqtt bench startup --runs 5 --output startup.json
+    rvc2mqtt bench startup -f floorplan.yaml -p ./my_plugins
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+# rvc2mqtt.app is imported inside measure_once so the import phase is timed
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from rvc2mqtt.benchmark import environment, write_result
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESULT_PREFIX = "STARTUP_RESULT "
+
+
+def measure_once(floorplan_file: os.PathLike = None, plugin_paths: list = None, connack_timeout: float = 10.0) -> dict:
+    """ one startup in this process.  Import time is only cold in a fresh process """
+    t0 = time.perf_counter()
+    from rvc2mqtt.app import app, load_floorplans
+    import_s = time.perf_counter() - t0
+
+    from rvc2mqtt.fake_broker import FakeBroker
+    from rvc2mqtt.mqtt import MqttInitalize
+    from rvc2mqtt.startup_timing import StartupTimer
+    from rvc2mqtt.benchmark import entities as entity_bench
+
+    startup = StartupTimer()
+    with startup.phase("floorplan_load"):
+        if floorplan_file is not None:
+            floorplan = load_floorplans(floorplan_file)
+        else:
+            floorplan = [dict(f["floorplan"]) for f in entity_bench.load_fixtures()]
+
+    errors = {}
+    bridge = app()
+    bridge.init_pipeline(startup=startup)
+    broker = FakeBroker(keep=0).start()
+    try:
+        with startup.phase("mqtt_connect"):
+            bridge.mqtt_client = MqttInitalize("127.0.0.1", broker.port, None, None, "bench", "rvc2mqtt")
+        bridge.mqtt_client.set_metrics(bridge.metrics)
+        bridge.mqtt_client.set_latency_tracer(bridge.latency_tracer)
+        bridge.mqtt_client.set_cpu_accounting(bridge.entity_cpu)
+        bridge.mqtt_client.client.loop_start()
+        with startup.phase("mqtt_connack"):
+            end = time.monotonic() + connack_timeout
+            while not bridge.mqtt_client.is_connected() and time.monotonic() < end:
+                time.sleep(0.001)
+
+        try:
+            bridge.load_entities(floorplan, plugin_paths or [])
+        except (ImportError, SyntaxError) as e:
+            # a plugin that doesn't import on this python stops registration.  Report it and
+            # create the entities from the plugins that do import
+            errors["plugin_register"] = f"{type(e).__name__}: {e}"
+            (factory_list, _) = entity_bench.fixture_factory_list(entity_bench.load_fixtures())
+            bridge.load_entities(floorplan, plugin_paths or [], factory_list)
+        startup.finish()
+    finally:
+        bridge.mqtt_client.shutdown()
+        bridge.mqtt_client.client.disconnect()
+        bridge.mqtt_client.client.loop_stop()
+        broker.stop()
+
+    report = startup.report()
+    report["phases"] = dict({"import": round(import_s, 4)}, **report["phases"])
+    report["total_s"] = round(report["total_s"] + import_s, 4)
+    report["entities"] = len(bridge.entity_list)
+    report["errors"] = errors
+    return report
+
+
+def measure_process(floorplan_file: os.PathLike = None, plugin_paths: list = None) -> dict:
+    """ measure_once in a fresh python process """
+    cmd = [sys.executable, "-m", "rvc2mqtt.benchmark", "startup", "--child"]
+    if floorplan_file is not None:
+        cmd += ["-f", floorplan_file]
+    for p in plugin_paths or []:
+        cmd += ["-p", p]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([PACKAGE_PARENT] + [p for p in [env.get("PYTHONPATH")] if p])
+    t0 = time.perf_counter()
+    out = subprocess.run(cmd, capture_output=True, text=True, env=env, timeout=300)
+    wall_s = time.perf_counter() - t0
+    for line in reversed(out.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+            result["process_wall_s"] = round(wall_s, 4)
+            return result
+    raise Exception(f"startup child failed ({out.returncode}): {out.stderr.strip()[-2000:]}")
+
+
+def parse_importtime(text: str) -> list:
+    """ (module, self_us, cumulative_us, depth) from python -X importtime output """
+    imports = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0])
+            cumulative_us = int(parts[1])
+        except ValueError:
+            continue        # the header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        imports.append((name.strip(), self_us, cumulative_us, depth))
+    return imports
+
+
+def import_profile(module: str = "rvc2mqtt.app", top: int = 15) -> dict:
+    """ python -X importtime of module in a fresh process """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([PACKAGE_PARENT] + [p for p in [env.get("PYTHONPATH")] if p])
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, env=env, timeout=120)
+    imports = parse_importtime(out.stderr)
+    total = next((c for (name, s, c, d) in imports if name == module), sum(s for (_, s, _, _) in imports))
+
+    def entry(i):
+        return {"module": i[0], "self_ms": round(i[1] / 1000.0, 2), "cumulative_ms": round(i[2] / 1000.0, 2)}
+
+    # a top level package of the import (rvc2mqtt, paho, can, ruyaml, ...) and what it cost
+    packages = {}
+    for (name, self_us, _, _) in imports:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0) + self_us
+    return {"module": module,
+            "total_ms": round(total / 1000.0, 2),
+            "modules": len(imports),
+            "by_package_ms": {k: round(v / 1000.0, 2) for (k, v) in
+                              sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]},
+            "top_self": [entry(i) for i in sorted(imports, key=lambda i: i[1], reverse=True)[:top]],
+            "top_cumulative": [entry(i) for i in sorted(imports, key=lambda i: i[2], reverse=True)[:top]]}
+
+
+def run(runs: int = 5, floorplan_file: os.PathLike = None, plugin_paths: list = None,
+        imports: bool = True) -> dict:
+    """ run the startup benchmark and return the json serializable result """
+    results = [measure_process(floorplan_file, plugin_paths) for _ in range(runs)]
+
+    phases = {}
+    for r in results:
+        for (name, s) in r["phases"].items():
+            phases.setdefault(name, []).append(s)
+    summary = {name: {"median_ms": round(statistics.median(v) * 1000.0, 2),
+                      "min_ms": round(min(v) * 1000.0, 2),
+                      "max_ms": round(max(v) * 1000.0, 2)} for (name, v) in phases.items()}
+    totals = [r["total_s"] for r in results]
+    walls = [r["process_wall_s"] for r in results]
+    result = {"benchmark": "startup",
+              "environment": environment(),
+              "settings": {"runs": runs, "floorplan": floorplan_file, "plugin_paths": plugin_paths or []},
+              "summary": {"total_median_ms": round(statistics.median(totals) * 1000.0, 2),
+                          "process_wall_median_ms": round(statistics.median(walls) * 1000.0, 2),
+                          "entities": results[0]["entities"],
+                          "errors": results[0]["errors"]},
+              "phases": summary,
+              "runs": results}
+    if imports:
+        result["imports"] = import_profile()
+    return result
+
+
+def format_result(result: dict, top: int = 10) -> str:
+    s = result["summary"]
+    lines = [f"startup {s['total_median_ms']} ms median ({s['process_wall_median_ms']} ms process wall time), "
+             f"{s['entities']} entities, {result['settings']['runs']} runs",
+             f"{'phase':<18} {'median ms':>10} {'min ms':>10} {'max ms':>10}"]
+    for (name, p) in result["phases"].items():
+        lines.append(f"{name:<18} {p['median_ms']:>10} {p['min_ms']:>10} {p['max_ms']:>10}")
+    for (phase, error) in s["errors"].items():
+        lines.append(f"{phase} failed: {error}")
+    if "imports" in result:
+        i = result["imports"]
+        lines.append(f"import {i['module']}: {i['total_ms']} ms, {i['modules']} modules.  Slowest by self time:")
+        for m in i["top_self"][:top]:
+            lines.append(f"  {m['module'][:48]:<48} {m['self_ms']:>8} ms  (cumulative {m['cumulative_ms']} ms)")
+    return "\n".join(lines)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="rvc2mqtt bench startup", description="startup phase benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start")
+    parser.add_argument("-f", "--floorplan", dest="floorplan", help="floorplan file.  Default is the entity fixtures")
+    parser.add_argument("-p", "--plugin_path", dest="plugin_paths", action="append", default=[],
+                        help="path to directory to load plugins")
+    parser.add_argument("--no_imports", dest="imports", action="store_false", help="skip the import time profile")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output", help="write the json result to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        logging.disable(logging.CRITICAL)
+        print(RESULT_PREFIX + json.dumps(measure_once(args.floorplan, args.plugin_paths)))
+        return 0
+
+    result = run(args.runs, args.floorplan, args.plugin_paths, args.imports)
+    write_result(result, args.output)
+    if args.output is not None:
+        print(format_result(result))
+    return 0
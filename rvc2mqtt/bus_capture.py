@@ -0,0 +1,268 @@
+"""
+Compact binary capture of the can bus with an indexed reader
+
+For long captures instead of the text rvc_bus_trace logger.
+
+Segment file (`capture-<YYYYmmdd-HHMMSS>Z.rvcc` in UTC, `_01`, `_02`.. added if a
+segment was already started that second) - a new one every segment_seconds.
+Segments are ordered by the start time in their header, not by name:
+    header  - magic, format version, record size and segment start time
+    blocks  - zlib compressed runs of fixed width records
+
+Record (22 bytes little endian) - timestamp (double), arbitration id (uint32),
+dlc (uint8), flags (uint8), data (8 bytes zero padded)
+
+Sparse index (`<segment>.idx`) - one json line per block with the first and
+last timestamp, file offset and length, record count and the DGNs in the
+block.  A block and its index line are written together so a reader can seek
+straight to the blocks for a time window and/or DGN without scanning the
+segment.  Old segments are removed after max_segments.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import datetime
+import glob
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+import can
+
+MAGIC = b"RVCCAP"
+VERSION = 1
+HEADER = struct.Struct("<6sHHd")        # magic, version, record size, segment start time
+RECORD = struct.Struct("<dIBB8s")       # timestamp, arbitration id, dlc, flags, data
+SEGMENT_EXT = ".rvcc"
+INDEX_EXT = ".idx"
+
+FLAG_TX = 0x01
+FLAG_ERROR = 0x02
+
+
+def dgn_of(arbitration_id: int) -> int:
+    return (arbitration_id >> 8) & 0x1FFFF
+
+
+class CaptureWriter(object):
+    """ Write frames to segment files.  record() is called from the can watcher thread """
+
+    def __init__(self, directory: os.PathLike, segment_seconds: float = 3600, block_records: int = 1024,
+                 flush_interval: float = 5.0, max_segments: int = 168, compression_level: int = 6):
+        self.Logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.block_records = block_records
+        self.flush_interval = flush_interval
+        self.max_segments = max_segments
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._file = None
+        self._index = None
+        self._segment_end = 0
+        self._block = bytearray()
+        self._block_count = 0
+        self._block_dgns = set()
+        self._block_first = 0.0
+        self._block_last = 0.0
+        self._block_started = 0.0
+        self.records_written = 0
+        self.bytes_written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, timestamp: float, arbitration_id: int, data: bytes, flags: int = 0):
+        dlc = min(len(data), 8)
+        with self._lock:
+            if self._block_count == 0:
+                self._block_first = timestamp
+                self._block_started = time.monotonic()
+            self._block += RECORD.pack(timestamp, arbitration_id & 0x1FFFFFFF, dlc, flags, bytes(data[:dlc]))
+            self._block_count += 1
+            self._block_last = timestamp
+            self._block_dgns.add(dgn_of(arbitration_id))
+            if self._block_count >= self.block_records or (self._file is not None and timestamp >= self._segment_end):
+                self._write_block()
+
+    def record_message(self, message: can.Message, tx: bool = False):
+        flags = FLAG_TX if tx else 0
+        if message.is_error_frame:
+            flags |= FLAG_ERROR
+        self.record(message.timestamp if message.timestamp else time.time(), message.arbitration_id,
+                    message.data or b"", flags)
+
+    def poll(self):
+        """ write a partial block that is older than flush_interval """
+        with self._lock:
+            if self._block_count and time.monotonic() - self._block_started >= self.flush_interval:
+                self._write_block()
+
+    def close(self):
+        with self._lock:
+            if self._block_count:
+                self._write_block()
+            self._close_segment()
+
+    def _write_block(self):
+        """ lock must be held """
+        if self._file is None or self._block_first >= self._segment_end:
+            self._open_segment(self._block_first)
+
+        compressed = zlib.compress(bytes(self._block), self.compression_level)
+        offset = self._file.tell()
+        self._file.write(compressed)
+        self._file.flush()
+        entry = {"t0": self._block_first, "t1": self._block_last, "off": offset, "len": len(compressed),
+                 "n": self._block_count, "dgns": sorted(self._block_dgns)}
+        self._index.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._index.flush()
+
+        self.records_written += self._block_count
+        self.bytes_written += len(compressed)
+        self._block = bytearray()
+        self._block_count = 0
+        self._block_dgns = set()
+
+    def _open_segment(self, start_time: float):
+        self._close_segment()
+        # UTC so names don't repeat or go backwards when local time falls back for DST
+        name = "capture-" + datetime.datetime.fromtimestamp(start_time, datetime.timezone.utc).strftime("%Y%m%d-%H%M%SZ")
+        path = os.path.join(self.directory, name + SEGMENT_EXT)
+        # a segment started in the same second gets a _NN suffix, which sorts after the bare name
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"{name}_{n:02d}{SEGMENT_EXT}")
+            n += 1
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, start_time))
+        self._index = open(path + INDEX_EXT, "w")
+        self._segment_end = start_time + self.segment_seconds
+        self.Logger.info(f"Bus capture segment {path}")
+        self._remove_old_segments()
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._index.close()
+            self._file = None
+            self._index = None
+
+    def _remove_old_segments(self):
+        if not self.max_segments:
+            return
+        segments = list_segments(self.directory)
+        for path in segments[:-self.max_segments]:
+            for p in (path, path + INDEX_EXT):
+                try:
+                    os.remove(p)
+                except OSError as e:
+                    self.Logger.error(f"Failed to remove old capture {p}: {e}")
+
+    def get_metrics(self) -> dict:
+        return {"records": self.records_written, "bytes": self.bytes_written}
+
+
+def segment_start_time(segment: os.PathLike) -> float:
+    """ start time from the segment header or None if it can't be read """
+    try:
+        with open(segment, "rb") as f:
+            (magic, version, record_size, start_time) = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return start_time if magic == MAGIC else None
+
+
+def list_segments(directory: os.PathLike) -> list:
+    """ segment files in time order of their header start time.  A segment
+    without a readable header (just created) is treated as the newest """
+    segments = []
+    for path in glob.glob(os.path.join(directory, "capture-*" + SEGMENT_EXT)):
+        start_time = segment_start_time(path)
+        segments.append((float("inf") if start_time is None else start_time, path))
+    return [path for (_, path) in sorted(segments)]
+
+
+class CaptureReader(object):
+    """ Read frames from a capture directory (or a single segment file) using the index """
+
+    def __init__(self, path: os.PathLike):
+        if os.path.isdir(path):
+            self.segments = list_segments(path)
+        else:
+            self.segments = [path]
+
+    @staticmethod
+    def load_index(segment: os.PathLike) -> list:
+        entries = []
+        try:
+            with open(segment + INDEX_EXT, "r") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break   # partial line from a crash
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def blocks(self, start: float = None, end: float = None, dgns: set = None):
+        """ yield (segment, index entry) for blocks that may hold matching frames """
+        for segment in self.segments:
+            for entry in CaptureReader.load_index(segment):
+                if start is not None and entry["t1"] < start:
+                    continue
+                if end is not None and entry["t0"] > end:
+                    break
+                if dgns is not None and dgns.isdisjoint(entry["dgns"]):
+                    continue
+                yield (segment, entry)
+
+    def read(self, start: float = None, end: float = None, dgns: set = None):
+        """ yield (timestamp, arbitration_id, flags, data) in time order.
+        dgns is a set of int DGNs """
+        f = None
+        current = None
+        try:
+            for (segment, entry) in self.blocks(start, end, dgns):
+                if segment != current:
+                    if f is not None:
+                        f.close()
+                    f = open(segment, "rb")
+                    (magic, version, record_size, _) = HEADER.unpack(f.read(HEADER.size))
+                    if magic != MAGIC or record_size != RECORD.size:
+                        raise ValueError(f"{segment} is not a supported capture file")
+                    current = segment
+                f.seek(entry["off"])
+                raw = zlib.decompress(f.read(entry["len"]))
+                for (ts, arb_id, dlc, flags, data) in RECORD.iter_unpack(raw):
+                    if start is not None and ts < start:
+                        continue
+                    if end is not None and ts > end:
+                        return
+                    if dgns is not None and dgn_of(arb_id) not in dgns:
+                        continue
+                    yield (ts, arb_id, flags, data[:dlc])
+        finally:
+            if f is not None:
+                f.close()
+
+    def messages(self, start: float = None, end: float = None, dgns: set = None, channel: str = None):
+        """ yield python-can Messages """
+        for (ts, arb_id, flags, data) in self.read(start, end, dgns):
+            yield can.Message(timestamp=ts, arbitration_id=arb_id, is_extended_id=True, data=data,
+                              is_error_frame=bool(flags & FLAG_ERROR), is_rx=not (flags & FLAG_TX), channel=channel)
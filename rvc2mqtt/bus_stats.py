@@ -0,0 +1,117 @@
+"""
+Can bus load and per node traffic statistics
+
+The can watcher records every frame (including error frames) into fixed size
+count arrays indexed by source address and DGN.  sample() is called on an
+interval and returns rates for the interval - bus utilization against the
+RV-C bit rate, frames/sec per source address and per DGN, error frames and
+the top talkers - then starts a new interval.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import array
+import threading
+import time
+
+
+class BusStatistics(object):
+    """ Count frames and bits on the bus """
+
+    RVC_BIT_RATE = 250000
+
+    # extended (29 bit id) data frame without bit stuffing: SOF, id, SRR, IDE, RTR,
+    # r1, r0, DLC, CRC, delimiters, ACK, EOF and interframe space
+    FRAME_OVERHEAD_BITS = 67
+
+    SOURCE_ADDRESSES = 256
+    DGNS = 0x20000
+
+    def __init__(self, bit_rate: int = RVC_BIT_RATE, top_count: int = 5):
+        self.bit_rate = bit_rate
+        self.top_count = top_count
+        self._lock = threading.Lock()
+
+        # totals since start
+        self.total_frames = 0
+        self.total_error_frames = 0
+
+        # current interval
+        self._sa_counts = array.array("I", [0]) * BusStatistics.SOURCE_ADDRESSES
+        self._dgn_counts = array.array("I", [0]) * BusStatistics.DGNS
+        self._dgns_seen = []    # dgns with a non zero count in _dgn_counts
+        self._frames = 0
+        self._error_frames = 0
+        self._bits = 0
+        self._interval_start = time.monotonic()
+        self.last_sample = None
+
+    def record(self, arbitration_id: int, dlc: int, is_error_frame: bool = False):
+        """ count one frame.  Called from the can watcher thread """
+        with self._lock:
+            if is_error_frame:
+                self._error_frames += 1
+                self.total_error_frames += 1
+                return
+            sa = arbitration_id & 0xFF
+            dgn = (arbitration_id >> 8) & 0x1FFFF
+            self._sa_counts[sa] += 1
+            c = self._dgn_counts[dgn]
+            if c == 0:
+                self._dgns_seen.append(dgn)
+            self._dgn_counts[dgn] = c + 1
+            self._bits += BusStatistics.FRAME_OVERHEAD_BITS + 8 * dlc
+            self._frames += 1
+            self.total_frames += 1
+
+    def sample(self) -> dict:
+        """ rates since the last sample.  Starts a new interval """
+        now = time.monotonic()
+        with self._lock:
+            elapsed = max(now - self._interval_start, 0.001)
+            sa_counts = self._sa_counts
+            dgn_counts = [(dgn, self._dgn_counts[dgn]) for dgn in self._dgns_seen]
+            for dgn in self._dgns_seen:
+                self._dgn_counts[dgn] = 0
+            self._dgns_seen = []
+            self._sa_counts = array.array("I", [0]) * BusStatistics.SOURCE_ADDRESSES
+            frames = self._frames
+            error_frames = self._error_frames
+            bits = self._bits
+            self._frames = 0
+            self._error_frames = 0
+            self._bits = 0
+            self._interval_start = now
+            total_frames = self.total_frames
+            total_error_frames = self.total_error_frames
+
+        by_source = {f"{sa:02X}": round(c / elapsed, 2) for (sa, c) in enumerate(sa_counts) if c}
+        by_dgn = {f"{dgn:05X}": round(c / elapsed, 2) for (dgn, c) in sorted(dgn_counts)}
+        top = sorted(by_source.items(), key=lambda kv: kv[1], reverse=True)[:self.top_count]
+
+        self.last_sample = {
+            "interval_s": round(elapsed, 2),
+            "utilization_pct": round(bits * 100.0 / (elapsed * self.bit_rate), 2),
+            "bits_per_sec": round(bits / elapsed),
+            "frames_per_sec": round(frames / elapsed, 2),
+            "error_frames": error_frames,
+            "error_frames_per_sec": round(error_frames / elapsed, 2),
+            "total_frames": total_frames,
+            "total_error_frames": total_error_frames,
+            "top_talkers": [{"source_address": sa, "frames_per_sec": fps} for (sa, fps) in top],
+            "by_source_address": by_source,
+            "by_dgn": by_dgn}
+        return self.last_sample
@@ -27,30 +27,78 @@ import threading
 import can
 import logging
 import queue
+import time
+from rvc2mqtt.metrics import Metrics
+from rvc2mqtt.flight_recorder import FlightRecorder
+from rvc2mqtt.bus_stats import BusStatistics
+from rvc2mqtt.watchdog import LoopMonitor
+from rvc2mqtt.bus_capture import CaptureWriter
 
 class CAN_Watcher(threading.Thread):
-    def __init__(self, interface, rx_queue: queue.Queue, tx_queue: queue.Queue):
+    RECV_TIMEOUT = 0.25
+
+    def __init__(self, interface, rx_queue: queue.Queue, tx_queue: queue.Queue, metrics: Metrics = None,
+                 recorder: FlightRecorder = None, bus_stats: BusStatistics = None, capture: CaptureWriter = None,
+                 bustype: str = "socketcan"):
         threading.Thread.__init__(self)
         # A flag to notify the thread that it should finish up and exit
         self.kill_received = False
         self.Logger = logging.getLogger(__name__)
-        self.Logger.info(f"Starting can bus on interface {interface}")
-        self.bus = can.interface.Bus(channel=interface, interface="socketcan")
+        self.Logger.info(f"Starting can bus on interface {interface} ({bustype})")
+        self.bus = can.interface.Bus(channel=interface, interface=bustype)
         self.rx = rx_queue
         self.tx = tx_queue
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.recorder = recorder
+        self.bus_stats = bus_stats
+        self.capture = capture
+        self.loop_monitor = LoopMonitor("can_watcher", self.metrics, CAN_Watcher.RECV_TIMEOUT)
+        self.last_rx_time = None
+
+    def seconds_since_last_frame(self) -> float:
+        if self.last_rx_time is None:
+            return -1
+        return round(time.monotonic() - self.last_rx_time, 3)
 
     def run(self):
         while not self.kill_received:
-            message = self.bus.recv(.25)  # read messages from a canbus
-            if message is not None and not message.is_error_frame:
-                self.rx.put(message)  # Put message into queue
+            self.loop_monitor.tick()
+            message = self.bus.recv(CAN_Watcher.RECV_TIMEOUT)  # read messages from a canbus
+            if message is not None:
+                if self.recorder is not None:
+                    self.recorder.record_message(message)
+                if self.bus_stats is not None:
+                    self.bus_stats.record(message.arbitration_id, message.dlc, message.is_error_frame)
+                if self.capture is not None:
+                    self.capture.record_message(message)
+                if message.is_error_frame:
+                    self.metrics.inc("can_error_frames")
+                else:
+                    self.last_rx_time = time.monotonic()
+                    self.rx.put(message)  # Put message into queue
+                    self.metrics.inc("can_rx_frames")
+            if self.capture is not None:
+                self.capture.poll()
 
             if not self.tx.empty():   # pending message to send
                 msg_dict = self.tx.get() # pull from queue
                 try:
                     tx_message = can.Message(arbitration_id=msg_dict["arbitration_id"], data=msg_dict["data"], is_extended_id=True)
                     self.bus.send(tx_message, 1)  # send on canbus
+                    self.metrics.inc("can_tx_frames")
+                    if self.recorder is not None:
+                        self.recorder.record_message(tx_message, tx=True)
+                    if self.bus_stats is not None:
+                        self.bus_stats.record(tx_message.arbitration_id, tx_message.dlc)
+                    if self.capture is not None:
+                        self.capture.record_message(tx_message, tx=True)
+                    now = time.perf_counter()
+                    if "tx_queued_time" in msg_dict:
+                        self.metrics.observe("can_tx_latency", now - msg_dict["tx_queued_time"])
+                    if "cmd_received_time" in msg_dict:
+                        self.metrics.observe("cmd_to_bus_latency", now - msg_dict["cmd_received_time"])
                 except Exception as e:
+                    self.metrics.inc("can_tx_errors")
                     self.Logger.error(f"Exception trying to send {e}")
                     self.Logger.debug(f"Failed Msg: {str(tx_message)}")
                 
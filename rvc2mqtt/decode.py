@@ -0,0 +1,413 @@
+"""
+Offline RV-C log decode
+
+Decodes can logs (candump, BLF, ASC or any log python-can reads, and bus
+captures) with RVC_Decoder in a pool of worker processes and writes one record
+per frame with the same parameterized field names the bridge uses
+(`arbitration_id`, `dgn`, `source_id`, `name`, `operating_status_brightness`, ...)
+plus the log `timestamp`.
+
+candump logs are split into byte ranges at line boundaries and each worker
+reads and parses its own range.  Other formats are read in this process and
+handed to the workers in batches of frames.  Output is in log order.
+
+    rvc2mqtt-decode candump-2022-06-*.log -o june.jsonl
+    rvc2mqtt-decode coach.blf -o coach.csv --name DC_DIMMER_STATUS_3
+    rvc2mqtt-decode coach.log -o coach.parquet --jobs 8
+
+Formats are jsonl (default), csv and parquet (needs pyarrow).  csv and parquet
+need every column before the first row, so chunks are spooled as jsonl to a
+temporary directory and converted by the workers once all columns are known.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import collections
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import can
+from rvc2mqtt.rvc import RVC_Decoder
+
+SPEC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rvc-spec.yml")
+FORMATS = ("jsonl", "csv", "parquet")
+CHUNK_BYTES = 8 * 1024 * 1024       # candump byte range per task
+BATCH_FRAMES = 50000                # frames per task for other formats
+CACHE_SIZE = 100000                 # distinct (id, data) decodes kept per worker
+
+# worker process state, set by _init_worker
+_decoder = None
+_names = None
+_cache = {}
+
+
+def format_for(path: str) -> str:
+    """ output format from the output file extension """
+    ext = os.path.splitext(path or "")[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    return "jsonl"
+
+
+def is_candump(path: os.PathLike) -> bool:
+    """ candump -l text log.  Those can be split at line boundaries """
+    if os.path.isdir(path) or not str(path).lower().endswith(".log"):
+        return False
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                return line.lstrip().startswith(b"(")
+    return False
+
+
+def candump_chunks(path: os.PathLike, chunk_bytes: int = CHUNK_BYTES) -> list:
+    """ (path, start, end) byte ranges covering the file.  A line belongs to the range it starts in """
+    size = os.path.getsize(path)
+    return [(str(path), start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def read_candump_range(path: os.PathLike, start: int, end: int) -> bytes:
+    """ the whole lines that start in [start, end) """
+    with open(path, "rb") as f:
+        if start > 0:
+            # the line that started before start belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        if pos >= end:
+            return b""
+        block = f.read(end - pos)
+        if block and not block.endswith(b"\n"):
+            block += f.readline()
+    return block
+
+
+def _frames(messages):
+    """ (timestamp, arbitration_id, data, skip) from can.Message.  Error and remote frames are skipped """
+    for m in messages:
+        yield (m.timestamp, m.arbitration_id, bytes(m.data), m.is_error_frame or m.is_remote_frame)
+
+
+def frame_batches(path: os.PathLike, batch: int = BATCH_FRAMES):
+    """ frames of a non candump log or a capture in lists of batch """
+    if os.path.isdir(path) or str(path).endswith(".rvcc"):
+        from rvc2mqtt.bus_capture import CaptureReader
+        messages = CaptureReader(path).messages()
+    else:
+        messages = can.LogReader(path)
+    frames = []
+    for f in _frames(messages):
+        frames.append(f)
+        if len(frames) >= batch:
+            yield frames
+            frames = []
+    if frames:
+        yield frames
+
+
+def load_spec(path: os.PathLike = SPEC_FILE) -> dict:
+    d = RVC_Decoder()
+    d.load_rvc_spec(path)
+    return d.spec
+
+
+def _init_worker(spec: dict, names: list = None, verbose: int = 0):
+    """ process pool initializer.  The spec is loaded once by the parent and handed over """
+    global _decoder, _names, _cache
+    if not verbose:
+        # unknown dgn warnings and short frame errors, once per distinct frame, would flood the console
+        logging.getLogger("rvc2mqtt.rvc").setLevel(logging.CRITICAL)
+    _decoder = RVC_Decoder()
+    _decoder.spec = spec
+    _names = set(names) if names else None
+    _cache = {}
+
+
+def _decode(arbitration_id: int, data: bytes):
+    """ (name, json of the decoded fields without the opening brace, ((field, type), ...)) or None
+    when the frame fails to decode.  Coach traffic repeats the same frames so decodes are cached """
+    key = (arbitration_id, data)
+    entry = _cache.get(key, False)
+    if entry is not False:
+        return entry
+    try:
+        decoded = _decoder.rvc_decode(arbitration_id, data.hex().upper())
+        text = json.dumps(decoded, default=str)
+        entry = (decoded["name"], text[1:], tuple((k, type(v).__name__) for (k, v) in decoded.items()))
+    except Exception:
+        entry = None
+    if len(_cache) >= CACHE_SIZE:
+        _cache.clear()
+    _cache[key] = entry
+    return entry
+
+
+def _decode_frames(frames) -> tuple:
+    """ jsonl text, counters and {field: {type name}} of the decoded frames """
+    out = []
+    stats = {"frames": 0, "decoded": 0, "unknown": 0, "decode_errors": 0, "skipped": 0, "filtered": 0}
+    used = {}
+    for (timestamp, arbitration_id, data, skip) in frames:
+        stats["frames"] += 1
+        if skip:
+            stats["skipped"] += 1
+            continue
+        entry = _decode(arbitration_id, data)
+        if entry is None:
+            stats["decode_errors"] += 1
+            continue
+        if _names is not None and entry[0] not in _names:
+            stats["filtered"] += 1
+            continue
+        if entry[0].startswith("UNKNOWN-"):
+            stats["unknown"] += 1
+        stats["decoded"] += 1
+        used[id(entry)] = entry
+        out.append('{"timestamp": ' + repr(float(timestamp)) + ', ' + entry[1])
+
+    fields = {}
+    for entry in used.values():
+        for (k, t) in entry[2]:
+            fields.setdefault(k, set()).add(t)
+    return ("".join(line + "\n" for line in out), stats, fields)
+
+
+def _finish(result: tuple, spool: str) -> tuple:
+    """ the jsonl text, or the spool file it was written to """
+    (text, stats, fields) = result
+    if spool is None:
+        return (text, stats, fields)
+    with open(spool, "w", encoding="utf-8") as f:
+        f.write(text)
+    return (spool, stats, fields)
+
+
+def _candump_task(task: tuple) -> tuple:
+    (path, start, end, spool) = task
+    block = read_candump_range(path, start, end).decode("ascii", errors="replace")
+    return _finish(_decode_frames(_frames(can.CanutilsLogReader(io.StringIO(block)))), spool)
+
+
+def _frames_task(task: tuple) -> tuple:
+    (frames, spool) = task
+    return _finish(_decode_frames(frames), spool)
+
+
+def _read_spool(spool: str) -> list:
+    with open(spool, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    os.remove(spool)
+    return records
+
+
+def _csv_task(task: tuple) -> str:
+    (spool, columns) = task
+    out = io.StringIO()
+    writer = csv.DictWriter(out, columns, restval="", extrasaction="ignore", lineterminator="\n")
+    writer.writerows(_read_spool(spool))
+    return out.getvalue()
+
+
+def arrow_type(type_names: set) -> str:
+    """ parquet column type for the python types seen in a field """
+    if type_names == {"bool"}:
+        return "bool"
+    if type_names == {"int"}:
+        return "int64"
+    if type_names and type_names <= {"int", "float"}:
+        return "float64"
+    return "string"
+
+
+def _arrow_schema(columns: list, types: list):
+    import pyarrow as pa
+    make = {"bool": pa.bool_, "int64": pa.int64, "float64": pa.float64, "string": pa.string}
+    return pa.schema([(c, make[t]()) for (c, t) in zip(columns, types)])
+
+
+def _parquet_task(task: tuple):
+    import pyarrow as pa
+    (spool, columns, types) = task
+    records = _read_spool(spool)
+    data = {}
+    for (c, t) in zip(columns, types):
+        values = [r.get(c) for r in records]
+        if t == "string":
+            values = [v if v is None or isinstance(v, str) else json.dumps(v) for v in values]
+        elif t == "float64":
+            values = [v if v is None else float(v) for v in values]
+        data[c] = values
+    return pa.Table.from_pydict(data, schema=_arrow_schema(columns, types))
+
+
+def _run(pool, func, tasks, window: int):
+    """ results of func over tasks in task order.  At most window tasks are queued so
+    reading a large log doesn't get far ahead of the workers """
+    if pool is None:
+        for t in tasks:
+            yield func(t)
+        return
+    pending = collections.deque()
+    for t in tasks:
+        pending.append(pool.apply_async(func, (t,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def _tasks(paths: list, spool_dir: str, chunk_bytes: int, batch: int):
+    """ (function, task) for every chunk of every log, in log order """
+    n = 0
+    for path in paths:
+        candump = is_candump(path)
+        chunks = candump_chunks(path, chunk_bytes) if candump else frame_batches(path, batch)
+        for chunk in chunks:
+            spool = None if spool_dir is None else os.path.join(spool_dir, f"{n:08d}.jsonl")
+            n += 1
+            yield (_candump_task, chunk + (spool,)) if candump else (_frames_task, (chunk, spool))
+
+
+def _call(task: tuple):
+    (func, args) = task
+    return func(args)
+
+
+def decode_logs(paths: list, output, fmt: str = "jsonl", jobs: int = None, names: list = None,
+                spec_path: os.PathLike = SPEC_FILE, chunk_bytes: int = CHUNK_BYTES, batch: int = BATCH_FRAMES,
+                verbose: int = 0) -> dict:
+    """ decode the logs to output (a path, or a text stream for jsonl and csv) and return the counters """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format {fmt}")
+    if fmt == "parquet":
+        import pyarrow.parquet as pq     # optional.  Raises ImportError before any work is done
+    jobs = jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    spec = load_spec(spec_path)
+
+    pool = None
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(spec, names, verbose))
+    else:
+        _init_worker(spec, names, verbose)
+    window = jobs * 2
+
+    stats = {"frames": 0, "decoded": 0, "unknown": 0, "decode_errors": 0, "skipped": 0, "filtered": 0}
+    fields = {"timestamp": {"float"}}
+    spools = []
+    spool_dir = None
+    close = False
+    try:
+        if fmt != "jsonl":
+            spool_dir = tempfile.mkdtemp(prefix="rvc2mqtt-decode-")
+        if fmt != "parquet" and isinstance(output, (str, os.PathLike)):
+            output = open(output, "w", encoding="utf-8", newline="")
+            close = True
+
+        for (result, chunk_stats, chunk_fields) in _run(pool, _call, _tasks(paths, spool_dir, chunk_bytes, batch),
+                                                        window):
+            for (k, v) in chunk_stats.items():
+                stats[k] += v
+            for (k, t) in chunk_fields.items():
+                fields.setdefault(k, set()).update(t)
+            if spool_dir is None:
+                output.write(result)
+            else:
+                spools.append(result)
+
+        columns = list(fields.keys())
+        if fmt == "csv":
+            writer = csv.writer(output, lineterminator="\n")
+            writer.writerow(columns)
+            for text in _run(pool, _csv_task, ((s, columns) for s in spools), window):
+                output.write(text)
+        elif fmt == "parquet":
+            types = [arrow_type(fields[c]) for c in columns]
+            with pq.ParquetWriter(output, _arrow_schema(columns, types)) as writer:
+                for table in _run(pool, _parquet_task, ((s, columns, types) for s in spools), window):
+                    if table.num_rows:
+                        writer.write_table(table)
+    finally:
+        if close:
+            output.close()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if spool_dir is not None:
+            for name in os.listdir(spool_dir):
+                os.remove(os.path.join(spool_dir, name))
+            os.rmdir(spool_dir)
+
+    stats["columns"] = len(fields)
+    stats["jobs"] = jobs
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    stats["frames_per_second"] = round(stats["frames"] / stats["seconds"]) if stats["seconds"] > 0 else 0
+    return stats
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="rvc2mqtt-decode",
+                                     description="Decode RV-C can logs to jsonl, csv or parquet")
+    parser.add_argument("logs", nargs="+", help="candump .log, .blf, .asc or other python-can logs, or bus captures")
+    parser.add_argument("-o", "--output", default="-", help="output file.  Default is jsonl to stdout")
+    parser.add_argument("--format", choices=FORMATS, help="output format.  Default is from the output extension")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes.  Default is the cpu count")
+    parser.add_argument("--name", dest="names", action="append", default=[],
+                        help="only write frames that decode to this dgn name.  Can be given more than once")
+    parser.add_argument("--spec", default=SPEC_FILE, help="rvc spec yaml file")
+    parser.add_argument("--chunk_mb", type=float, default=CHUNK_BYTES / (1024 * 1024),
+                        help="candump bytes (MiB) per worker task")
+    parser.add_argument("--batch", type=int, default=BATCH_FRAMES, help="frames per worker task for other formats")
+    parser.add_argument("-v", "--verbose", dest="verbose", action="count", default=0,
+                        help="Increase verbosity of stdout logger. Add multiple times to increase")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.verbose == 0 else logging.DEBUG, stream=sys.stderr,
+                        format="%(levelname)s %(asctime)s - %(message)s")
+    Logger = logging.getLogger(__name__)
+
+    fmt = args.format or format_for(args.output)
+    if args.output == "-":
+        if fmt == "parquet":
+            Logger.error("parquet output needs an output file (-o)")
+            return 1
+        output = sys.stdout
+    else:
+        output = args.output
+
+    try:
+        stats = decode_logs(args.logs, output, fmt, args.jobs, args.names, args.spec,
+                            max(1, int(args.chunk_mb * 1024 * 1024)), args.batch, args.verbose)
+    except ImportError as e:
+        Logger.error(f"{fmt} output needs pyarrow (pip install pyarrow): {e}")
+        return 1
+
+    print(f"{stats['frames']} frames in {stats['seconds']} s ({stats['frames_per_second']}/s, {stats['jobs']} jobs): "
+          f"{stats['decoded']} written, {stats['unknown']} unknown dgn, {stats['decode_errors']} decode errors, "
+          f"{stats['skipped']} error/remote frames skipped, {stats['filtered']} filtered", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
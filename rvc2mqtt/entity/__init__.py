@@ -70,6 +70,25 @@ class EntityPluginBaseClass(object):
         """
         pass
 
+    def restore_retained_state(self, retained: dict):
+        """ Optional function
+        Will get called once before initialize when retained state was
+        loaded from the mqtt broker at startup.  retained is a dict of
+        topic -> payload (bytes).
+
+        Restoring values into the object lets it skip publishing values the
+        broker already has.
+        """
+        pass
+
+    def retained_choice(self, retained: dict, topic: str, choices: tuple) -> str:
+        """ for restore_retained_state.  The retained payload of topic if it is
+        one of choices, otherwise None (missing, placeholder or invalid) """
+        if topic not in retained:
+            return None
+        value = retained[topic].decode("utf-8", errors="replace")
+        return value if value in choices else None
+
     def publish_ha_discovery_config(self):
         """Publish Home Assistant MQTT auto-discovery config.
         Override in subclasses that support HA discovery."""
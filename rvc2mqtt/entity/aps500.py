@@ -239,19 +239,19 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
         """
 
         if self._is_entry_match(self.rvc_match_source_status_1, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             return True
 
         if self._is_entry_match(self.rvc_match_source_status_2, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             return True
 
         if self._is_entry_match(self.rvc_match_source_status_3, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             return True
 
         if self._is_entry_match(self.rvc_match_source_status_4, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if new_message["desired_charge_state"] != self._desired_charge_state:
                 self._desired_charge_state = new_message["desired_charge_state"]
@@ -269,7 +269,7 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_match_source_status_5, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if self._hp_dc_voltage != new_message["hp_dc_voltage"]:
                 self._hp_dc_voltage = new_message["hp_dc_voltage"]
@@ -279,7 +279,7 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_match_charger_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if self._charge_voltage != new_message["charge_voltage"]:
                 self._charge_voltage = new_message["charge_voltage"]
@@ -313,7 +313,7 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_match_charger_status_2, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if self._charging_voltage != new_message["charging_voltage"]:
                 self._charging_voltage = new_message["charging_voltage"]
@@ -332,7 +332,7 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
 
 
         if self._is_entry_match(self.rvc_match_charger_configuration_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if self._charging_algorithm != new_message["charging_algorithm"]:
                 self._charging_algorithm = new_message["charging_algorithm"]
@@ -352,7 +352,7 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_match_battery_status_11, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if self._charge_detected != new_message["charge_detected"]:
                 self._charge_detected = new_message["charge_detected"]
@@ -367,7 +367,7 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_match_dm_rv, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             message_fault_code = str(
                 int(f"{new_message['spn-msb']:08b}"
@@ -399,14 +399,19 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
                     self._fault_description, retain=True)
 
             if self._lamp != lamp_status:
+                was_lit = self._lamp in ("red", "yellow")
                 self._lamp = lamp_status
                 self.mqtt_support.client.publish(
                 self.dm_rv_lamp_topic, self._lamp, retain=True)
+                if lamp_status != "off" and not was_lit:
+                    # this entity handles the frame so Diagnostic never sees it.
+                    # let listeners (like the flight recorder) capture what led up to it
+                    self.mqtt_support.report_fault(self.id, self._fault_description)
 
             return True
 
         if self._is_entry_match(self.rvc_match_terminal, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             messageproperties = Properties(PacketTypes.PUBLISH)
             # Set CorrelationData
@@ -0,0 +1,124 @@
+"""
+Built-in entity reporting can bus load and per node traffic
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import logging
+import time
+from rvc2mqtt.mqtt import MQTT_Support
+from rvc2mqtt.bus_stats import BusStatistics
+from rvc2mqtt.entity import EntityPluginBaseClass
+
+
+class BusLoadSensor(EntityPluginBaseClass):
+    """ Publish bus utilization, frame and error frame rates and top talkers
+
+    Not created from the floorplan.  The app creates it when bus statistics are
+    enabled and calls poll() from the main loop.
+
+    HA mqtt discovery is:
+        sensor/<uid>/utilization/config     - % of the 250 kbit/s bus
+            with attributes that include the full sample (per source address and per DGN)
+        sensor/<uid>/frame_rate/config      - frames/sec
+        sensor/<uid>/error_frames/config    - error frames since start
+
+    """
+
+    def __init__(self, data: dict, mqtt_support: MQTT_Support, bus_stats: BusStatistics, interval: float = 10.0):
+        self.id = "bus_load-" + str(data.get("interface", "can0"))
+        super().__init__(data, mqtt_support)
+        self.Logger = logging.getLogger(__class__.__name__)
+
+        self.bus_stats = bus_stats
+        self.interval = interval
+        self._next_publish = time.monotonic() + interval
+
+        self.attributes_topic = mqtt_support.make_device_topic_string(self.id, "attributes", True)
+        self.frame_rate_topic = mqtt_support.make_device_topic_string(self.id, "frame_rate", True)
+        self.error_frames_topic = mqtt_support.make_device_topic_string(self.id, "error_frames", True)
+
+        self.name = data.get("instance_name", "CAN Bus")
+        self.device = {"manufacturer": "rvc2mqtt",
+                       "via_device": self.mqtt_support.get_bridge_ha_name(),
+                       "identifiers": self.unique_device_id,
+                       "name": self.name,
+                       "model": "CAN bus load"
+                       }
+
+    def process_rvc_msg(self, new_message: dict) -> bool:
+        """ counts come from the can watcher.  No decoded messages are handled """
+        return False
+
+    def poll(self):
+        """ called from the main loop.  Publish on the interval """
+        now = time.monotonic()
+        if now < self._next_publish:
+            return
+        self._next_publish = now + self.interval
+        self.publish_sample(self.bus_stats.sample())
+
+    def publish_sample(self, sample: dict):
+        self.mqtt_support.client.publish(self.status_topic, sample["utilization_pct"], retain=True)
+        self.mqtt_support.client.publish(self.frame_rate_topic, sample["frames_per_sec"], retain=True)
+        self.mqtt_support.client.publish(self.error_frames_topic, sample["total_error_frames"], retain=True)
+        self.mqtt_support.client.publish(self.attributes_topic, json.dumps(sample), retain=True)
+
+    def publish_ha_discovery_config(self):
+        config = {"name": self.name + " utilization",
+                  "state_topic": self.status_topic,
+                  "qos": 1, "retain": False,
+                  "unit_of_measurement": "%",
+                  "state_class": "measurement",
+                  "json_attributes_topic": self.attributes_topic,
+                  "unique_id": self.unique_device_id + "_utilization",
+                  "device": self.device}
+        config.update(self.get_availability_discovery_info_for_ha())
+        ha_config_topic = self.mqtt_support.make_ha_auto_discovery_config_topic(self.unique_device_id, "sensor", "utilization")
+        self.mqtt_support.client.publish(ha_config_topic, json.dumps(config), retain=False)
+
+        config = {"name": self.name + " frame rate",
+                  "state_topic": self.frame_rate_topic,
+                  "qos": 1, "retain": False,
+                  "unit_of_measurement": "frames/s",
+                  "state_class": "measurement",
+                  "unique_id": self.unique_device_id + "_frame_rate",
+                  "device": self.device}
+        config.update(self.get_availability_discovery_info_for_ha())
+        ha_config_topic = self.mqtt_support.make_ha_auto_discovery_config_topic(self.unique_device_id, "sensor", "frame_rate")
+        self.mqtt_support.client.publish(ha_config_topic, json.dumps(config), retain=False)
+
+        config = {"name": self.name + " error frames",
+                  "state_topic": self.error_frames_topic,
+                  "qos": 1, "retain": False,
+                  "state_class": "total_increasing",
+                  "entity_category": "diagnostic",
+                  "unique_id": self.unique_device_id + "_error_frames",
+                  "device": self.device}
+        config.update(self.get_availability_discovery_info_for_ha())
+        ha_config_topic = self.mqtt_support.make_ha_auto_discovery_config_topic(self.unique_device_id, "sensor", "error_frames")
+        self.mqtt_support.client.publish(ha_config_topic, json.dumps(config), retain=False)
+
+    def initialize(self):
+        """ Optional function
+        Will get called once when the object is loaded.
+        RVC canbus tx queue is available
+        mqtt client is ready.
+
+        This can be a good place to request data
+        """
+        self.publish_ha_discovery_config()
@@ -91,7 +91,7 @@ class Datetime_DATE_TIME_STATUS(EntityPluginBaseClass):
         """
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             '''
             Process RV-C message and publish date and time
             '''
@@ -118,7 +118,7 @@ class Datetime_DATE_TIME_STATUS(EntityPluginBaseClass):
         elif self._is_entry_match(self.rvc_match_command, new_message):
             # This is the command.  Just eat the message so it doesn't show up
             # as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             return True
         return False
 
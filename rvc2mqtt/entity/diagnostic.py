@@ -138,11 +138,15 @@ class Diagnostic(EntityPluginBaseClass):
         else - return False
         """
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
+            was_fault = self.fault
             self.fault = new_message["red_lamp_status"] != '00'
             self.fault_msg = f"Failure Mode Identifier: {new_message['fmi']} - {new_message['fmi_definition']}" 
             self.fault_attributes = new_message
+            if self.fault and not was_fault:
+                # let listeners (like the flight recorder) capture what led up to it
+                self.mqtt_support.report_fault(self.id, self.fault_msg)
 
             self.warning = new_message["yellow_lamp_status"] != '00'
             self.warning_msg = f"Failure Mode Identifier: {new_message['fmi']} - {new_message['fmi_definition']}" 
@@ -88,7 +88,7 @@ class DimmerSwitch_DC_DIMMER_STATUS_3(EntityPluginBaseClass):
         """
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["operating_status_brightness"] != 0.0:
                 self.messagestate = DimmerSwitch_DC_DIMMER_STATUS_3.LIGHT_ON
             elif new_message["operating_status_brightness"] == 0.0:
@@ -109,7 +109,7 @@ class DimmerSwitch_DC_DIMMER_STATUS_3(EntityPluginBaseClass):
         elif self._is_entry_match(self.rvc_match_command, new_message):
             # This is the command.  Just eat the message so it doesn't show up
             # as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             return True
         return False
 
@@ -158,6 +158,11 @@ class DimmerSwitch_DC_DIMMER_STATUS_3(EntityPluginBaseClass):
             self.rvc_group, 2), 250, 5, 0xFF, 0, 0xFF, 0xFF)
         self.send_queue.put({"dgn": "1FEDB", "data": msg_bytes})
 
+    def restore_retained_state(self, retained: dict):
+        state = self.retained_choice(retained, self.status_topic, (DimmerSwitch_DC_DIMMER_STATUS_3.LIGHT_ON, DimmerSwitch_DC_DIMMER_STATUS_3.LIGHT_OFF))
+        if state is not None:
+            self.state = state
+
     def publish_ha_discovery_config(self):
         origin = {'name': self.mqtt_support.get_bridge_ha_name()}
         config = {'o': origin,
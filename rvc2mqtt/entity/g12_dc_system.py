@@ -107,7 +107,7 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
         # For now only match the status message.
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             self.dc_voltage = new_message["dc_voltage"]
             self.dc_current = new_message["dc_current"]
             self._update_mqtt_topics_with_changed_values()
@@ -130,6 +130,17 @@ class DcSystemSensor_DC_SOURCE_STATUS_1(EntityPluginBaseClass):
         return False
 
 
+    def restore_retained_state(self, retained: dict):
+        try:
+            if self.status_dc_voltage_topic in retained:
+                self._dc_voltage = float(retained[self.status_dc_voltage_topic])
+                self._voltage_changed = False
+            if self.status_dc_current_topic in retained:
+                self._dc_current = float(retained[self.status_dc_current_topic])
+                self._current_changed = False
+        except ValueError:
+            return
+
     def publish_ha_discovery_config(self):
         origin = {'name': self.mqtt_support.get_bridge_ha_name()}
         voltscmp = {'p': 'sensor', 'device_class': 'voltage',
@@ -86,7 +86,7 @@ class TankLevelSensor_TANK_STATUS(EntityPluginBaseClass):
         # For now only match the status message.
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             # These events happen a lot.  Lets filter down to when the value changed by more than diff_min
             if abs(new_message["tank_level"] - self.tank_level) >= int(self.diff_min):
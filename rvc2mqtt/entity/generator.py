@@ -83,7 +83,7 @@ class Generator_GENERATOR(EntityPluginBaseClass):
         """
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["status"] != self.status:
                 self.status = new_message["status"]
                 status_json = json.dumps(
@@ -101,7 +101,7 @@ class Generator_GENERATOR(EntityPluginBaseClass):
             return True
 
         elif self._is_entry_match(self.rvc_match_dimmer_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["operating_status_brightness"] != 0.0:
                 self.messagestate = "on"
             elif new_message["operating_status_brightness"] == 0.0:
@@ -123,7 +123,7 @@ class Generator_GENERATOR(EntityPluginBaseClass):
         elif self._is_entry_match(self.rvc_match_command, new_message):
             # This is the command.  Just eat the message so it doesn't show up
             # as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             return True
 
         return False
@@ -326,7 +326,7 @@ class HvacClass(EntityPluginBaseClass):
 
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             self.fan_mode = FanMode.get_fan_mode_from_rvc(int(new_message["fan_speed"]), new_message["fan_mode_definition"] )
             # use cool because for this implementation we will update cool and heat to the same value
@@ -339,7 +339,7 @@ class HvacClass(EntityPluginBaseClass):
             self._update_mqtt_topics_with_changed_values()
             return True
         elif self._is_entry_match(self.rvc_match_command, new_message):
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             # do nothing from command
         return False
 
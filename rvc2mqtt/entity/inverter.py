@@ -200,7 +200,7 @@ class InverterCharger_INVERTER_STATUS(EntityPluginBaseClass):
         _prefix = f"{self.topic_base}/line{_line}/{_in_out}"
 
         if self._is_entry_match(self.rvc_match_inverter_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if new_message["status"] != self.status:
                 self.status = new_message["status"]
@@ -225,7 +225,7 @@ class InverterCharger_INVERTER_STATUS(EntityPluginBaseClass):
             return True
 
         elif self._is_entry_match(self.rvc_match_inverter_ac_status_1, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             _volt = new_message["rms_voltage"]
             _volt_key = f"{_line}-{_in_out}-rms_voltage"
             _volt_topic = f"{_prefix}/{self.rms_voltage_topic}"
@@ -286,7 +286,7 @@ class InverterCharger_INVERTER_STATUS(EntityPluginBaseClass):
             return True
 
         elif self._is_entry_match(self.rvc_match_inverter_ac_status_2, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             _volt = new_message["peak_voltage"]
             _volt_key = f"{_line}-{_in_out}-peak_voltage"
             _volt_topic = f"{_prefix}/{self.peak_voltage_topic}"
@@ -323,7 +323,7 @@ class InverterCharger_INVERTER_STATUS(EntityPluginBaseClass):
             return True
 
         elif self._is_entry_match(self.rvc_match_inverter_ac_status_3, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             _wave = new_message["waveform"]
             _wave_key = f"{_line}-{_in_out}-waveform"
             _wave_topic = f"{_prefix}/{self.waveform_topic}"
@@ -384,7 +384,7 @@ class InverterCharger_INVERTER_STATUS(EntityPluginBaseClass):
             return True
 
         elif self._is_entry_match(self.rvc_match_inverter_ac_status_4, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             _f_volt            = new_message["voltage_fault"]
             _f_volt_key        = f"{_line}-{_in_out}-voltage_fault"
             _f_volt_topic      = f"{_prefix}/{self.voltage_fault_topic}"
@@ -462,7 +462,7 @@ class InverterCharger_INVERTER_STATUS(EntityPluginBaseClass):
             return True
 
         elif self._is_entry_match(self.rvc_match_inverter_dc_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if new_message["dc_voltage"] != self.dc_voltage:
                 self.dc_voltage = new_message["dc_voltage"]
@@ -477,7 +477,7 @@ class InverterCharger_INVERTER_STATUS(EntityPluginBaseClass):
             return True
 
         elif self._is_entry_match(self.rvc_match_inverter_temperature_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if new_message["fet_1_temperature"] != self.fet_1_temperature:
                 self.fet_1_temperature = new_message["fet_1_temperature"]
@@ -500,7 +500,7 @@ class InverterCharger_INVERTER_STATUS(EntityPluginBaseClass):
         elif self._is_entry_match(self.rvc_match_command, new_message):
             # This is the command.  Just eat the message so it doesn't show up
             # as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             return True
 
         return False
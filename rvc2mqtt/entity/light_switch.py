@@ -80,7 +80,7 @@ class LightSwitch_DC_LOAD_STATUS(EntityPluginBaseClass):
         """
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["operating_status"] == 100.0:
                 self.state = LightSwitch_DC_LOAD_STATUS.LIGHT_ON
             elif new_message["operating_status"] == 0.0:
@@ -98,7 +98,7 @@ class LightSwitch_DC_LOAD_STATUS(EntityPluginBaseClass):
         elif self._is_entry_match(self.rvc_match_command, new_message):
             # This is the command.  Just eat the message so it doesn't show up
             # as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             return True
         return False
 
@@ -132,6 +132,11 @@ class LightSwitch_DC_LOAD_STATUS(EntityPluginBaseClass):
             self.rvc_group, 2), 250, 0, 1, 0xFF, 0)
         self.send_queue.put({"dgn": "1FFBC", "data": msg_bytes})
 
+    def restore_retained_state(self, retained: dict):
+        state = self.retained_choice(retained, self.status_topic, (LightSwitch_DC_LOAD_STATUS.LIGHT_ON, LightSwitch_DC_LOAD_STATUS.LIGHT_OFF))
+        if state is not None:
+            self.state = state
+
     def publish_ha_discovery_config(self):
         config = {"name": self.name,
                   "state_topic": self.status_topic,
@@ -103,10 +103,12 @@ class SolarController_SOLAR_CONTROLLER_STATUS(EntityPluginBaseClass):
             self.operating_days_topic   = mqtt_support.make_device_topic_string(self.id, "operating-days", True)
             self.temperature_topic      = mqtt_support.make_device_topic_string(self.id, "temperature", True)
             self.array_voltage_topic    = mqtt_support.make_device_topic_string(self.id, "solar-array-voltage", True)
-            self.array_current_topic    = mqtt_support.make_device_topic_string(self.id, "solar-array-voltage", True)
-            self.array_power_topic      = mqtt_support.make_device_topic_string(self.id, "solar-array-voltage", True)
+            self.array_current_topic    = mqtt_support.make_device_topic_string(self.id, "solar-array-current", True)
+            self.array_power_topic      = mqtt_support.make_device_topic_string(self.id, "solar-array-power", True)
             self.battery_voltage_topic  = mqtt_support.make_device_topic_string(self.id, "battery-voltage", True)
             self.battery_current_topic  = mqtt_support.make_device_topic_string(self.id, "battery-current", True)
+            self.battery_power_topic    = mqtt_support.make_device_topic_string(self.id, "battery-power", True)
+            self.battery_temperature_topic = mqtt_support.make_device_topic_string(self.id, "battery-temperature", True)
 
         # RVC message must match the following to be this device
 
@@ -152,7 +154,7 @@ class SolarController_SOLAR_CONTROLLER_STATUS(EntityPluginBaseClass):
         """
 
         if self._is_entry_match(self.rvc_solar_controller_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["operating_state"] != self.operating_state:
                 self.operating_state = new_message["operating_state"]
                 self.mqtt_support.client.publish(
@@ -170,7 +172,7 @@ class SolarController_SOLAR_CONTROLLER_STATUS(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_solar_controller_4_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["today's_amp-hours_to_battery"] != self.today:
                 self.today = new_message["today's_amp-hours_to_battery"]
                 self.mqtt_support.client.publish(
@@ -189,7 +191,7 @@ class SolarController_SOLAR_CONTROLLER_STATUS(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_solar_controller_5_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if new_message["last_7_days_amp-hours_to_battery"] != self.seven_day_total:
                 self.seven_day_total = new_message["last_7_days_amp-hours_to_battery"]
@@ -205,7 +207,7 @@ class SolarController_SOLAR_CONTROLLER_STATUS(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_solar_controller_6_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if new_message["total_number_of_operating_days"] != self.operating_days:
                 self.operating_days = new_message["total_number_of_operating_days"]
@@ -220,7 +222,7 @@ class SolarController_SOLAR_CONTROLLER_STATUS(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_solar_array_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if new_message["solar_array_measured_voltage"] != self.array_voltage:
                 self.array_voltage = new_message["solar_array_measured_voltage"]
@@ -242,7 +244,7 @@ class SolarController_SOLAR_CONTROLLER_STATUS(EntityPluginBaseClass):
             return True
 
         if self._is_entry_match(self.rvc_solar_battery_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if new_message["measured_voltage"] != self.battery_voltage:
                 self.battery_voltage = new_message["measured_voltage"]
@@ -271,7 +273,7 @@ class SolarController_SOLAR_CONTROLLER_STATUS(EntityPluginBaseClass):
         #elif self._is_entry_match(self.rvc_match_command, new_message):
         #    # This is the command.  Just eat the message so it doesn't show up
         #    # as unhandled.
-        #    self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+        #    self.Logger.debug("Msg Match Command: %s", new_message)
         #    return True
         return False
 
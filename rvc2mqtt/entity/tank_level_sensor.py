@@ -69,7 +69,7 @@ class TankLevelSensor_TANK_STATUS(EntityPluginBaseClass):
         # For now only match the status message.
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             if(self.waiting_for_first_msg):
                 # because we don't have all info until first message we need to wait
@@ -87,6 +87,13 @@ class TankLevelSensor_TANK_STATUS(EntityPluginBaseClass):
             return True
         return False
 
+    def restore_retained_state(self, retained: dict):
+        if self.status_topic in retained:
+            try:
+                self.level = int(retained[self.status_topic])
+            except ValueError:
+                pass
+
     def publish_ha_discovery_config(self):
         # produce the HA MQTT discovery config json
         origin = {'name': self.mqtt_support.get_bridge_ha_name()}
@@ -91,7 +91,7 @@ class TankWarmer_DC_LOAD_STATUS(EntityPluginBaseClass):
         """
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["operating_status"] == 100.0:
                 self.state = TankWarmer_DC_LOAD_STATUS.ON
             elif new_message["operating_status"] == 0.0:
@@ -107,7 +107,7 @@ class TankWarmer_DC_LOAD_STATUS(EntityPluginBaseClass):
 
             return True
         elif self._is_entry_match(self.rvc_match_command, new_message):
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             return True
         
         return False
@@ -158,6 +158,11 @@ class TankWarmer_DC_LOAD_STATUS(EntityPluginBaseClass):
         struct.pack_into("<BBBBBBH", msg_bytes, 0, self.rvc_instance, 0, 250, 0, 1, 0xFF, 0)
         self.send_queue.put({"dgn": "1FFBC", "data": msg_bytes})
 
+    def restore_retained_state(self, retained: dict):
+        state = self.retained_choice(retained, self.status_topic, (TankWarmer_DC_LOAD_STATUS.ON, TankWarmer_DC_LOAD_STATUS.OFF))
+        if state is not None:
+            self.state = state
+
     def publish_ha_discovery_config(self):
         config = {"name": self.name,
                   "state_topic": self.status_topic,
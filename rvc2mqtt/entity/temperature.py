@@ -64,7 +64,7 @@ class TemperatureSensor_THERMOSTAT_AMBIENT_STATUS(EntityPluginBaseClass):
         # For now only match the status message.
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             # These events happen a lot.  Lets filter down to when temp changes
             #Temperature changes by a tiny amount a lot, only report if .25 C change
             if abs(self.reported_temp - new_message["ambient_temp"]) > .25:
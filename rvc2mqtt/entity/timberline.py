@@ -485,7 +485,7 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
         processed = False
 
         if self._is_entry_match(self.rvc_waterheater_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["operating_modes"] != self._source:
                 self._source = new_message["operating_modes"]
                 self.mqtt_support.client.publish(
@@ -519,7 +519,7 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
                     self.failure_to_ignite_status_def_topic, new_message.get("failure_to_ignite_status_definition", "unknown").title(), retain=True)
             processed = True
         elif self._is_entry_match(self.rvc_waterheater_status_2, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["hot_water_priority"] != self._hot_water_priority:
                 self._hot_water_priority = new_message["hot_water_priority"]
                 self.mqtt_support.client.publish(
@@ -528,7 +528,7 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
                     self.hot_water_priority_def_topic, new_message.get("hot_water_priority_definition", "unknown").title(), retain=True)
             processed = True
         elif self._is_entry_match(self.rvc_circulation_pump_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["output_status"] != self._output_status:
                 self._output_status = new_message["output_status"]
                 self.mqtt_support.client.publish(
@@ -537,7 +537,7 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
                     self.output_status_def_topic, new_message.get("output_status_definition", "unknown").title(), retain=True)
             processed = True
         elif self._is_entry_match(self.rvc_furnace_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["operating_mode"] != self._operating_mode:
                 self._operating_mode = new_message["operating_mode"]
                 self.mqtt_support.client.publish(
@@ -550,7 +550,7 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
                     self.circulation_fan_speed_topic, new_message["circulation_fan_speed"], retain=True)
             processed = True
         elif self._is_entry_match(self.rvc_thermostat_status_1, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["operating_mode"] != self._thermostat_operating_mode:
                 self._thermostat_operating_mode = new_message["operating_mode"]
                 self.mqtt_support.client.publish(
@@ -572,7 +572,7 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
                         self._convert_c_to_f(new_message["setpoint_temp_heat"]))), retain=True)
             processed = True
         elif self._is_entry_match(self.rvc_thermostat_status_2, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["current_schedule_instance"] != self._current_schedule_instance:
                 self._current_schedule_instance = new_message["current_schedule_instance"]
                 self.mqtt_support.client.publish(
@@ -582,7 +582,7 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
                         str(new_message["current_schedule_instance"]),"unknown").title(), retain=True)
             processed = True
         elif self._is_entry_match(self.rvc_thermostat_schedule_status_1, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             time_changed = False
             if new_message["schedule_mode_instance"] == 0:
                 if new_message["start_hour"] != self._sleep_start_hour:
@@ -622,13 +622,13 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
                             self._convert_c_to_f(new_message["setpoint_temp_heat"]))), retain=True)
             processed = True
         elif self._is_entry_match(self.rvc_timberline_proprietary, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
             if new_message["message_type"] == "81": #0x81 Timberline 1.5 Extension Error codes clear command
                 # This is the command. Eat message so it doesn't show up as unhandled.
-                self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+                self.Logger.debug("Msg Match Command: %s", new_message)
             elif new_message["message_type"] == "83": #0x81 Timberline 1.5 Extension command
                 # This is the command. Eat message so it doesn't show up as unhandled.
-                self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+                self.Logger.debug("Msg Match Command: %s", new_message)
             elif new_message["message_type"] == "84": #0x84 Timberline 1.5 Extension status message
                 if new_message["solenoid"] != self._solenoid:
                     self._solenoid = new_message["solenoid"]
@@ -710,7 +710,7 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
                         self.hcu_version_topic, _ver, retain=True)
             elif new_message["message_type"] == "89": #0x81 Timberline 1.5 Extension command
                 # This is the command. Eat message so it doesn't show up as unhandled.
-                self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+                self.Logger.debug("Msg Match Command: %s", new_message)
             elif new_message["message_type"] == "8A": #0x8A Timberline 1.5 Timers Setup status
                 if new_message["system_limitation"] != self._system_limitation:
                     self._system_limitation = new_message["system_limitation"]
@@ -723,23 +723,23 @@ class hvac_TIMBERLINE(EntityPluginBaseClass):
             processed = True
         elif self._is_entry_match(self.rvc_waterheater_command, new_message):
             # This is the command. Eat message so it doesn't show up as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             processed = True
         elif self._is_entry_match(self.rvc_circulation_pump_command, new_message):
             # This is the command. Eat message so it doesn't show up as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             processed = True
         elif self._is_entry_match(self.rvc_furnace_command, new_message):
             # This is the command. Eat message so it doesn't show up as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             processed = True
         elif self._is_entry_match(self.rvc_thermostat_command_1, new_message):
             # This is the command. Eat message so it doesn't show up as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             processed = True
         elif self._is_entry_match(self.rvc_thermostat_schedule_command_1, new_message):
             # This is the command. Eat message so it doesn't show up as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             processed = True
 
         return processed
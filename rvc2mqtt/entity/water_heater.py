@@ -174,7 +174,7 @@ class WaterHeaterClass(EntityPluginBaseClass):
         '''
 
         if self._is_entry_match(self.rvc_match_status, new_message):
-            self.Logger.debug(f"Msg Match Status: {str(new_message)}")
+            self.Logger.debug("Msg Match Status: %s", new_message)
 
             # Op Mode State
             self.mode = new_message["operating_modes"]
@@ -278,13 +278,13 @@ class WaterHeaterClass(EntityPluginBaseClass):
         elif self._is_entry_match(self.rvc_match_command, new_message):
             # This is the command.  Just eat the message so it doesn't show up
             # as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             return True
 
         elif self._is_entry_match(self.rvc_match_command2, new_message):
             # This is the command2.  Just eat the message so it doesn't show up
             # as unhandled.
-            self.Logger.debug(f"Msg Match Command: {str(new_message)}")
+            self.Logger.debug("Msg Match Command: %s", new_message)
             return True
         return False
 
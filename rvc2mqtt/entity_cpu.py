@@ -0,0 +1,91 @@
+"""
+Per entity CPU time accounting
+
+The app rx loop times every process_rvc_msg call and the mqtt dispatcher times
+every process_mqtt_msg (or other handler) call.  Time is thread cpu time so a
+handler waiting on a lock or sleeping isn't charged for it.  Calls, cumulative
+and worst case time are kept per entity instance and the top N are included
+in the metrics (`entity_cpu`).
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+
+
+class EntityCpuAccounting(object):
+    """ Cumulative cpu time per entity instance for rvc and mqtt processing.
+    A top_count of 0 disables it and callers skip the timing entirely """
+
+    def __init__(self, top_count: int = 10):
+        self.top_count = top_count
+        self.enabled = top_count > 0
+        # id(owner) -> (name, [rvc calls, rvc handled, rvc time, rvc max,
+        #                      mqtt calls, mqtt time, mqtt max])
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, owner) -> list:
+        entry = self._stats.get(id(owner))
+        if entry is None:
+            name = getattr(owner, "id", None) or type(owner).__name__
+            with self._lock:
+                entry = self._stats.setdefault(id(owner), (str(name), [0, 0, 0.0, 0.0, 0, 0.0, 0.0]))
+        return entry[1]
+
+    def record_rvc(self, entity, seconds: float, handled: bool):
+        """ a process_rvc_msg call.  Called on the main loop thread """
+        s = self._get(entity)
+        s[0] += 1
+        if handled:
+            s[1] += 1
+        s[2] += seconds
+        if seconds > s[3]:
+            s[3] = seconds
+
+    def record_mqtt(self, owner, seconds: float):
+        """ an mqtt handler call.  Called on a dispatcher worker thread.  Each
+        owner is pinned to one worker so updates for an owner don't race """
+        s = self._get(owner)
+        s[4] += 1
+        s[5] += seconds
+        if seconds > s[6]:
+            s[6] = seconds
+
+    def report(self, top: int = None) -> list:
+        """ entities using the most total cpu time first """
+        with self._lock:
+            entries = [(name, list(s)) for (name, s) in self._stats.values()]
+        entries.sort(key=lambda e: e[1][2] + e[1][5], reverse=True)
+        result = []
+        for (name, s) in entries[:top if top is not None else self.top_count]:
+            result.append({"entity": name,
+                           "total_ms": round((s[2] + s[5]) * 1000, 3),
+                           "rvc_calls": s[0],
+                           "rvc_handled": s[1],
+                           "rvc_ms": round(s[2] * 1000, 3),
+                           "rvc_max_ms": round(s[3] * 1000, 3),
+                           "mqtt_calls": s[4],
+                           "mqtt_ms": round(s[5] * 1000, 3),
+                           "mqtt_max_ms": round(s[6] * 1000, 3)})
+        return result
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            stats = [s for (name, s) in self._stats.values()]
+        return {"rvc_total_s": round(sum(s[2] for s in stats), 3),
+                "mqtt_total_s": round(sum(s[5] for s in stats), 3),
+                "top": self.report()}
@@ -27,22 +27,28 @@ def entity_factory(data: dict, mqtt_support: MQTT_Support, entity_factory_list:
     # loop thru the factory list and if a full match between factory and data then
     # instantiate the object. 
     logger = logging.getLogger(__name__)
-    logger.debug(f"Factory for: {str(data)}")
+    # resolve once.  Formatting data for every factory entry is expensive with large floorplans
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Factory for: %s", data)
     for f_entry in entity_factory_list:
         match = True
         for k,v in f_entry[0].items():
             if k not in data:
-                logger.debug(f"Key not in data: {k}")
+                if debug:
+                    logger.debug("Key not in data: %s", k)
                 match = False
                 break
             if data[k] != v:
-                logger.debug(f"Value {v} for key {k} not the same as data: {str(data)}")
+                if debug:
+                    logger.debug("Value %s for key %s not the same as data: %s", v, k, data)
                 match = False
                 break
         # finished or break - check for match
         if match:
             # matched.  Make matching entity
-            logger.debug(f"Found Entity Match for {str(data)} as {f_entry[1].__name__}")
+            if debug:
+                logger.debug("Found Entity Match for %s as %s", data, f_entry[1].__name__)
             return f_entry[1](data, mqtt_support)
         
     logger.error(f"Unsupported entity: {str(data)}")
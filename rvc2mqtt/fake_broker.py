@@ -0,0 +1,444 @@
+"""
+In-process mqtt broker for end to end tests and benchmarks
+
+A small MQTT 3.1.1 / 5 broker on a local tcp port.  The bridge connects with
+the real paho client (MqttInitalize) so publishes go thru the same
+serialization and network path as production.  Every publish the broker
+receives is recorded with its receive time, retain flag, qos and (v5)
+properties.  Retained messages, subscriptions with + and # wildcards, qos 0-2,
+topic aliases from clients, wills and keep alive pings are supported.
+Messages are routed to subscribers but sessions are not persisted.
+
+    broker = FakeBroker()
+    broker.start()
+    mqtt_support = MqttInitalize("127.0.0.1", broker.port, None, None, "bridge", "rvc2mqtt")
+    ...
+    broker.messages("rvc2mqtt/bridge/state")
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import logging
+import socket
+import socketserver
+import struct
+import threading
+import time
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+BrokerMessage = collections.namedtuple("BrokerMessage",
+                                       ["time", "client_id", "topic", "payload", "qos", "retain", "properties"])
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+PROTOCOL_ERROR = 0x82       # v5 reason code
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """ mqtt topic filter match with + and # wildcards """
+    f = topic_filter.split("/")
+    t = topic.split("/")
+    for (index, level) in enumerate(f):
+        if level == "#":
+            return True
+        if index >= len(t):
+            return False
+        if level != "+" and level != t[index]:
+            return False
+    return len(f) == len(t)
+
+
+def _encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def _utf8(s: str) -> bytes:
+    b = s.encode("utf-8")
+    return struct.pack("!H", len(b)) + b
+
+
+class _Reader(object):
+    """ cursor over a packet body """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def remaining(self) -> int:
+        return len(self.data) - self.pos
+
+    def u8(self) -> int:
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def u16(self) -> int:
+        self.pos += 2
+        return struct.unpack_from("!H", self.data, self.pos - 2)[0]
+
+    def binary(self) -> bytes:
+        n = self.u16()
+        self.pos += n
+        return self.data[self.pos - n:self.pos]
+
+    def string(self) -> str:
+        return self.binary().decode("utf-8")
+
+    def properties(self, packet_type: int) -> Properties:
+        (props, length) = Properties(packet_type).unpack(self.data[self.pos:])
+        self.pos += length
+        return props
+
+    def take_rest(self) -> bytes:
+        rest = self.data[self.pos:]
+        self.pos = len(self.data)
+        return rest
+
+
+class _Session(socketserver.BaseRequestHandler):
+    """ one client connection """
+
+    def setup(self):
+        self.broker: FakeBroker = self.server.broker
+        self.client_id = None
+        self.version = 4
+        self.will = None
+        self.subscriptions = {}     # filter -> qos
+        self.aliases = {}           # client topic alias -> topic
+        self._write_lock = threading.Lock()
+        self._next_mid = 0
+        self._clean_disconnect = False
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        try:
+            while True:
+                packet = self._read_packet()
+                if packet is None:
+                    break
+                (header, body) = packet
+                if not self._dispatch(header >> 4, header & 0x0F, _Reader(body)):
+                    break
+        except (OSError, ValueError, IndexError, struct.error) as e:
+            self.broker.Logger.debug(f"Client {self.client_id} connection error: {e}")
+        finally:
+            self.broker._remove_session(self, publish_will=not self._clean_disconnect)
+
+    def _recv_exact(self, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.request.recv(n - len(buf))
+            if not chunk:
+                return None
+            buf += chunk
+        return bytes(buf)
+
+    def _read_packet(self):
+        first = self._recv_exact(1)
+        if first is None:
+            return None
+        length = 0
+        multiplier = 1
+        while True:
+            b = self._recv_exact(1)
+            if b is None:
+                return None
+            length += (b[0] & 0x7F) * multiplier
+            if not b[0] & 0x80:
+                break
+            multiplier *= 128
+        body = self._recv_exact(length) if length else b""
+        if body is None:
+            return None
+        return (first[0], body)
+
+    def send_packet(self, header: int, body: bytes):
+        with self._write_lock:
+            self.request.sendall(bytes([header]) + _encode_length(len(body)) + body)
+
+    def _props(self, props: Properties = None) -> bytes:
+        """ properties field for v5.  Empty for 3.1.1 """
+        if self.version != 5:
+            return b""
+        return props.pack() if props is not None else b"\x00"
+
+    def _dispatch(self, packet_type: int, flags: int, r: _Reader) -> bool:
+        if packet_type == CONNECT:
+            self._on_connect(r)
+        elif packet_type == PUBLISH:
+            return self._on_publish(flags, r)
+        elif packet_type == PUBREL:
+            self.send_packet(PUBCOMP << 4, struct.pack("!H", r.u16()))
+        elif packet_type == PUBREC:
+            self.send_packet((PUBREL << 4) | 0x02, struct.pack("!H", r.u16()))
+        elif packet_type in (PUBACK, PUBCOMP):
+            pass
+        elif packet_type == SUBSCRIBE:
+            self._on_subscribe(r)
+        elif packet_type == UNSUBSCRIBE:
+            self._on_unsubscribe(r)
+        elif packet_type == PINGREQ:
+            self.send_packet(PINGRESP << 4, b"")
+        elif packet_type == DISCONNECT:
+            self._clean_disconnect = True
+            return False
+        else:
+            raise ValueError(f"Unexpected packet type {packet_type}")
+        return True
+
+    def _on_connect(self, r: _Reader):
+        r.string()                  # protocol name
+        self.version = r.u8()
+        flags = r.u8()
+        r.u16()                     # keep alive
+        if self.version == 5:
+            r.properties(PacketTypes.CONNECT)
+        self.client_id = r.string()
+        if flags & 0x04:
+            will_props = r.properties(PacketTypes.WILLMESSAGE) if self.version == 5 else None
+            will_topic = r.string()
+            will_payload = r.binary()
+            self.will = (will_topic, will_payload, (flags >> 3) & 0x03, bool(flags & 0x20), will_props)
+        # username and password are accepted without checking
+        if flags & 0x80:
+            r.string()
+        if flags & 0x40:
+            r.binary()
+
+        props = None
+        if self.version == 5:
+            props = Properties(PacketTypes.CONNACK)
+            if self.broker.topic_alias_maximum:
+                props.TopicAliasMaximum = self.broker.topic_alias_maximum
+        self.send_packet(CONNACK << 4, b"\x00\x00" + self._props(props))
+        self.broker._add_session(self)
+
+    def _on_publish(self, flags: int, r: _Reader) -> bool:
+        """ returns False if the session must be closed """
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        topic = r.string()
+        mid = r.u16() if qos else None
+        props = None
+        if self.version == 5:
+            props = r.properties(PacketTypes.PUBLISH)
+            alias = getattr(props, "TopicAlias", None)
+            if alias is not None:
+                if topic:
+                    self.aliases[alias] = topic
+                elif alias in self.aliases:
+                    topic = self.aliases[alias]
+                else:
+                    # like a real broker: disconnect with Protocol Error
+                    self.broker.Logger.warning(f"Client {self.client_id} used unknown topic alias {alias}")
+                    reason = Properties(PacketTypes.DISCONNECT)
+                    reason.ReasonString = f"Unknown topic alias {alias}"
+                    self.send_packet(DISCONNECT << 4, bytes([PROTOCOL_ERROR]) + self._props(reason))
+                    return False
+        payload = r.take_rest()
+
+        self.broker._on_publish(BrokerMessage(time.time(), self.client_id, topic, payload, qos, retain, props))
+        if qos == 1:
+            self.send_packet(PUBACK << 4, struct.pack("!H", mid))
+        elif qos == 2:
+            self.send_packet(PUBREC << 4, struct.pack("!H", mid))
+        return True
+
+    def _on_subscribe(self, r: _Reader):
+        mid = r.u16()
+        if self.version == 5:
+            r.properties(PacketTypes.SUBSCRIBE)
+        granted = []
+        filters = []
+        while r.remaining():
+            topic_filter = r.string()
+            qos = r.u8() & 0x03
+            self.subscriptions[topic_filter] = qos
+            granted.append(qos)
+            filters.append((topic_filter, qos))
+        self.send_packet(SUBACK << 4, struct.pack("!H", mid) + self._props() + bytes(granted))
+        for (topic_filter, qos) in filters:
+            for msg in self.broker.retained_messages(topic_filter):
+                self.deliver(msg, qos, True)
+
+    def _on_unsubscribe(self, r: _Reader):
+        mid = r.u16()
+        if self.version == 5:
+            r.properties(PacketTypes.UNSUBSCRIBE)
+        codes = []
+        while r.remaining():
+            codes.append(0 if self.subscriptions.pop(r.string(), None) is not None else 0x11)
+        body = struct.pack("!H", mid)
+        if self.version == 5:
+            body += self._props() + bytes(codes)
+        self.send_packet(UNSUBACK << 4, body)
+
+    def deliver(self, msg: BrokerMessage, qos: int, retain: bool = False):
+        qos = min(qos, msg.qos)
+        body = _utf8(msg.topic)
+        if qos:
+            with self._write_lock:
+                self._next_mid = (self._next_mid % 65535) + 1
+                mid = self._next_mid
+            body += struct.pack("!H", mid)
+        body += self._props() + msg.payload
+        try:
+            self.send_packet((PUBLISH << 4) | (qos << 1) | (1 if retain else 0), body)
+        except OSError as e:
+            self.broker.Logger.debug(f"Deliver to {self.client_id} failed: {e}")
+
+    def drop(self):
+        """ close the connection without a disconnect (the will is published) """
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeBroker(object):
+    """ Local mqtt broker that records every publish it receives """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, topic_alias_maximum: int = 0, keep: int = None):
+        self.Logger = logging.getLogger(__name__)
+        self.topic_alias_maximum = topic_alias_maximum
+        self._lock = threading.Condition()
+        self.published = collections.deque(maxlen=keep)     # BrokerMessage, oldest first
+        self.publish_count = 0
+        self.retained = {}                                  # topic -> BrokerMessage
+        self.sessions = []
+        self._server = _Server((host, port), _Session)
+        self._server.broker = self
+        self.host = host
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake_broker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.drop_clients()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    #
+    # session callbacks.  Called on the client's connection thread
+    #
+    def _add_session(self, session: _Session):
+        with self._lock:
+            self.sessions.append(session)
+            self._lock.notify_all()
+
+    def _remove_session(self, session: _Session, publish_will: bool):
+        with self._lock:
+            if session not in self.sessions:
+                return
+            self.sessions.remove(session)
+            self._lock.notify_all()
+        if publish_will and session.will is not None:
+            (topic, payload, qos, retain, props) = session.will
+            self._on_publish(BrokerMessage(time.time(), session.client_id, topic, payload, qos, retain, props))
+
+    def _on_publish(self, msg: BrokerMessage):
+        with self._lock:
+            self.published.append(msg)
+            self.publish_count += 1
+            if msg.retain:
+                if len(msg.payload):
+                    self.retained[msg.topic] = msg
+                else:
+                    self.retained.pop(msg.topic, None)
+            targets = [(s, qos) for s in self.sessions for (f, qos) in list(s.subscriptions.items())
+                       if topic_matches(f, msg.topic)]
+            self._lock.notify_all()
+        for (session, qos) in targets:
+            session.deliver(msg, qos)
+
+    def retained_messages(self, topic_filter: str) -> list:
+        with self._lock:
+            return [m for (t, m) in self.retained.items() if topic_matches(topic_filter, t)]
+
+    #
+    # test api
+    #
+    def publish(self, topic: str, payload, qos: int = 0, retain: bool = False):
+        """ publish from the broker (like another client would) """
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        self._on_publish(BrokerMessage(time.time(), None, topic, payload, qos, retain, None))
+
+    def messages(self, topic_filter: str = None) -> list:
+        """ received publishes, optionally only those matching topic_filter """
+        with self._lock:
+            return [m for m in self.published if topic_filter is None or topic_matches(topic_filter, m.topic)]
+
+    def clear(self):
+        with self._lock:
+            self.published.clear()
+
+    def wait_for(self, predicate, timeout: float = 5.0) -> bool:
+        """ wait until predicate(broker) is True """
+        with self._lock:
+            return self._lock.wait_for(lambda: predicate(self), timeout)
+
+    def wait_for_message(self, topic_filter: str, count: int = 1, timeout: float = 5.0) -> bool:
+        return self.wait_for(lambda b: sum(1 for m in b.published if topic_matches(topic_filter, m.topic)) >= count,
+                             timeout)
+
+    def client_ids(self) -> list:
+        with self._lock:
+            return [s.client_id for s in self.sessions]
+
+    def drop_clients(self):
+        """ close every connection without a disconnect, like a network failure """
+        with self._lock:
+            sessions = list(self.sessions)
+        for s in sessions:
+            s.drop()
@@ -0,0 +1,215 @@
+"""
+Flight recorder for the can bus
+
+Keeps the most recent raw frames (rx, tx and error frames) in a preallocated
+ring buffer of fixed slots - timestamp, arbitration id, dlc, flags and 8 data
+bytes - so recording costs a few array stores per frame and no allocation.
+
+The buffer can be dumped to a candump log (.log) or Vector BLF (.blf) file
+  - on demand by publishing to `<root>/admin/recorder/set`
+      `dump`            - candump format
+      `dump blf`        - blf format
+      `dump candump 30` - only the last 30 seconds
+  - when a frame fails to decode
+  - when an entity reports a fault turning on (Diagnostic / DM_RV)
+
+Automatic dumps are rate limited.  Info about the last dump is published
+to `<root>/admin/recorder`.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import array
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import can
+from rvc2mqtt.mqtt import MQTT_Support
+
+
+class FlightRecorder(object):
+    """ Ring buffer of the last `capacity` can frames """
+
+    FLAG_TX = 0x01
+    FLAG_ERROR = 0x02
+
+    # 29 bit id with 8 data bytes is about 130 bits so 250 kbit/s is < 2000 frames/sec
+    MAX_FRAMES_PER_SECOND = 2000
+
+    def __init__(self, capacity: int = 120000):
+        self.capacity = max(1, int(capacity))
+        self._timestamps = array.array("d", bytes(8 * self.capacity))
+        self._ids = array.array("I", [0]) * self.capacity
+        self._dlc = bytearray(self.capacity)
+        self._flags = bytearray(self.capacity)
+        self._data = bytearray(8 * self.capacity)
+        self._index = 0      # next slot to write
+        self.total = 0       # frames recorded since start
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def record(self, timestamp: float, arbitration_id: int, data: bytes, flags: int = 0):
+        """ store one frame.  Called from the can watcher thread """
+        n = min(len(data), 8)
+        with self._lock:
+            i = self._index
+            self._timestamps[i] = timestamp
+            self._ids[i] = arbitration_id & 0x1FFFFFFF
+            self._dlc[i] = n
+            self._flags[i] = flags
+            offset = i * 8
+            self._data[offset:offset + n] = data[:n]
+            i += 1
+            self._index = 0 if i == self.capacity else i
+            self.total += 1
+
+    def record_message(self, message: can.Message, tx: bool = False):
+        flags = FlightRecorder.FLAG_TX if tx else 0
+        if message.is_error_frame:
+            flags |= FlightRecorder.FLAG_ERROR
+        timestamp = message.timestamp if message.timestamp else time.time()
+        self.record(timestamp, message.arbitration_id, message.data or b"", flags)
+
+    def snapshot(self, seconds: float = None) -> list:
+        """ copy of the buffered frames, oldest first, as
+        (timestamp, arbitration_id, flags, data) tuples """
+        # only the raw copies are made under the lock so record() on the can watcher thread
+        # is held up for a few memcpys, not for building the tuples
+        with self._lock:
+            count = min(self.total, self.capacity)
+            start = (self._index - count) % self.capacity
+            timestamps = self._timestamps[:]
+            ids = self._ids[:]
+            dlc = bytes(self._dlc)
+            flags = bytes(self._flags)
+            data = bytes(self._data)
+
+        oldest = None
+        if seconds is not None and count > 0:
+            oldest = timestamps[(start + count - 1) % self.capacity] - seconds
+
+        frames = []
+        for n in range(count):
+            i = (start + n) % self.capacity
+            if oldest is not None and timestamps[i] < oldest:
+                continue
+            frames.append((timestamps[i], ids[i], flags[i], data[i * 8:i * 8 + dlc[i]]))
+        return frames
+
+    def write(self, filepath: os.PathLike, format: str = "candump", seconds: float = None, channel: str = "can0") -> int:
+        """ write the buffer to a candump log or blf file.  returns the number of frames """
+        return write_frames(self.snapshot(seconds), filepath, format, channel)
+
+
+def write_frames(frames: list, filepath: os.PathLike, format: str = "candump", channel: str = "can0") -> int:
+    """ write snapshot frames to a candump log or blf file using the python-can writers """
+    if format == "blf":
+        writer = can.BLFWriter(filepath)
+    else:
+        writer = can.CanutilsLogWriter(filepath, channel=channel)
+    try:
+        for (ts, arb_id, flags, data) in frames:
+            writer.on_message_received(can.Message(timestamp=ts, arbitration_id=arb_id, is_extended_id=True, data=data,
+                                                   is_error_frame=bool(flags & FlightRecorder.FLAG_ERROR),
+                                                   is_rx=not (flags & FlightRecorder.FLAG_TX), channel=channel))
+    finally:
+        writer.stop()
+    return len(frames)
+
+
+class FlightRecorderControl(object):
+    """ Trigger dumps of a FlightRecorder from mqtt, decode errors and faults """
+
+    FORMATS = {"candump": ".log", "blf": ".blf"}
+
+    def __init__(self, recorder: FlightRecorder, mqtt_support: MQTT_Support, output_dir: os.PathLike,
+                 channel: str = "can0", min_auto_interval: float = 60.0):
+        self.Logger = logging.getLogger(__name__)
+        self.recorder = recorder
+        self.mqtt_support = mqtt_support
+        self.output_dir = output_dir
+        self.channel = channel
+        self.min_auto_interval = min_auto_interval
+        self.state_topic = mqtt_support.root_topic + "/admin/recorder"
+        self.command_topic = self.state_topic + "/set"
+        self.last_dump = None
+        self._last_auto_dump = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+        mqtt_support.register(self.command_topic, self.process_mqtt_msg)
+        mqtt_support.add_fault_listener(self.on_fault)
+
+    def process_mqtt_msg(self, topic, payload, properties=None):
+        parts = payload.strip().lower().split()
+        if len(parts) == 0 or parts[0] != "dump":
+            self.Logger.warning(f"Invalid payload {payload} for topic {topic}")
+            return
+        format = parts[1] if len(parts) > 1 else "candump"
+        if format not in FlightRecorderControl.FORMATS:
+            self.Logger.warning(f"Invalid recorder format {format}")
+            return
+        try:
+            seconds = float(parts[2]) if len(parts) > 2 else None
+        except ValueError:
+            self.Logger.warning(f"Invalid recorder seconds {parts[2]}")
+            return
+        self.dump("mqtt", format, seconds)
+
+    def on_fault(self, source: str, reason: str):
+        self.trigger(f"fault-{source}")
+
+    def trigger(self, reason: str) -> bool:
+        """ automatic dump.  Skipped if one happened within min_auto_interval """
+        now = time.monotonic()
+        with self._lock:
+            if self._last_auto_dump is not None and now - self._last_auto_dump < self.min_auto_interval:
+                return False
+            self._last_auto_dump = now
+        self.Logger.info(f"Flight recorder triggered by {reason}")
+        self.dump(reason)
+        return True
+
+    def dump(self, reason: str, format: str = "candump", seconds: float = None, wait: bool = False):
+        """ snapshot now and write the file on a background thread so the
+        caller (main loop or mqtt dispatcher) isn't held up by file io """
+        frames = self.recorder.snapshot(seconds)
+        name = "flight-" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f") + "-" + \
+            "".join(c if c.isalnum() or c in "-_" else "_" for c in reason)
+        filepath = os.path.join(self.output_dir, name + FlightRecorderControl.FORMATS[format])
+        self._thread = threading.Thread(target=self._write, args=(frames, filepath, format, reason),
+                                        name="flight_recorder_dump", daemon=True)
+        self._thread.start()
+        if wait:
+            self._thread.join()
+
+    def _write(self, frames: list, filepath: str, format: str, reason: str):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            count = write_frames(frames, filepath, format, self.channel)
+        except Exception as e:
+            self.Logger.error(f"Failed to write flight recorder dump {filepath}: {e}")
+            return
+
+        self.last_dump = {"file": filepath, "reason": reason, "format": format, "frames": count,
+                          "time": datetime.datetime.now().isoformat(timespec="seconds")}
+        self.Logger.info(f"Flight recorder wrote {count} frames to {filepath}")
+        self.mqtt_support.client.publish(self.state_topic, json.dumps(self.last_dump), retain=True)
@@ -0,0 +1,252 @@
+"""
+Golden output regression harness
+
+Runs a recorded bus log and a floorplan thru the full bridge (decoder, entity
+dispatch, mqtt publish and the can transmit path) and records, in order, every
+mqtt publish (topic, retain flag and payload) and every can frame the bridge
+would transmit.  The recording is compared to a checked-in golden file so
+changes to the decoder, dispatch or publish code can be checked for identical
+behavior.
+
+A case is a directory with a case.yaml:
+
+    floorplan: floorplan.yaml       # file in the case directory, or a floorplan list
+    log: bus.log                    # candump, asc, blf or other python-can log
+    commands:                       # optional mqtt commands
+      - at: 10                      # before this frame (0 based).  Past the end runs after the log
+        topic: light_switch/set     # full topic or the end of a registered topic
+        payload: "on"
+    ignore_topics: []               # optional regexes of topics to leave out
+    replace: []                     # optional [regex, replacement] applied to each line
+
+and the golden output in expected.txt, one line per publish or transmit:
+
+    init pub rvc2mqtt/golden/state 1 online
+    12 pub rvc2mqtt/golden/d/fresh_water/level/state 1 56.0
+    12 tx 18EA4480#FF9F01
+
+The first field is what caused it: `init` (entity initialize), the frame index,
+or `<index> cmd` for a command.
+
+    rvc2mqtt golden test/golden/*             # compare, exit code 1 on a difference
+    rvc2mqtt golden --update test/golden/coach
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import difflib
+import logging
+import os
+import re
+import sys
+import ruyaml as YAML
+from rvc2mqtt.app import app, configure_logging, load_floorplans
+from rvc2mqtt.mqtt_fake import make_fake_mqtt_support
+from rvc2mqtt.plugin_support import PluginSupport
+from rvc2mqtt.replay import Replay, open_log
+
+CASE_FILE = "case.yaml"
+EXPECTED_FILE = "expected.txt"
+CLIENT_ID = "golden"
+ENTITY_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "entity")
+
+
+def load_case(case_dir: os.PathLike) -> dict:
+    with open(os.path.join(case_dir, CASE_FILE), "r") as f:
+        case = YAML.YAML(typ='safe').load(f) or {}
+    floorplan = case.get("floorplan", [])
+    if isinstance(floorplan, str):
+        floorplan = load_floorplans(os.path.join(case_dir, floorplan))
+    case["floorplan"] = [dict(e) for e in floorplan]
+    case["log"] = os.path.join(case_dir, case["log"])
+    case.setdefault("commands", [])
+    case.setdefault("ignore_topics", [])
+    case.setdefault("replace", [])
+    return case
+
+
+def plugin_factory_list(plugin_paths: list = None) -> list:
+    """ entity factory list built like the bridge does.  Plugins that don't load on
+    this python are skipped so the cases that don't use them still run """
+    factory_list = []
+    PluginSupport(ENTITY_FOLDER, plugin_paths or []).register_with_factory_the_entity_plugins(factory_list,
+                                                                                            skip_failed=True)
+    return factory_list
+
+
+def _payload_text(payload: bytes) -> str:
+    try:
+        text = payload.decode("utf-8")
+    except UnicodeDecodeError:
+        return "hex:" + payload.hex()
+    # keep one line per publish
+    return text.replace("\\", "\\\\").replace("\r", "\\r").replace("\n", "\\n")
+
+
+def _tx_text(rvc_dict: dict) -> str:
+    data = rvc_dict["data"]
+    data = bytes.fromhex(data) if isinstance(data, str) else bytes(data)
+    return f"{rvc_dict['arbitration_id']:08X}#{data.hex().upper()}"
+
+
+class GoldenRecorder(object):
+    """ Replays a case thru a bridge and records the ordered output lines """
+
+    def __init__(self, case: dict, entity_factory_list: list = None):
+        self.Logger = logging.getLogger(__name__)
+        self.case = case
+        self.lines = []
+        self.cause = "init"
+
+        self.bridge = app()
+        self.bridge.init_pipeline()
+        self.bridge.mqtt_client = make_fake_mqtt_support(CLIENT_ID)
+        self.bridge.mqtt_client.set_metrics(self.bridge.metrics)
+        self.bridge.mqtt_client.set_latency_tracer(self.bridge.latency_tracer)
+        self.client = self.bridge.mqtt_client.client
+        self.bridge.load_entities(case["floorplan"], [], entity_factory_list if entity_factory_list is not None
+                                  else plugin_factory_list())
+        self.replay = Replay(self.bridge, speed=0, tx_sink=self._tx)
+        self._drain_tx()
+        self._collect()
+
+    def _collect(self):
+        """ record publishes since the last collect """
+        for p in self.client.messages():
+            self.lines.append(f"{self.cause} pub {p.topic} {int(bool(p.retain))} {_payload_text(p.payload)}")
+        self.client.clear()
+
+    def _tx(self, rvc_dict: dict):
+        self._collect()
+        self.lines.append(f"{self.cause} tx {_tx_text(rvc_dict)}")
+
+    def _drain_tx(self):
+        while not self.bridge.tx_RVC_Buffer.empty():
+            self.bridge.message_tx_loop()
+        while not self.bridge.txQueue.empty():
+            self._tx(self.bridge.txQueue.get())
+
+    def _topic(self, suffix: str) -> str:
+        registered = self.bridge.mqtt_client.registered_mqtt_devices
+        if suffix in registered:
+            return suffix
+        topic = next((t for t in registered if t.endswith("/" + suffix)), None)
+        if topic is None:
+            raise ValueError(f"No entity registered a topic ending in {suffix}")
+        return topic
+
+    def _command(self, command: dict, cause: str):
+        self._collect()
+        self.cause = cause
+        self.client.inject(self._topic(command["topic"]), str(command["payload"]))
+        self._collect()
+        self._drain_tx()
+
+    def _frames(self, messages):
+        commands = sorted(self.case["commands"], key=lambda c: c["at"])
+        index = -1
+        for (index, msg) in enumerate(messages):
+            self._collect()
+            while commands and commands[0]["at"] <= index:
+                self._command(commands.pop(0), f"{index} cmd")
+            self.cause = str(index)
+            yield msg
+        self._collect()
+        for command in commands:
+            self._command(command, f"{index + 1} cmd")
+
+    def run(self) -> list:
+        self.replay.run(self._frames(open_log(self.case["log"])))
+        self._collect()
+        return self.lines
+
+
+def normalize(lines: list, case: dict) -> list:
+    """ drop ignored topics and apply the case's replacements """
+    ignore = [re.compile(p) for p in case["ignore_topics"]]
+    replace = [(re.compile(p), r) for (p, r) in case["replace"]]
+    result = []
+    for line in lines:
+        parts = line.split(" ", 3)
+        if parts[1] == "pub" and any(p.search(parts[2]) for p in ignore):
+            continue
+        for (pattern, replacement) in replace:
+            line = pattern.sub(replacement, line)
+        result.append(line)
+    return result
+
+
+def record(case_dir: os.PathLike, entity_factory_list: list = None) -> list:
+    """ normalized output lines of a case """
+    case = load_case(case_dir)
+    return normalize(GoldenRecorder(case, entity_factory_list).run(), case)
+
+
+def read_expected(case_dir: os.PathLike) -> list:
+    with open(os.path.join(case_dir, EXPECTED_FILE), "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def write_expected(case_dir: os.PathLike, lines: list):
+    with open(os.path.join(case_dir, EXPECTED_FILE), "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def diff(expected: list, actual: list, name: str = "") -> str:
+    """ unified diff of expected and actual lines.  Empty when they match """
+    return "\n".join(difflib.unified_diff(expected, actual, f"{name}/{EXPECTED_FILE}", f"{name} (actual)",
+                                          lineterm=""))
+
+
+def check(case_dir: os.PathLike, entity_factory_list: list = None) -> str:
+    """ diff of a case's golden file and its output now.  Empty when they match """
+    return diff(read_expected(case_dir), record(case_dir, entity_factory_list), os.path.basename(case_dir))
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog="rvc2mqtt golden",
+                                     description="Compare bridge output for recorded bus logs to golden files")
+    parser.add_argument("cases", nargs="+", help="case directories (with case.yaml)")
+    parser.add_argument("--update", action="store_true", help="write the output as the new golden files")
+    parser.add_argument("-p", "--plugin_path", dest="plugin_paths",
+                        action="append", help="path to directory to load plugins", default=[])
+    parser.add_argument("-v", "--verbose", dest="verbose", action="count", default=0,
+                        help="Increase verbosity of stdout logger. Add multiple times to increase")
+    args = parser.parse_args(argv)
+    configure_logging(args.verbose, None)
+
+    factory_list = plugin_factory_list(args.plugin_paths)
+    failed = 0
+    for case_dir in args.cases:
+        name = os.path.basename(os.path.normpath(case_dir))
+        if args.update:
+            lines = record(case_dir, factory_list)
+            write_expected(case_dir, lines)
+            print(f"{name}: wrote {len(lines)} lines")
+            continue
+        text = check(case_dir, factory_list)
+        if text:
+            failed += 1
+            print(text)
+            print(f"{name}: DIFFERENT")
+        else:
+            print(f"{name}: ok")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+End to end latency tracing for rvc2mqtt
+
+Receive path - a can frame is traced from its python-can receive timestamp
+thru the rx queue, decode, entity dispatch and the first mqtt publish it causes.
+
+Command path - an mqtt command is traced from when it was queued by the
+mqtt dispatcher thru the entity handler, the rvc transmit buffer, the can
+transmit queue and bus.send.
+
+Stage latencies are recorded in the shared Metrics histograms.  End to end
+latency is also kept per entity and the slowest recent frames are available
+for investigation.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import queue
+import threading
+import time
+from rvc2mqtt.metrics import Metrics, Histogram
+
+
+class LatencyTracer(object):
+    """ Trace frames and commands thru the bridge pipeline """
+
+    # can timestamps further than this from our clock are not trusted (replayed logs, bad clocks)
+    MAX_CLOCK_SKEW = 60.0
+
+    def __init__(self, metrics: Metrics, recent_count: int = 256, slowest_count: int = 10):
+        self.metrics = metrics
+        self.slowest_count = slowest_count
+        self._recent = collections.deque(maxlen=recent_count)
+        self._entity_histograms = {}
+        self._local = threading.local()
+
+    #
+    # Receive path.  Called on the main loop thread
+    #
+    def begin_frame(self, can_timestamp: float, dgn: str):
+        """ frame was pulled from the rx queue """
+        now = time.time()
+        if can_timestamp is None or abs(now - can_timestamp) > LatencyTracer.MAX_CLOCK_SKEW:
+            can_timestamp = None
+        else:
+            self.metrics.observe("rx_queue_latency", now - can_timestamp)
+        self._local.frame = [can_timestamp, dgn, now, None]
+
+    def mark_publish(self):
+        """ an mqtt publish happened.  Remember the first one for the current frame """
+        frame = getattr(self._local, "frame", None)
+        if frame is not None and frame[3] is None:
+            frame[3] = time.time()
+
+    def end_frame(self, entity_id: str, decode_time: float, dispatch_time: float):
+        """ frame has been dispatched (entity_id is None if unhandled) """
+        frame = getattr(self._local, "frame", None)
+        if frame is None:
+            return
+        self._local.frame = None
+        (can_timestamp, dgn, dequeued, published) = frame
+        if published is None:
+            return
+
+        start = can_timestamp if can_timestamp is not None else dequeued
+        latency = published - start
+        self.metrics.observe("can_to_publish_latency", latency)
+        h = self._entity_histograms.get(entity_id)
+        if h is None:
+            h = self._entity_histograms.setdefault(entity_id, Histogram())
+        h.observe(latency)
+
+        self._recent.append((latency, {
+            "dgn": dgn,
+            "entity": entity_id,
+            "can_timestamp": can_timestamp,
+            "total_ms": round(latency * 1000, 3),
+            "rx_queue_ms": round((dequeued - can_timestamp) * 1000, 3) if can_timestamp is not None else None,
+            "decode_ms": round(decode_time * 1000, 3),
+            "dispatch_ms": round(dispatch_time * 1000, 3)}))
+
+    #
+    # Command path.  Called on mqtt dispatcher threads
+    #
+    def begin_command(self, topic: str, queued_at: float):
+        """ mqtt handler is about to run.  queued_at is perf_counter time """
+        self._local.command = queued_at
+
+    def end_command(self):
+        self._local.command = None
+
+    def tag_command(self, rvc_dict: dict):
+        """ called when an entity queues an rvc message.  Tag it with the
+        command receive time so later stages can record latency """
+        queued_at = getattr(self._local, "command", None)
+        if queued_at is not None and isinstance(rvc_dict, dict):
+            rvc_dict["cmd_received_time"] = queued_at
+            self.metrics.observe("cmd_to_rvc_buffer_latency", time.perf_counter() - queued_at)
+
+    def get_slowest_frames(self) -> list:
+        """ slowest frames from the recent window, slowest first """
+        recent = list(self._recent)
+        recent.sort(key=lambda r: r[0], reverse=True)
+        return [r[1] for r in recent[:self.slowest_count]]
+
+    def get_metrics(self) -> dict:
+        return {"slowest_frames": self.get_slowest_frames(),
+                "by_entity": {str(k): h.to_dict() for (k, h) in list(self._entity_histograms.items())}}
+
+
+class TracedQueue(queue.Queue):
+    """ rvc transmit buffer that tags messages queued while handling an mqtt command """
+
+    def __init__(self, tracer: LatencyTracer, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.tracer = tracer
+
+    def put(self, item, block=True, timeout=None):
+        self.tracer.tag_command(item)
+        super().put(item, block, timeout)
@@ -0,0 +1,235 @@
+"""
+Runtime metrics for rvc2mqtt
+
+Small, dependency free counters and histograms that the app, can watcher and
+mqtt support update while running.  A snapshot can be published as json on
+the bridge info topic or served as Prometheus text.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Histogram(object):
+    """ fixed bucket histogram of durations in seconds """
+
+    BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+               0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(Histogram.BUCKETS) + 1)   # last is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(Histogram.BUCKETS, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, p: float) -> float:
+        """ approximate percentile (0 - 100) as the upper bound of its bucket """
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            target = self.count * p / 100.0
+            running = 0
+            for (index, c) in enumerate(self.counts):
+                running += c
+                if running >= target:
+                    if index < len(Histogram.BUCKETS):
+                        return min(Histogram.BUCKETS[index], self.max)
+                    return self.max
+            return self.max
+
+    def to_dict(self) -> dict:
+        count = self.count
+        return {"count": count,
+                "avg_ms": round((self.sum / count) * 1000, 3) if count else 0,
+                "p50_ms": round(self.percentile(50) * 1000, 3),
+                "p90_ms": round(self.percentile(90) * 1000, 3),
+                "p99_ms": round(self.percentile(99) * 1000, 3),
+                "max_ms": round(self.max * 1000, 3)}
+
+
+class Metrics(object):
+    """ Registry of counters, histograms, gauges and metric providers.
+
+    counters   - name -> {key: int}.  key is optional (for example a DGN)
+    histograms - name -> Histogram
+    gauges     - name -> callable returning a number
+    providers  - name -> callable returning a dict (like dispatcher.get_metrics)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.providers = {}
+
+    def inc(self, name: str, key: str = None, amount: int = 1):
+        with self._lock:
+            c = self.counters.get(name)
+            if c is None:
+                c = {}
+                self.counters[name] = c
+            c[key] = c.get(key, 0) + amount
+
+    def get_count(self, name: str, key: str = None) -> int:
+        """ count for key.  If key is None and the counter is keyed, the total """
+        with self._lock:
+            c = self.counters.get(name, {})
+            if key is None and None not in c:
+                return sum(c.values())
+            return c.get(key, 0)
+
+    def histogram(self, name: str) -> Histogram:
+        h = self.histograms.get(name)
+        if h is None:
+            with self._lock:
+                h = self.histograms.setdefault(name, Histogram())
+        return h
+
+    def observe(self, name: str, value: float):
+        self.histogram(name).observe(value)
+
+    def add_gauge(self, name: str, func):
+        self.gauges[name] = func
+
+    def add_provider(self, name: str, func):
+        self.providers[name] = func
+
+    def snapshot(self) -> dict:
+        """ return all metrics as a json friendly dict """
+        with self._lock:
+            counters = {}
+            for (name, c) in self.counters.items():
+                if list(c.keys()) == [None]:
+                    counters[name] = c[None]
+                else:
+                    counters[name] = {str(k): v for (k, v) in c.items()}
+            histograms = dict(self.histograms)
+
+        result = {"uptime_s": round(time.time() - self.start_time),
+                  "counters": counters,
+                  "histograms": {n: h.to_dict() for (n, h) in histograms.items()},
+                  "gauges": {}}
+        for (name, func) in list(self.gauges.items()):
+            try:
+                result["gauges"][name] = func()
+            except Exception as e:
+                logging.getLogger(__name__).debug(f"Gauge {name} failed: {e}")
+        for (name, func) in list(self.providers.items()):
+            try:
+                result[name] = func()
+            except Exception as e:
+                logging.getLogger(__name__).debug(f"Metrics provider {name} failed: {e}")
+        return result
+
+    def to_prometheus(self, prefix: str = "rvc2mqtt") -> str:
+        """ return all metrics in the Prometheus text exposition format """
+        lines = []
+        with self._lock:
+            counters = {n: dict(c) for (n, c) in self.counters.items()}
+            histograms = dict(self.histograms)
+
+        for (name, c) in sorted(counters.items()):
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (key, value) in sorted(c.items(), key=lambda kv: str(kv[0])):
+                if key is None:
+                    lines.append(f"{metric} {value}")
+                else:
+                    lines.append(f'{metric}{{key="{key}"}} {value}')
+
+        for (name, h) in sorted(histograms.items()):
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            with h._lock:
+                running = 0
+                for (bound, c) in zip(Histogram.BUCKETS, h.counts):
+                    running += c
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {running}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {h.count}')
+                lines.append(f"{metric}_sum {h.sum}")
+                lines.append(f"{metric}_count {h.count}")
+
+        gauges = {}
+        for (name, func) in list(self.gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception:
+                pass
+        for (name, func) in list(self.providers.items()):
+            try:
+                for (k, v) in func().items():
+                    gauges[f"{name}_{k}"] = v
+            except Exception:
+                pass
+        for (name, value) in sorted(gauges.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHttpServer(threading.Thread):
+    """ serve metrics as Prometheus text on http://<host>:<port>/metrics """
+
+    def __init__(self, metrics: Metrics, port: int, host: str = ""):
+        threading.Thread.__init__(self, name="metrics_http", daemon=True)
+        self.Logger = logging.getLogger(__name__)
+        self.metrics = metrics
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] not in ("/", "/metrics"):
+                    handler.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode("utf-8")
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.Logger.info(f"Serving metrics on port {self.server.server_address[1]}")
+
+    def run(self):
+        self.server.serve_forever()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
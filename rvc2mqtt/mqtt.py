@@ -18,18 +18,27 @@ limitations under the License.
 
 """
 import logging
+import random
+import threading
+import time
 import paho.mqtt.client as mqc
 from paho.mqtt.subscribeoptions import SubscribeOptions
 from paho.mqtt.properties import Properties
 from paho.mqtt.packettypes import PacketTypes
+from rvc2mqtt.mqtt_dispatcher import MQTT_Dispatcher
+from rvc2mqtt.mqtt_topic_alias import MQTT_TopicAliases
+from rvc2mqtt.mqtt_spool import MQTT_Spool, payload_to_bytes
+from rvc2mqtt.metrics import Metrics
 
 
 class MQTT_Support(object):
     TOPIC_BASE = "rvc2mqtt"
     HA_AUTO_BASE = "homeassistant"
+    # values entities publish in initialize() before they have heard from the device
+    PLACEHOLDER_PAYLOADS = (b"unknown", b"")
      
     
-    def __init__(self, client_id: str, topic_base: str):
+    def __init__(self, client_id: str, topic_base: str, dispatch_workers: int = 1, topic_alias_max: int = 0):
         self.Logger = logging.getLogger(__name__)
         self.client_id = client_id
         self._connected = False
@@ -46,6 +55,35 @@ class MQTT_Support(object):
 
         self.registered_mqtt_devices = {}
 
+        # inbound messages are handled on worker threads so paho's network thread stays responsive
+        self.dispatcher = MQTT_Dispatcher(dispatch_workers)
+
+        # MQTT v5 topic aliases for frequently published topics
+        self.topic_aliases = MQTT_TopicAliases(topic_alias_max)
+
+        # optional disk spool for retained publishes while the broker is not reachable
+        self.spool: MQTT_Spool = None
+
+        # last Home Assistant discovery payload published per config topic.  Lets discovery be
+        # republished without every entity rebuilding and serializing its config
+        self.ha_discovery_cache = {}
+        self._ha_discovery_lock = threading.Lock()
+        self._ha_discovery_thread = None
+        self._ha_discovery_cancel = threading.Event()
+
+        # retained values of our own topics loaded from the broker at startup
+        self.retained_state = {}
+        self._bootstrap_filters = None
+        self._last_retained_time = 0
+        self._restoring = False
+        self.suppressed_publishes = 0
+
+        self.metrics = Metrics()
+        self.latency_tracer = None
+        self._add_metric_providers()
+
+        # called with (source, reason) when an entity reports a fault turning on
+        self.fault_listeners = []
 
     def register(self, topic, func):
         self.registered_mqtt_devices[topic] = func
@@ -55,12 +93,52 @@ class MQTT_Support(object):
     def set_client(self, client: mqc):
         self.client = client
 
+    def set_spool(self, spool: MQTT_Spool):
+        self.spool = spool
+        self._add_metric_providers()
+
+    def set_metrics(self, metrics: Metrics):
+        """ use a shared metrics registry (normally owned by the app) """
+        self.metrics = metrics
+        self._add_metric_providers()
+
+    def set_latency_tracer(self, tracer):
+        """ trace publishes and inbound commands with a LatencyTracer """
+        self.latency_tracer = tracer
+        self.dispatcher.tracer = tracer
+
+    def set_cpu_accounting(self, accounting):
+        """ charge mqtt handler cpu time to the handler's entity.  A disabled accounting is not timed """
+        self.dispatcher.cpu_accounting = accounting if accounting is not None and accounting.enabled else None
+
+    def add_fault_listener(self, func):
+        """ func(source: str, reason: str) is called when an entity reports a fault """
+        self.fault_listeners.append(func)
+
+    def report_fault(self, source: str, reason: str):
+        for func in self.fault_listeners:
+            try:
+                func(source, reason)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Fault listener failed: {e}")
+
+    def _add_metric_providers(self):
+        self.metrics.add_provider("mqtt_dispatch", self.dispatcher.get_metrics)
+        self.metrics.add_provider("mqtt_topic_alias", self.topic_aliases.get_metrics)
+        if self.spool is not None:
+            self.metrics.add_provider("mqtt_spool", self.spool.get_metrics)
+
+    def is_connected(self) -> bool:
+        return self._connected
+
     def on_connect(self, client, userdata, flags, reason_code, properties):
         """ callback function for when it has been connected.
         Should subscribe to topics
         """
         self.Logger.info(f"MQTT connected: {reason_code}")
         if reason_code == 0:
+            self.topic_aliases.connected(properties)
+
             # publish topic
             self.client.publish(self.bridge_state_topic, "online", retain=True)
             
@@ -69,6 +147,9 @@ class MQTT_Support(object):
             if len(topic_tuple_list) > 0:
                 self.client.subscribe(topic_tuple_list)
 
+            if self.spool is not None:
+                self.spool.start_replay(self.client.publish, self.is_connected)
+
         else:
             self.Logger.critical(f"Failed to connect to mqtt broker: {reason_code}")
 
@@ -76,19 +157,98 @@ class MQTT_Support(object):
         pass
 
     def on_message(self, client, userdata, msg, properties=None):
+        if self._bootstrap_filters is not None and self._is_bootstrap_topic(msg.topic):
+            if msg.retain and len(msg.payload) > 0 and self._is_restorable_topic(msg.topic):
+                self.retained_state[msg.topic] = msg.payload
+                self._last_retained_time = time.monotonic()
+            return
+
         if msg.topic in self.registered_mqtt_devices:
             func = self.registered_mqtt_devices[msg.topic]
-            func(msg.topic, msg.payload.decode('utf-8'), msg.properties)
+            if self.dispatcher.running:
+                self.dispatcher.submit(func, msg.topic, msg.payload.decode('utf-8'), msg.properties)
+            else:
+                func(msg.topic, msg.payload.decode('utf-8'), msg.properties)
         else:
             self.Logger.warning("Received mqtt message without a device registered '" + str(msg.payload) + "' on topic '" + msg.topic + "' with QoS " + str(msg.qos))
     
+    def state_topic_filters(self) -> list:
+        """ topic filters of the state topics make_device_topic_string makes """
+        return [self.device_topic_base + "/+/state", self.device_topic_base + "/+/+/state"]
+
+    def bootstrap_retained_state(self, topic_filters: list, timeout: float = 3.0, quiet_time: float = 0.5) -> dict:
+        """ Load the retained values of our own state topics from the broker.
+
+        Subscribes to topic_filters and collects retained messages until none
+        arrive for quiet_time seconds or timeout expires.  Command (/set) and
+        Home Assistant discovery topics are never restored.  Until
+        finish_startup() is called retained placeholder publishes (unknown)
+        to a restored topic are suppressed, and a publish of the same value
+        as the restored one is suppressed once.
+        """
+        end = time.monotonic() + timeout
+        while not self._connected and time.monotonic() < end:
+            time.sleep(0.05)
+        if not self._connected:
+            self.Logger.warning("MQTT not connected.  Skipping retained state bootstrap")
+            return self.retained_state
+
+        self._bootstrap_filters = list(topic_filters)
+        self._last_retained_time = time.monotonic()
+        self.client.subscribe([(f, 0) for f in self._bootstrap_filters])
+        while time.monotonic() < end and (time.monotonic() - self._last_retained_time) < quiet_time:
+            time.sleep(0.05)
+        self.client.unsubscribe(self._bootstrap_filters)
+        self._bootstrap_filters = None
+        self._restoring = True
+
+        self.Logger.info(f"Restored {len(self.retained_state)} retained topics from broker")
+        return self.retained_state
+
+    def finish_startup(self):
+        """ entities are initialized.  Publishes of new values are no longer suppressed """
+        self._restoring = False
+
+    def suppress_retained_publish(self, topic: str, payload) -> bool:
+        """ return True if a retained publish is not needed because the broker
+        already has the value restored at startup"""
+        restored = self.retained_state.get(topic)
+        if restored is None:
+            return False
+        payload = payload_to_bytes(payload)
+        if payload == restored:
+            # broker already has this value
+            self.retained_state.pop(topic, None)
+        elif self._restoring and payload in MQTT_Support.PLACEHOLDER_PAYLOADS:
+            # startup placeholder.  Keep the restored value
+            pass
+        else:
+            # a real value.  Values an entity only publishes once (in initialize) must get thru
+            self.retained_state.pop(topic, None)
+            return False
+        self.suppressed_publishes += 1
+        return True
+
+    def _is_restorable_topic(self, topic: str) -> bool:
+        """ state topics only.  Commands and discovery configs are not our state """
+        return (not topic.endswith("/set") and not self.is_ha_discovery_topic(topic) and
+                topic != self.bridge_state_topic)
+
+    def _is_bootstrap_topic(self, topic: str) -> bool:
+        for f in self._bootstrap_filters:
+            if mqc.topic_matches_sub(f, topic):
+                return True
+        return False
+
     def on_disconnect(self, client, userdata, flags, reason_code, properties):
         self.Logger.critical("MQTT disconnected")
         self._connected = False
+        self.topic_aliases.disconnected()
 
 
     def send_bridge_info(self, info:str):
-        pass
+        """ publish json info/metrics about the bridge """
+        self.client.publish(self.bridge_info_topic, info, retain=False)
 
     def _make_device_topic_root(self, id:str) -> str:
         return self.device_topic_base + "/" + self._prepare_topic_string_node(id)
@@ -127,6 +287,48 @@ class MQTT_Support(object):
         """
         return input.translate(input.maketrans(" /", "__", "()")).lower()
 
+    def is_ha_discovery_topic(self, topic: str) -> bool:
+        """ true if topic is a Home Assistant auto discovery config topic """
+        return topic.startswith(MQTT_Support.HA_AUTO_BASE + "/") and topic.endswith("/config")
+
+    def cache_ha_discovery(self, topic: str, payload, qos: int):
+        """ remember the latest discovery payload for topic.  A new payload replaces the old one """
+        with self._ha_discovery_lock:
+            self.ha_discovery_cache[topic] = (payload, qos)
+
+    def republish_ha_discovery(self, rate: float = 10.0, jitter: float = 2.0):
+        """ republish all cached discovery configs from a background thread.
+
+        Waits a random 0 - jitter seconds before starting and then publishes
+        at most rate configs per second.  A republish in progress is restarted.
+        """
+        self.cancel_ha_discovery_republish()
+        with self._ha_discovery_lock:
+            configs = list(self.ha_discovery_cache.items())
+        self._ha_discovery_cancel = threading.Event()
+        self._ha_discovery_thread = threading.Thread(target=self._republish_ha_discovery,
+                                                     args=(configs, rate, jitter, self._ha_discovery_cancel),
+                                                     name="ha_discovery_republish", daemon=True)
+        self._ha_discovery_thread.start()
+
+    def cancel_ha_discovery_republish(self):
+        self._ha_discovery_cancel.set()
+        if self._ha_discovery_thread is not None and self._ha_discovery_thread is not threading.current_thread():
+            self._ha_discovery_thread.join(1.0)
+        self._ha_discovery_thread = None
+
+    def _republish_ha_discovery(self, configs: list, rate: float, jitter: float, cancel: threading.Event):
+        if cancel.wait(random.uniform(0, max(0.0, jitter))):
+            return
+        interval = 1.0 / rate if rate > 0 else 0
+        self.Logger.info(f"Republishing {len(configs)} HA discovery configs")
+        for (topic, (payload, qos)) in configs:
+            if cancel.is_set():
+                return
+            self.client.publish(topic, payload, qos=qos, retain=False)
+            if interval and cancel.wait(interval):
+                return
+
     def get_bridge_ha_name(self) -> str:
         """ return a string that is used to identify the bridge HA as a device."""
         return self._prepare_topic_string_node(self.root_topic)
@@ -135,8 +337,64 @@ class MQTT_Support(object):
 
     def shutdown(self):
         """ shutdown.  Tell server we are going offline"""
+        self.cancel_ha_discovery_republish()
         self.client.publish(self.bridge_state_topic, "offline", retain=True)
-        
+        self.dispatcher.stop()
+        if self.spool is not None:
+            self.spool.close()
+
+
+class MQTT_Client(mqc.Client):
+    """ paho client that lets MQTT_Support adjust every publish.
+
+    Entities publish using mqtt_support.client.publish so this is the
+    one place all outbound messages pass thru.
+    """
+
+    def __init__(self, mqtt_support: MQTT_Support, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mqtt_support = mqtt_support
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        metrics = self.mqtt_support.metrics
+        tracer = self.mqtt_support.latency_tracer
+        if tracer is not None:
+            tracer.mark_publish()
+
+        if retain and self.mqtt_support.retained_state and self.mqtt_support.suppress_retained_publish(topic, payload):
+            metrics.inc("mqtt_suppressed")
+            info = mqc.MQTTMessageInfo(0)
+            info.rc = mqc.MQTT_ERR_SUCCESS
+            return info
+
+        spool = self.mqtt_support.spool
+        if spool is not None and retain and topic != self.mqtt_support.bridge_state_topic:
+            if not self.mqtt_support.is_connected():
+                # keep latest value on disk instead of paho's unbounded memory buffer
+                spool.store(topic, payload, qos)
+                metrics.inc("mqtt_spooled")
+                info = mqc.MQTTMessageInfo(0)
+                info.rc = mqc.MQTT_ERR_NO_CONN
+                return info
+            spool.discard(topic)
+
+        if self.mqtt_support.is_ha_discovery_topic(topic):
+            self.mqtt_support.cache_ha_discovery(topic, payload, qos)
+
+        metrics.inc("mqtt_published")
+        aliases = self.mqtt_support.topic_aliases
+        if aliases.maximum == 0:
+            return self._deliver_publish(topic, payload, qos, retain, properties)
+        # the main loop, dispatcher workers, HA republish and spool replay all publish
+        with aliases.send_lock:
+            (topic, properties) = aliases.apply(topic, qos, properties)
+            return self._deliver_publish(topic, payload, qos, retain, properties)
+
+    def _deliver_publish(self, topic, payload, qos, retain, properties):
+        """ hand the message to paho.  Overridden by clients that don't use a network """
+        return super().publish(topic, payload, qos, retain, properties)
+
+
  ## GLOBALS ##       
 gMQTTObj:MQTT_Support = None
 
@@ -153,17 +411,19 @@ def on_mqtt_message(client, userdata, msg, properties=None):
 def on_mqtt_disconnect(client, userdata, flags, reason_code, properties=None):
     gMQTTObj.on_disconnect(client, userdata, flags, reason_code, properties=properties)
 
-def MqttInitalize(host:str, port:str, user:str, password:str, client_id:str, topic_base:str):
+def MqttInitalize(host:str, port:str, user:str, password:str, client_id:str, topic_base:str, dispatch_workers:int = 1,
+                  topic_alias_max:int = 0, spool: MQTT_Spool = None):
     """ main function to parse config and initialize the 
     mqtt client.
     """
     global gMQTTObj
-    gMQTTObj = MQTT_Support(client_id, topic_base)
+    gMQTTObj = MQTT_Support(client_id, topic_base, dispatch_workers, topic_alias_max)
 
     port = int(port)
     
-    mqttc = mqc.Client(mqc.CallbackAPIVersion.VERSION2, client_id=client_id, protocol=mqc.MQTTv5)
+    mqttc = MQTT_Client(gMQTTObj, mqc.CallbackAPIVersion.VERSION2, client_id=client_id, protocol=mqc.MQTTv5)
     gMQTTObj.set_client(mqttc)
+    gMQTTObj.set_spool(spool)
     mqttc.on_connect = on_mqtt_connect
     mqttc.on_subscribe = on_mqtt_subscribe
     mqttc.on_message = on_mqtt_message
@@ -176,10 +436,16 @@ def MqttInitalize(host:str, port:str, user:str, password:str, client_id:str, top
         logging.getLogger(__name__).info(f"Connecting to MQTT broker {host}:{port}")
         connproperties = Properties(PacketTypes.CONNECT)
         mqttc.connect(host, port=port, properties=Properties(PacketTypes.CONNECT))
+        gMQTTObj.dispatcher.start()
         return gMQTTObj
     
     except Exception as e:
         logging.getLogger(__name__).error(f"MQTT Broker Connection Failed. {e}")
+        if spool is not None:
+            # keep trying in the background (loop_start) and spool state until connected
+            mqttc.connect_async(host, port=port, properties=Properties(PacketTypes.CONNECT))
+            gMQTTObj.dispatcher.start()
+            return gMQTTObj
         return None
 
 
@@ -0,0 +1,170 @@
+"""
+Dispatch inbound MQTT messages to their registered handlers on worker threads
+
+paho calls on_message from its network thread (loop_start).  Handlers like
+the APS-500 terminal commands sleep between frames and would otherwise stall
+keepalive and every other inbound message.  This module moves handler
+execution onto a small pool of worker threads.
+
+Messages are routed to a worker by the object that owns the handler (the entity
+for a bound method) so ordering is kept per entity while different entities
+can run in parallel.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+
+class MQTT_Dispatcher(object):
+    """ Pool of worker threads that run mqtt message handlers.
+
+    Each worker has its own queue.  Every handler owner is pinned to one
+    worker so messages for the same entity are handled in arrival order.
+    """
+
+    def __init__(self, worker_count: int = 1):
+        self.Logger = logging.getLogger(__name__)
+        self.worker_count = max(1, int(worker_count))
+        self._queues = [queue.Queue() for _ in range(self.worker_count)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._owner_map = {}   # id of handler owner -> worker index
+        self.tracer = None      # optional LatencyTracer
+        self.cpu_accounting = None  # optional EntityCpuAccounting
+
+        # metrics
+        self.enqueued = 0
+        self.handled = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.total_handler_time = 0.0
+        self.max_handler_time = 0.0
+
+    def start(self):
+        """ start the worker threads """
+        if self._running:
+            return
+        self._running = True
+        for index, q in enumerate(self._queues):
+            t = threading.Thread(target=self._worker, args=(q,),
+                                 name=f"mqtt_dispatch_{index}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 1.0):
+        """ stop the worker threads.  Messages queued before stop are still handled
+        (the stop sentinel is queued behind them); each worker is waited on for up to timeout """
+        if not self._running:
+            return
+        self._running = False
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def submit(self, func, topic: str, payload: str, properties=None):
+        """ queue a handler call.  Called from the paho network thread. """
+        q = self._queues[self._worker_index(func)]
+        q.put((func, topic, payload, properties, time.perf_counter()))
+
+        depth = q.qsize()
+        with self._lock:
+            self.enqueued += 1
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+
+    def queue_depth(self) -> int:
+        """ number of messages waiting across all workers """
+        return sum(q.qsize() for q in self._queues)
+
+    def get_metrics(self) -> dict:
+        """ return a snapshot of the dispatcher metrics """
+        with self._lock:
+            handled = self.handled
+            return {
+                "workers": self.worker_count,
+                "queue_depth": self.queue_depth(),
+                "max_queue_depth": self.max_queue_depth,
+                "enqueued": self.enqueued,
+                "handled": handled,
+                "failed": self.failed,
+                "avg_wait_ms": round((self.total_wait_time / handled) * 1000, 3) if handled else 0,
+                "max_wait_ms": round(self.max_wait_time * 1000, 3),
+                "avg_handler_ms": round((self.total_handler_time / handled) * 1000, 3) if handled else 0,
+                "max_handler_ms": round(self.max_handler_time * 1000, 3),
+            }
+
+    def _worker_index(self, func) -> int:
+        """ pick the worker for a handler.  Bound methods use the owning object
+        so all topics of an entity share a worker."""
+        if self.worker_count == 1:
+            return 0
+        owner = id(getattr(func, "__self__", func))
+        index = self._owner_map.get(owner)
+        if index is None:
+            # assign round robin the first time we see an owner
+            index = len(self._owner_map) % self.worker_count
+            self._owner_map[owner] = index
+        return index
+
+    def _worker(self, q: queue.Queue):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            (func, topic, payload, properties, queued_at) = item
+            started = time.perf_counter()
+            ok = True
+            tracer = self.tracer
+            if tracer is not None:
+                tracer.begin_command(topic, queued_at)
+            accounting = self.cpu_accounting
+            cpu_start = time.thread_time() if accounting is not None else 0.0
+            try:
+                func(topic, payload, properties)
+            except Exception as e:
+                ok = False
+                self.Logger.error(f"Exception in mqtt handler for topic {topic}: {e}")
+            if accounting is not None:
+                accounting.record_mqtt(getattr(func, "__self__", func), time.thread_time() - cpu_start)
+            if tracer is not None:
+                tracer.end_command()
+            finished = time.perf_counter()
+
+            wait_time = started - queued_at
+            handler_time = finished - started
+            with self._lock:
+                self.handled += 1
+                if not ok:
+                    self.failed += 1
+                self.total_wait_time += wait_time
+                self.total_handler_time += handler_time
+                if wait_time > self.max_wait_time:
+                    self.max_wait_time = wait_time
+                if handler_time > self.max_handler_time:
+                    self.max_handler_time = handler_time
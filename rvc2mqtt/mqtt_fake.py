@@ -0,0 +1,114 @@
+"""
+In-process fake mqtt client
+
+Runs the real MQTT_Support / MQTT_Client publish path (aliases, discovery cache,
+latency tracing, metrics) but records messages in memory instead of sending
+them to a broker.  Used by log replay and tests.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import threading
+import time
+import paho.mqtt.client as mqc
+from rvc2mqtt.mqtt import MQTT_Support, MQTT_Client
+
+PublishRecord = collections.namedtuple("PublishRecord", ["time", "topic", "payload", "qos", "retain", "properties"])
+
+
+class FakeMqttClient(MQTT_Client):
+    """ MQTT_Client that keeps publishes in memory """
+
+    def __init__(self, mqtt_support: MQTT_Support, keep: int = None):
+        super().__init__(mqtt_support, mqc.CallbackAPIVersion.VERSION2,
+                         client_id=mqtt_support.client_id, protocol=mqc.MQTTv5)
+        self._lock = threading.Lock()
+        self.published = collections.deque(maxlen=keep)     # PublishRecord, oldest first
+        self.publish_count = 0
+        self.subscriptions = set()
+        self._mid = 0
+
+    def _deliver_publish(self, topic, payload, qos, retain, properties):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        elif isinstance(payload, (int, float)):
+            payload = str(payload).encode("utf-8")
+        elif payload is None:
+            payload = b""
+        with self._lock:
+            self._mid += 1
+            self.published.append(PublishRecord(time.time(), topic, payload, qos, retain, properties))
+            self.publish_count += 1
+            info = mqc.MQTTMessageInfo(self._mid)
+        info.rc = mqc.MQTT_ERR_SUCCESS
+        return info
+
+    def subscribe(self, topic, qos=0, options=None, properties=None):
+        topics = topic if isinstance(topic, list) else [topic]
+        with self._lock:
+            for t in topics:
+                self.subscriptions.add(t[0] if isinstance(t, tuple) else t)
+            self._mid += 1
+            return (mqc.MQTT_ERR_SUCCESS, self._mid)
+
+    def unsubscribe(self, topic, properties=None):
+        topics = topic if isinstance(topic, list) else [topic]
+        with self._lock:
+            for t in topics:
+                self.subscriptions.discard(t)
+            self._mid += 1
+            return (mqc.MQTT_ERR_SUCCESS, self._mid)
+
+    def loop_start(self):
+        return mqc.MQTT_ERR_SUCCESS
+
+    def loop_stop(self):
+        return mqc.MQTT_ERR_SUCCESS
+
+    def inject(self, topic: str, payload, retain: bool = False):
+        """ deliver an inbound message as if the broker sent it """
+        msg = mqc.MQTTMessage(topic=topic.encode("utf-8"))
+        msg.payload = payload.encode("utf-8") if isinstance(payload, str) else payload
+        msg.retain = retain
+        self.mqtt_support.on_message(self, None, msg)
+
+    def messages(self, topic: str = None) -> list:
+        """ recorded publishes, optionally only those for topic """
+        with self._lock:
+            return [p for p in self.published if topic is None or p.topic == topic]
+
+    def last_payload(self, topic: str):
+        """ payload (str) of the most recent publish to topic.  None if never published """
+        with self._lock:
+            for p in reversed(self.published):
+                if p.topic == topic:
+                    return p.payload.decode("utf-8")
+        return None
+
+    def clear(self):
+        with self._lock:
+            self.published.clear()
+
+
+def make_fake_mqtt_support(client_id: str = "bridge", topic_base: str = "rvc2mqtt", keep: int = None) -> MQTT_Support:
+    """ MQTT_Support with a connected FakeMqttClient.  Inbound messages are
+    handled on the calling thread (the dispatcher is not started) """
+    support = MQTT_Support(client_id, topic_base)
+    client = FakeMqttClient(support, keep)
+    support.set_client(client)
+    support.on_connect(client, None, None, 0, None)
+    return support
@@ -0,0 +1,216 @@
+"""
+Disk backed spool of retained publishes for MQTT broker outages
+
+While the broker is not reachable retained publishes (device state) are written
+to a small SQLite database instead of being buffered by paho in memory.  Only the
+latest value per topic is kept so the spool size is bounded by the number of
+topics, not the length of the outage.  Writes are batched and committed (fsync)
+at most once per flush interval.
+
+After reconnecting the spool is replayed at a controlled rate.  If a live publish
+for the same topic happens first the spooled value is dropped so stale state
+never overwrites new state.  The replay checks a topic and queues its publish
+under the spool lock, and a live publish of a topic takes the same lock while a
+replay runs, so a live value is always queued after the spooled one.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+def payload_to_bytes(payload) -> bytes:
+    """ convert a publish payload to the bytes paho would send """
+    if isinstance(payload, str):
+        return payload.encode("utf-8")
+    if payload is None:
+        return b""
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    return str(payload).encode("utf-8")
+
+
+class MQTT_Spool(object):
+    """ Compacted (latest value per topic) spool of retained mqtt publishes """
+
+    REPLAY_BATCH_SIZE = 20
+
+    def __init__(self, filepath: os.PathLike, max_topics: int = 2000,
+                 flush_interval: float = 2.0, replay_rate: float = 50.0):
+        self.Logger = logging.getLogger(__name__)
+        self.filepath = filepath
+        self.max_topics = max(1, int(max_topics))
+        self.flush_interval = flush_interval
+        self.replay_rate = max(1.0, float(replay_rate))
+
+        self._lock = threading.RLock()       # replay publishes while holding it
+        self._pending = {}          # topic -> (payload, qos) not yet written to disk
+        self._discarded = set()     # topics that must be deleted from disk on next flush
+        self._topics = set()        # topics on disk or pending
+        self._last_flush = time.monotonic()
+        self._seq = 0
+        self._replay_thread = None
+        self._replaying = False
+        self._stop_replay = threading.Event()
+
+        # metrics
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.flushes = 0
+
+        self._db = sqlite3.connect(filepath, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS spool "
+                         "(topic TEXT PRIMARY KEY, payload BLOB, qos INTEGER, seq INTEGER)")
+        for (topic, seq) in self._db.execute("SELECT topic, seq FROM spool"):
+            self._topics.add(topic)
+            self._seq = max(self._seq, seq)
+        if len(self._topics) > 0:
+            self.Logger.info(f"Loaded {len(self._topics)} spooled topics from {filepath}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._topics)
+
+    def store(self, topic: str, payload, qos: int = 0):
+        """ keep the latest retained payload for topic.  Written to disk in batches """
+        payload = payload_to_bytes(payload)
+
+        with self._lock:
+            if topic not in self._topics and len(self._topics) >= self.max_topics:
+                self.dropped += 1
+                return
+            self._topics.add(topic)
+            self._discarded.discard(topic)
+            self._pending[topic] = (payload, qos)
+            self.spooled += 1
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def discard(self, topic: str):
+        """ a newer value is being published live.  Forget the spooled one.  Called before the
+        live publish is queued, so while a replay runs this waits for a replay publish in progress """
+        if topic not in self._topics and not self._replaying:
+            return
+        with self._lock:
+            if topic in self._topics:
+                self._topics.discard(topic)
+                self._pending.pop(topic, None)
+                self._discarded.add(topic)
+
+    def flush(self):
+        """ write pending values to disk and fsync """
+        with self._lock:
+            self._flush()
+
+    def poll(self):
+        """ called from the main loop.  Flushes pending values once the flush interval has passed
+        so a crash during a quiet outage loses at most flush_interval of state """
+        if len(self._pending) == 0 and len(self._discarded) == 0:
+            return
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        with self._lock:
+            self._flush()
+
+    def start_replay(self, publish_func, is_connected_func):
+        """ replay the spool in a background thread using publish_func(topic, payload, qos, retain).
+        Stops early if is_connected_func() returns False. """
+        if self._replay_thread is not None and self._replay_thread.is_alive():
+            return
+        self._stop_replay.clear()
+        self._replaying = True
+        self._replay_thread = threading.Thread(target=self._replay, args=(publish_func, is_connected_func),
+                                               name="mqtt_spool_replay", daemon=True)
+        self._replay_thread.start()
+
+    def close(self):
+        self._stop_replay.set()
+        if self._replay_thread is not None:
+            self._replay_thread.join(1.0)
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {"topics": len(self._topics),
+                    "pending": len(self._pending),
+                    "spooled": self.spooled,
+                    "replayed": self.replayed,
+                    "dropped": self.dropped,
+                    "flushes": self.flushes}
+
+    def _flush(self):
+        """ lock must be held """
+        self._last_flush = time.monotonic()
+        if len(self._pending) == 0 and len(self._discarded) == 0:
+            return
+        rows = []
+        for (topic, (payload, qos)) in self._pending.items():
+            self._seq += 1
+            rows.append((topic, payload, qos, self._seq))
+        try:
+            self._db.execute("BEGIN")
+            if len(self._discarded) > 0:
+                self._db.executemany("DELETE FROM spool WHERE topic = ?", [(t,) for t in self._discarded])
+            self._db.executemany("INSERT OR REPLACE INTO spool (topic, payload, qos, seq) VALUES (?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+            self.flushes += 1
+        except sqlite3.Error as e:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            self.Logger.error(f"Failed to write mqtt spool {self.filepath}: {e}")
+        self._pending = {}
+        self._discarded = set()
+
+    def _replay(self, publish_func, is_connected_func):
+        try:
+            self._replay_spool(publish_func, is_connected_func)
+        finally:
+            self._replaying = False
+
+    def _replay_spool(self, publish_func, is_connected_func):
+        self.flush()
+        interval = 1.0 / self.replay_rate
+        self.Logger.info(f"Replaying {len(self)} spooled topics")
+        while not self._stop_replay.is_set() and is_connected_func():
+            with self._lock:
+                self._flush()
+                rows = self._db.execute("SELECT topic, payload, qos, seq FROM spool ORDER BY seq LIMIT ?",
+                                        (MQTT_Spool.REPLAY_BATCH_SIZE,)).fetchall()
+            if len(rows) == 0:
+                return
+
+            for (topic, payload, qos, seq) in rows:
+                if self._stop_replay.is_set() or not is_connected_func():
+                    return
+                with self._lock:
+                    if topic not in self._topics or topic in self._pending:
+                        # replaced by live publish or newer spooled value
+                        continue
+                    self._topics.discard(topic)
+                    self._discarded.add(topic)
+                    # queued under the lock.  A live publish of this topic waits in discard()
+                    publish_func(topic, payload, qos, True)
+                    self.replayed += 1
+                time.sleep(interval)
@@ -0,0 +1,128 @@
+"""
+MQTT v5 topic alias management for rvc2mqtt
+
+Device state topics like `rvc2mqtt/bridge/d/tanklevel-1ffb7-i0/state` are
+often longer than the payload.  MQTT v5 lets a client map a topic to a small
+integer (topic alias) for the life of a connection.  After the first publish
+carries both the topic and the alias, later publishes only send the alias.
+
+Aliases are only valid for a single network connection and the broker limits
+how many we can use (Topic Alias Maximum in CONNACK, default 0 = none).  The
+table is cleared on every connect/disconnect and re-learned.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import threading
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+
+
+class MQTT_TopicAliases(object):
+    """ Assign topic aliases to frequently published topics.
+
+    Only QoS 0 publishes without caller supplied properties are aliased.
+    QoS 1/2 messages can be re-sent by paho on a new connection where
+    the alias would no longer be valid.
+    """
+
+    MIN_PUBLISH_COUNT = 2   # publishes on a topic before it gets an alias
+    MIN_TOPIC_LENGTH = 8    # short topics are not worth an alias
+
+    def __init__(self, local_maximum: int = 64):
+        self.Logger = logging.getLogger(__name__)
+        self.local_maximum = max(0, int(local_maximum))
+        self._lock = threading.Lock()
+        # held by the publisher across apply() and queuing the packet so the packet that carries
+        # the full topic with a new alias is queued before any alias only packet from another thread
+        self.send_lock = threading.RLock()
+        self._maximum = 0        # negotiated with broker.  0 means disabled
+        self._aliases = {}       # topic -> alias number
+        self._sent = set()       # aliases that the broker has seen with their topic
+        self._counts = {}        # topic -> publish count on this connection
+
+        # metrics
+        self.aliased_publishes = 0
+        self.bytes_saved = 0
+
+    @property
+    def maximum(self) -> int:
+        return self._maximum
+
+    def connected(self, connack_properties=None):
+        """ reset table for a new connection using the broker's Topic Alias Maximum """
+        broker_maximum = 0
+        if connack_properties is not None:
+            broker_maximum = getattr(connack_properties, "TopicAliasMaximum", 0)
+        with self._lock:
+            self._maximum = min(self.local_maximum, broker_maximum)
+            self._reset()
+        self.Logger.debug(f"Topic alias maximum: {self._maximum} (broker: {broker_maximum})")
+
+    def disconnected(self):
+        """ aliases are tied to a connection.  Drop them all """
+        with self._lock:
+            self._maximum = 0
+            self._reset()
+
+    def apply(self, topic: str, qos: int, properties):
+        """ return the (topic, properties) to publish with.
+
+        The first aliased publish sends the full topic and the alias.  Later
+        publishes send an empty topic and only the alias.  Publishers on more than
+        one thread must hold send_lock until the returned packet is queued.
+        """
+        if self._maximum == 0 or qos != 0 or properties is not None:
+            return (topic, properties)
+
+        with self._lock:
+            if self._maximum == 0:
+                return (topic, properties)
+
+            alias = self._aliases.get(topic)
+            if alias is None:
+                count = self._counts.get(topic, 0) + 1
+                self._counts[topic] = count
+                if (count < MQTT_TopicAliases.MIN_PUBLISH_COUNT or
+                        len(topic) < MQTT_TopicAliases.MIN_TOPIC_LENGTH or
+                        len(self._aliases) >= self._maximum):
+                    return (topic, properties)
+                alias = len(self._aliases) + 1
+                self._aliases[topic] = alias
+                del self._counts[topic]
+
+            properties = Properties(PacketTypes.PUBLISH)
+            properties.TopicAlias = alias
+            if alias not in self._sent:
+                self._sent.add(alias)
+                return (topic, properties)
+
+            self.aliased_publishes += 1
+            self.bytes_saved += len(topic.encode("utf-8"))
+            return ("", properties)
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {"maximum": self._maximum,
+                    "assigned": len(self._aliases),
+                    "aliased_publishes": self.aliased_publishes,
+                    "bytes_saved": self.bytes_saved}
+
+    def _reset(self):
+        self._aliases = {}
+        self._sent = set()
+        self._counts = {}
@@ -47,13 +47,15 @@ class PluginSupport(object):
          else:
             self.Logger.error(f"Invalid Plugin Path: {p}")
       
-   def register_with_factory_the_entity_plugins(self, factory_map:list):
+   def register_with_factory_the_entity_plugins(self, factory_map:list, skip_failed:bool = False):
       """
       Load the classes defined in plugins that are:
          * subclass of EntityPluginBaseClass and 
          * define class dict of FACTORY_MATCH_ATTRIBUTES
       Register the class with the factory
 
+      skip_failed logs and skips plugin modules that fail to load instead of raising
+
       DEVELOPER NOTE:  This is pretty hacky.  This was hacked together
       with trial and error.  I am sure numerous steps are not needed
       or different functions/implementations could be used
@@ -71,7 +73,13 @@ class PluginSupport(object):
          sys.modules[a[0]] = module
 
          # Execute the module - load?
-         spec.loader.exec_module(module)
+         try:
+            spec.loader.exec_module(module)
+         except (ImportError, SyntaxError) as e:
+            if not skip_failed:
+               raise
+            self.Logger.error(f"Failed to load plugin {a[1]}: {type(e).__name__}: {e}")
+            continue
 
          # Loop thru the module and find all the classes defined
          for attribute_name in dir(module):
@@ -0,0 +1,309 @@
+"""
+On demand profiling of a running bridge, controlled over mqtt
+
+Publish to `<root>/admin/profiler/set`:
+  `start`               - start the sampling profiler for 60 seconds
+  `start sample 30`     - sampling profiler for 30 seconds
+  `start sample 30 all` - sampling profiler of every thread, not just the main loop
+  `start cprofile 30`   - deterministic profiler (cProfile) of the main loop for 30 seconds
+  `stop`                - stop now and publish the report
+
+The state (`running` / `stopped`) is published to `<root>/admin/profiler` and
+the json report to `<root>/admin/profiler/report`.  If an output directory is
+configured the report (and cProfile stats) are also written there.
+
+Reports are aggregated by pipeline stage (decode, entity rvc processing,
+entity mqtt processing, mqtt publish, transmit) and by entity class.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import cProfile
+import datetime
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from rvc2mqtt.mqtt import MQTT_Support
+from rvc2mqtt.entity import EntityPluginBaseClass
+
+# function name -> pipeline stage.  First match walking from the innermost frame wins
+STAGE_FUNCTIONS = {
+    "rvc_decode": "decode",
+    "process_rvc_msg": "entity_rvc",
+    "process_mqtt_msg": "entity_mqtt",
+    "publish": "mqtt_publish",
+    "message_tx_loop": "transmit",
+    "message_rx_loop": "dispatch",
+}
+
+# innermost frames ("file:function") of a thread that is blocked waiting, not running.
+# app.py:main is the main loop sleeping between iterations
+IDLE_FUNCTIONS = {
+    "threading.py:wait",
+    "threading.py:_wait_for_tstate_lock",
+    "queue.py:get",
+    "selectors.py:select",
+    "socketcan.py:_recv_internal",
+    "client.py:_loop",
+    "app.py:main",
+}
+
+ENTITY_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "entity")
+
+
+def _percentages(counts: dict, total: int) -> dict:
+    return {k: round(v * 100.0 / total, 2) for (k, v) in sorted(counts.items(), key=lambda kv: kv[1], reverse=True)}
+
+
+class SamplingProfiler(object):
+    """ Periodically sample the stack of one thread, or of every thread (except itself) when
+    thread_ident is None.  Stacks blocked in a known wait (IDLE_FUNCTIONS) are only counted as idle """
+
+    def __init__(self, interval: float = 0.005, thread_ident: int = None):
+        self.interval = interval
+        self.thread_ident = thread_ident
+        self.samples = 0
+        self.idle_samples = 0
+        self.by_stage = {}
+        self.by_entity = {}
+        self.by_function = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_time = 0
+        self._duration = 0
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler_sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+        self._duration = time.perf_counter() - self._start_time
+        return self.report()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_ident is not None:
+                frame = frames.get(self.thread_ident)
+                if frame is not None:
+                    self.sample_frame(frame)
+                continue
+            for (ident, frame) in frames.items():
+                if ident != me:
+                    self.sample_frame(frame)
+
+    def sample_frame(self, frame):
+        """ classify one stack """
+        leaf = frame.f_code
+        func = f"{os.path.basename(leaf.co_filename)}:{leaf.co_name}"
+        if func in IDLE_FUNCTIONS:
+            self.idle_samples += 1
+            return
+        self.samples += 1
+        self.by_function[func] = self.by_function.get(func, 0) + 1
+
+        stage = None
+        entity = None
+        f = frame
+        while f is not None:
+            name = f.f_code.co_name
+            if stage is None:
+                stage = STAGE_FUNCTIONS.get(name)
+            if entity is None:
+                obj = f.f_locals.get("self") if "self" in f.f_code.co_varnames else None
+                if isinstance(obj, EntityPluginBaseClass):
+                    entity = type(obj).__name__
+            if stage is not None and entity is not None:
+                break
+            f = f.f_back
+
+        stage = stage or "other"
+        self.by_stage[stage] = self.by_stage.get(stage, 0) + 1
+        if entity is not None:
+            self.by_entity[entity] = self.by_entity.get(entity, 0) + 1
+
+    def report(self) -> dict:
+        total = max(1, self.samples)
+        top = sorted(self.by_function.items(), key=lambda kv: kv[1], reverse=True)[:20]
+        return {"mode": "sample",
+                "duration_s": round(self._duration, 2),
+                "samples": self.samples,
+                "idle_samples": self.idle_samples,
+                "by_stage_pct": _percentages(self.by_stage, total),
+                "by_entity_pct": _percentages(self.by_entity, total),
+                "top_functions_pct": [[f, round(c * 100.0 / total, 2)] for (f, c) in top]}
+
+
+class DeterministicProfiler(object):
+    """ cProfile of the thread that calls start/stop (the main loop) """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self._start_time = 0
+        self._duration = 0
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self) -> dict:
+        self.profile.disable()
+        self._duration = time.perf_counter() - self._start_time
+        return self.report()
+
+    def report(self) -> dict:
+        stats = pstats.Stats(self.profile).stats
+        by_stage = {}
+        by_entity = {}
+        by_function = []
+        total = 0.0
+        for ((filename, line, func), (cc, nc, tt, ct, callers)) in stats.items():
+            total += tt
+            stage = STAGE_FUNCTIONS.get(func)
+            if stage is not None:
+                by_stage[stage] = by_stage.get(stage, 0.0) + ct
+            if os.path.dirname(os.path.abspath(filename)) == ENTITY_FOLDER:
+                module = os.path.splitext(os.path.basename(filename))[0]
+                by_entity[module] = by_entity.get(module, 0.0) + tt
+            by_function.append((f"{os.path.basename(filename)}:{line}:{func}", nc, tt, ct))
+
+        by_function.sort(key=lambda f: f[2], reverse=True)
+        return {"mode": "cprofile",
+                "duration_s": round(self._duration, 2),
+                "total_time_s": round(total, 4),
+                "by_stage_cumulative_s": {k: round(v, 4) for (k, v) in by_stage.items()},
+                "by_entity_module_s": {k: round(v, 4) for (k, v) in by_entity.items()},
+                "top_functions": [{"function": f, "calls": nc, "tottime_s": round(tt, 4), "cumtime_s": round(ct, 4)}
+                                  for (f, nc, tt, ct) in by_function[:20]]}
+
+
+class ProfilerControl(object):
+    """ Start/stop profilers from mqtt commands.
+
+    Commands arrive on an mqtt dispatcher thread but cProfile must be enabled on
+    the thread being profiled, so the work is done in poll() which the main
+    loop calls every iteration.
+    """
+
+    DEFAULT_DURATION = 60
+    MAX_DURATION = 3600
+
+    def __init__(self, mqtt_support: MQTT_Support, output_dir: os.PathLike = None):
+        self.Logger = logging.getLogger(__name__)
+        self.mqtt_support = mqtt_support
+        self.output_dir = output_dir
+        self.state_topic = mqtt_support.root_topic + "/admin/profiler"
+        self.command_topic = self.state_topic + "/set"
+        self.report_topic = self.state_topic + "/report"
+
+        self._pending = None      # (command, mode, duration, all_threads) from mqtt
+        self._profiler = None
+        self._stop_time = 0
+        self.last_report = None
+
+        mqtt_support.register(self.command_topic, self.process_mqtt_msg)
+
+    def process_mqtt_msg(self, topic, payload, properties=None):
+        parts = payload.strip().lower().split()
+        if len(parts) == 0:
+            self.Logger.warning(f"Invalid payload {payload} for topic {topic}")
+            return
+        if parts[0] == "stop":
+            self._pending = ("stop", None, 0, False)
+        elif parts[0] == "start":
+            mode = parts[1] if len(parts) > 1 else "sample"
+            all_threads = len(parts) > 3 and parts[3] == "all"
+            if mode not in ("sample", "cprofile"):
+                self.Logger.warning(f"Invalid profiler mode {mode}")
+                return
+            try:
+                duration = float(parts[2]) if len(parts) > 2 else ProfilerControl.DEFAULT_DURATION
+            except ValueError:
+                self.Logger.warning(f"Invalid profiler duration {parts[2]}")
+                return
+            self._pending = ("start", mode, min(max(duration, 1), ProfilerControl.MAX_DURATION), all_threads)
+        else:
+            self.Logger.warning(f"Invalid payload {payload} for topic {topic}")
+
+    @property
+    def running(self) -> bool:
+        return self._profiler is not None
+
+    def poll(self):
+        """ called from the main loop """
+        if self._pending is not None:
+            (command, mode, duration, all_threads) = self._pending
+            self._pending = None
+            if command == "start":
+                self.start(mode, duration, all_threads)
+            else:
+                self.stop()
+
+        if self._profiler is not None and time.monotonic() >= self._stop_time:
+            self.stop()
+
+    def start(self, mode: str = "sample", duration: float = DEFAULT_DURATION, all_threads: bool = False):
+        """ start profiling.  Called on the main loop so by default the sampler only samples this thread """
+        if self._profiler is not None:
+            self.Logger.warning("Profiler already running")
+            return
+        self.Logger.info(f"Starting {mode} profiler for {duration} seconds")
+        if mode == "cprofile":
+            self._profiler = DeterministicProfiler()
+        else:
+            self._profiler = SamplingProfiler(thread_ident=None if all_threads else threading.get_ident())
+        self._stop_time = time.monotonic() + duration
+        self._profiler.start()
+        self._publish(self.state_topic, "running", retain=True)
+
+    def stop(self) -> dict:
+        if self._profiler is None:
+            return None
+        profiler = self._profiler
+        self._profiler = None
+        report = profiler.stop()
+        self.last_report = report
+        self.Logger.info(f"Profiler stopped after {report['duration_s']} seconds")
+
+        report_json = json.dumps(report)
+        self._publish(self.report_topic, report_json, retain=False)
+        self._publish(self.state_topic, "stopped", retain=True)
+        if self.output_dir is not None:
+            self._write(profiler, report_json)
+        return report
+
+    def _publish(self, topic: str, payload: str, retain: bool):
+        self.mqtt_support.client.publish(topic, payload, retain=retain)
+
+    def _write(self, profiler, report_json: str):
+        name = "profile-" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(os.path.join(self.output_dir, name + ".json"), "w") as f:
+                f.write(report_json)
+            if isinstance(profiler, DeterministicProfiler):
+                profiler.profile.dump_stats(os.path.join(self.output_dir, name + ".prof"))
+        except OSError as e:
+            self.Logger.error(f"Failed to write profile to {self.output_dir}: {e}")
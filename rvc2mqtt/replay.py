@@ -0,0 +1,228 @@
+"""
+Replay a can bus log thru the full bridge pipeline
+
+Reads candump (.log), ASC, BLF (anything python-can's LogReader supports) or a
+bus capture (.rvcc file or capture directory) and feeds every frame thru the
+same decode, entity dispatch and mqtt publish code as the bridge.  Frames are
+paced by their log timestamps at 1x, Nx or as fast as possible (speed 0).
+
+By default publishes go to an in-process fake mqtt client so no broker is
+needed.  --broker starts an in-process broker on localhost instead so the real
+paho network path is exercised.  At the end a report of throughput and latency
+is printed.
+
+    rvc2mqtt replay capture.log -f floorplan.yaml --speed 0
+    python -m rvc2mqtt.replay capture.log -f floorplan.yaml --speed 10
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import can
+from rvc2mqtt.app import app, configure_logging, load_floorplans
+from rvc2mqtt.bus_capture import CaptureReader, SEGMENT_EXT
+from rvc2mqtt.fake_broker import FakeBroker
+from rvc2mqtt.mqtt import MqttInitalize
+from rvc2mqtt.mqtt_fake import make_fake_mqtt_support
+
+
+def open_log(path: os.PathLike):
+    """ iterable of can.Message from a log file or capture """
+    if os.path.isdir(path) or str(path).endswith(SEGMENT_EXT):
+        return CaptureReader(path).messages()
+    return can.LogReader(path)
+
+
+class Replay(object):
+    """ Drive an app pipeline (init_pipeline and load_entities already called) from a log """
+
+    def __init__(self, bridge: app, speed: float = 1.0, tx_sink=None):
+        """ tx_sink is called with every rvc dict the bridge would send on the bus """
+        self.Logger = logging.getLogger(__name__)
+        self.bridge = bridge
+        self.speed = speed
+        self.tx_sink = tx_sink
+        self.frames = 0
+        self.error_frames = 0
+        self.tx_frames = 0
+        self.max_behind = 0.0
+        self.elapsed = 0.0
+        self.log_duration = 0.0
+
+    def run(self, messages) -> dict:
+        """ replay all messages and return the report """
+        start = time.perf_counter()
+        try:
+            self._run(messages, start)
+        finally:
+            self.elapsed = time.perf_counter() - start
+        return self.report()
+
+    def _run(self, messages, start: float):
+        bridge = self.bridge
+        first_ts = None
+        log_ts = None
+        for msg in messages:
+            if msg.is_error_frame:
+                self.error_frames += 1
+                continue
+
+            log_ts = msg.timestamp
+            if first_ts is None:
+                first_ts = log_ts
+            if self.speed > 0:
+                due = start + (log_ts - first_ts) / self.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif -delay > self.max_behind:
+                    self.max_behind = -delay
+
+            # the log time is not our clock.  Latency is measured from now
+            msg.timestamp = time.time()
+            bridge.rxQueue.put(msg)
+            bridge.message_rx_loop()
+            self.frames += 1
+
+            # commands sent by entities go thru the tx path but not onto a bus
+            while not bridge.tx_RVC_Buffer.empty():
+                bridge.message_tx_loop()
+            while not bridge.txQueue.empty():
+                tx = bridge.txQueue.get()
+                self.tx_frames += 1
+                if self.tx_sink is not None:
+                    self.tx_sink(tx)
+
+            self.log_duration = log_ts - first_ts
+
+    def report(self) -> dict:
+        metrics = self.bridge.metrics
+        snapshot = metrics.snapshot()
+        histograms = snapshot["histograms"]
+        result = {"frames": self.frames,
+                  "error_frames": self.error_frames,
+                  "tx_frames": self.tx_frames,
+                  "elapsed_s": round(self.elapsed, 3),
+                  "log_duration_s": round(self.log_duration, 3),
+                  "speed": self.speed,
+                  "frames_per_sec": round(self.frames / self.elapsed, 1) if self.elapsed > 0 else 0,
+                  "max_behind_s": round(self.max_behind, 3),
+                  "decoded": metrics.get_count("frames_decoded"),
+                  "decode_failed": metrics.get_count("frames_decode_failed"),
+                  "dispatched": metrics.get_count("frames_dispatched"),
+                  "unhandled": metrics.get_count("frames_unhandled"),
+                  "mqtt_published": metrics.get_count("mqtt_published"),
+                  "latency": {name: histograms[name] for name in
+                              ("decode_latency", "dispatch_latency", "can_to_publish_latency")
+                              if name in histograms},
+                  "entity_cpu": self.bridge.entity_cpu.report()}
+        return result
+
+
+def format_report(report: dict) -> str:
+    lines = [f"Replayed {report['frames']} frames in {report['elapsed_s']} s "
+             f"({report['frames_per_sec']} frames/s, log covered {report['log_duration_s']} s at speed {report['speed']})",
+             f"decoded {report['decoded']}  failed {report['decode_failed']}  dispatched {report['dispatched']}  "
+             f"unhandled {report['unhandled']}  published {report['mqtt_published']}  tx {report['tx_frames']}"]
+    if report["speed"] > 0:
+        lines.append(f"max behind schedule {report['max_behind_s']} s")
+    for (name, h) in report["latency"].items():
+        lines.append(f"{name:24} avg {h['avg_ms']} ms  p50 {h['p50_ms']} ms  p90 {h['p90_ms']} ms  "
+                     f"p99 {h['p99_ms']} ms  max {h['max_ms']} ms")
+    return "\n".join(lines)
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog="rvc2mqtt replay",
+                                     description="Replay a can log thru the rvc2mqtt pipeline")
+    parser.add_argument("logfile", help="candump .log, .asc, .blf or other python-can log, or a bus capture")
+    parser.add_argument("-f", "--floorplan", dest="floorplan", help="floorplan file path")
+    parser.add_argument("-g", "--floorplan2", dest="floorplan2", help="filepath to more floorplan")
+    parser.add_argument("-p", "--plugin_path", dest="plugin_paths",
+                        action="append", help="path to directory to load plugins", default=[])
+    parser.add_argument("-s", "--speed", dest="speed", type=float, default=1.0,
+                        help="replay speed multiplier.  0 for as fast as possible")
+    parser.add_argument("--mqtt_host", dest="mqtt_host",
+                        help="publish to this broker instead of the in-process fake client")
+    parser.add_argument("--mqtt_port", dest="mqtt_port", type=int, default=1883)
+    parser.add_argument("--broker", dest="broker", action="store_true",
+                        help="publish over the network to an in-process broker on localhost")
+    parser.add_argument("--topic_alias_max", dest="topic_alias_max", type=int, default=0,
+                        help="topic alias maximum to use with --broker")
+    parser.add_argument("--mqtt_username", dest="mqtt_user")
+    parser.add_argument("--mqtt_password", dest="mqtt_pass")
+    parser.add_argument("--mqtt_topic_base", dest="mqtt_topic_base", default="rvc2mqtt")
+    parser.add_argument("--mqtt_client_id", dest="mqtt_client_id", default="replay")
+    parser.add_argument("--report", dest="report_file", help="also write the report as json to this file")
+    parser.add_argument("-v", "--verbose", dest="verbose", action="count", default=0,
+                        help="Increase verbosity of stdout logger. Add multiple times to increase")
+    args = parser.parse_args(argv)
+    configure_logging(args.verbose, None)
+
+    broker = None
+    if args.broker:
+        broker = FakeBroker(topic_alias_maximum=args.topic_alias_max, keep=0).start()
+        args.mqtt_host = "127.0.0.1"
+        args.mqtt_port = broker.port
+
+    bridge = app()
+    bridge.init_pipeline()
+    if args.mqtt_host is not None:
+        bridge.mqtt_client = MqttInitalize(args.mqtt_host, args.mqtt_port, args.mqtt_user, args.mqtt_pass,
+                                           args.mqtt_client_id, args.mqtt_topic_base,
+                                           topic_alias_max=args.topic_alias_max)
+        if bridge.mqtt_client is None:
+            return 1
+        bridge.mqtt_client.client.loop_start()
+    else:
+        bridge.mqtt_client = make_fake_mqtt_support(args.mqtt_client_id, args.mqtt_topic_base)
+    bridge.mqtt_client.set_metrics(bridge.metrics)
+    bridge.mqtt_client.set_latency_tracer(bridge.latency_tracer)
+    bridge.mqtt_client.set_cpu_accounting(bridge.entity_cpu)
+    bridge.load_entities(load_floorplans(args.floorplan, args.floorplan2), args.plugin_paths)
+
+    replay = Replay(bridge, args.speed)
+    try:
+        report = replay.run(open_log(args.logfile))
+    except KeyboardInterrupt:
+        report = replay.report()
+    finally:
+        if broker is not None:
+            # wait for everything the bridge sent to reach the broker
+            sent = bridge.metrics.get_count("mqtt_published")
+            broker.wait_for(lambda b: b.publish_count >= sent, timeout=30)
+        if args.mqtt_host is not None:
+            bridge.mqtt_client.shutdown()
+            bridge.mqtt_client.client.loop_stop()
+        if broker is not None:
+            broker.stop()
+
+    if broker is not None:
+        report["broker_received"] = broker.publish_count
+    print(format_report(report))
+    if args.report_file is not None:
+        with open(args.report_file, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
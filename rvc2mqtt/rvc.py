@@ -319,8 +319,111 @@ class RVC_Decoder(object):
 
         return new_value
 
-    def rvc_encode():
-        pass
+    def find_dgn(self, name: str) -> str:
+        """ dgn (hex string) of the spec entry with name.  None if not found """
+        if name in self.spec:
+            return name
+        if getattr(self, "_name_to_dgn", None) is None or len(self._name_to_dgn) == 0:
+            self._name_to_dgn = {v["name"]: k for (k, v) in self.spec.items()
+                                 if isinstance(v, dict) and "name" in v}
+        return self._name_to_dgn.get(name)
+
+    def rvc_encode(self, name_or_dgn: str, values: dict) -> str:
+        """encode parameter values into a hex data string (the same format rvc_decode takes)
+
+        @param name_or_dgn: spec name like TANK_STATUS or dgn like 1FFB7
+        @param values: parameter values keyed like rvc_decode results (instance, relative_level...)
+               in the same units rvc_decode returns.  Bit fields can be an int or a binary string.
+
+        @ret - 16 hex characters.  Parameters not in values are left as not available (all ones)
+        """
+        dgn = self.find_dgn(name_or_dgn)
+        if dgn is None:
+            raise Exception(f"Failed to find {name_or_dgn} in loaded specification")
+
+        decoder = self.spec[dgn]
+        params = []
+        if "alias" in decoder:
+            params.extend(self.spec[decoder["alias"]].get("parameters") or [])
+        params.extend(decoder.get("parameters") or [])
+
+        data = bytearray(b"\xff" * 8)
+        self._encode_params(params, values, data)
+
+        # alternate parameters named after the 1st byte value
+        if decoder.get("usefirstbyte") == 1:
+            self._encode_params(decoder.get("{0:02X}".format(data[0])) or [], values, data)
+
+        return data.hex().upper()
+
+    def _encode_params(self, params: list, values: dict, data: bytearray):
+        for param in params:
+            key = self._parameterize_string(param["name"])
+            if key not in values or values[key] is None:
+                continue
+            (start, end) = self._byte_range(param["byte"])
+            # the decoder only converts units of parameters with a type
+            raw = self._unconvert_unit(values[key], param.get("unit") if "type" in param else None, param.get("type"))
+            if raw is None:
+                continue
+
+            if "bit" in param:
+                (bit_start, bit_end) = self._bit_range(param["bit"])
+                mask = ((1 << (bit_end - bit_start + 1)) - 1) << bit_start
+                data[start] = (data[start] & ~mask) | ((raw << bit_start) & mask)
+            else:
+                width = end - start + 1
+                raw &= (1 << (8 * width)) - 1
+                data[start:end + 1] = raw.to_bytes(width, "little")
+
+    def _byte_range(self, byte_range: Union[int, str]) -> Tuple[int, int]:
+        if isinstance(byte_range, str) and "-" in byte_range:
+            (start, _, end) = byte_range.partition("-")
+            return (int(start), int(end))
+        return (int(byte_range), int(byte_range))
+
+    def _bit_range(self, bit_range: Union[int, str]) -> Tuple[int, int]:
+        return self._byte_range(bit_range)
+
+    def _unconvert_unit(self, value, unit: str, mytype: str):
+        """ reverse of _convert_unit.  Returns the raw integer or None if not available """
+        if isinstance(value, str):
+            if value.lower() == "n/a":
+                return None
+            mu = unit.lower() if unit else ""
+            if mu == "hex":
+                return int(value, 16)
+            # bit fields and bitmaps are decoded as binary strings
+            return int(value, 2)
+
+        mu = unit.lower() if unit else ""
+        if mu == "pct":
+            # 255 (not available) is passed thru by the decoder
+            return 255 if value == 255 else int(round(value * 2))
+        elif mu == "deg c":
+            if mytype == "uint8":
+                return int(round(value + 40))
+            elif mytype == "uint16":
+                return int(round((value + 273) / 0.03125))
+        elif mu == "v":
+            if mytype == "uint16":
+                return int(round(value / 0.05))
+            elif mytype == "uint32":
+                return int(round(value / 0.001))
+        elif mu == "a":
+            if mytype == "uint16":
+                return int(round((value + 1600) / 0.05))
+            elif mytype == "uint32":
+                return int(round((value + 2000000) / 0.001))
+        elif mu == "hz":
+            if mytype == "uint16":
+                return int(round(value * 128))
+        elif mu == "sec":
+            if mytype == "uint8" and value >= 300:
+                return int(value // 60) + 236
+            elif mytype == "uint16":
+                return int(value // 2)
+        return int(value)
 
     def _rvc_to_can_frame(self, values: dict) -> int:
         """convert rvc dgn, priority, source_id"""
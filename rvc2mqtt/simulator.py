@@ -0,0 +1,378 @@
+"""
+Synthetic RV-C traffic for load testing
+
+Emulates devices (tanks, dc sources, thermostats, Timberline, APS-500,
+inverter, solar controller) that broadcast their status messages on a period.
+Frames are built with the spec driven encoder (RVC_Decoder.rvc_encode) so they
+decode like real traffic.  Each time a message is sent its values change with
+a configurable probability.  Optional bursts (many frames back to back) and
+malformed frames (short, unknown DGN or random data) exercise the error paths.
+
+TrafficGenerator yields timestamped frames without a bus (to write a log for
+replay or to benchmark).  TrafficSimulator sends them onto a python-can bus in
+real time.  With the virtual interface the simulator and a CAN_Watcher in the
+same process share a channel.  Use a vcan interface (socketcan) to drive a
+separate bridge process.
+
+    python -m rvc2mqtt.simulator -i vcan0 --rate_scale 3 --duration 600
+    python -m rvc2mqtt.simulator --log synthetic.log --duration 3600
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import heapq
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import can
+import ruyaml as YAML
+from rvc2mqtt.rvc import RVC_Decoder
+
+PATH_TO_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+INSTANCE = "$instance"
+
+# per device type: default source address and the messages it broadcasts as
+# (message name, period seconds, values).  Values are in decoded units.  A
+# (low, high) tuple is a value that drifts inside that range.
+DEVICE_TYPES = {
+    "tank": {
+        "source_id": "48",
+        "messages": [
+            ("TANK_STATUS", 5.0, {"instance": INSTANCE, "relative_level": (0, 16), "resolution": 16}),
+        ]},
+    "dc_source": {
+        "source_id": "45",
+        "messages": [
+            ("DC_SOURCE_STATUS_1", 0.5, {"instance": INSTANCE, "device_priority": 120,
+                                         "dc_voltage": (11.8, 14.4), "dc_current": (-60.0, 40.0)}),
+            ("DC_SOURCE_STATUS_2", 5.0, {"instance": INSTANCE, "device_priority": 120,
+                                         "source_temperature": (5.0, 40.0), "state_of_charge": (20.0, 100.0),
+                                         "time_remaining": (0, 6000)}),
+            ("DC_SOURCE_STATUS_3", 5.0, {"instance": INSTANCE, "device_priority": 120,
+                                         "state_of_health": (80.0, 100.0), "capacity_remaining": (50, 400),
+                                         "relative_capacity": (20.0, 100.0)}),
+        ]},
+    "thermostat": {
+        "source_id": "9F",
+        "messages": [
+            ("THERMOSTAT_AMBIENT_STATUS", 1.0, {"instance": INSTANCE, "ambient_temp": (10.0, 32.0)}),
+            ("THERMOSTAT_STATUS_1", 5.0, {"instance": INSTANCE, "operating_mode": "0001", "fan_mode": 0,
+                                          "schedule_mode": 0, "fan_speed": (0.0, 100.0),
+                                          "setpoint_temp_heat": 20.0, "setpoint_temp_cool": 24.0}),
+        ]},
+    "timberline": {
+        "source_id": "66",
+        "messages": [
+            ("WATERHEATER_STATUS", 1.0, {"instance": INSTANCE, "operating_modes": 1,
+                                         "set_point_temperature": 49.0, "water_temperature": (15.0, 60.0),
+                                         "thermostat_status": (0, 1), "burner_status": (0, 1)}),
+            ("FURNACE_STATUS", 1.0, {"instance": INSTANCE, "operating_mode": 0, "heat_source": 0,
+                                     "circulation_fan_speed": (0.0, 100.0), "heat_output_level": (0.0, 100.0)}),
+            ("CIRCULATION_PUMP_STATUS", 2.0, {"instance": INSTANCE, "output_status": (0, 1)}),
+            ("THERMOSTAT_STATUS_1", 2.0, {"instance": INSTANCE, "operating_mode": "0010", "fan_mode": 0,
+                                          "schedule_mode": 0, "fan_speed": (0.0, 100.0),
+                                          "setpoint_temp_heat": (16.0, 22.0), "setpoint_temp_cool": 26.0}),
+            ("THERMOSTAT_STATUS_2", 5.0, {"instance": INSTANCE, "current_schedule_instance": (0, 1),
+                                          "number_of_schedule_instances": 2}),
+            ("WATERHEATER_STATUS_2", 5.0, {"instance": INSTANCE, "hot_water_priority": (0, 1)}),
+            ("DM_RV", 5.0, {"operating_status": "0101", "yellow_lamp_status": 0, "red_lamp_status": 0, "dsa": 0x66}),
+            # Timberline 1.5 proprietary DGN, one entry per message type
+            ("TIMBERLINE_PROPRIETARY", 1.0, {"message_type": "84", "solenoid": (0, 1), "used_temperature_sensor": 1,
+                                             "tank_temperature": (15, 70), "heater_temperature": (15, 80),
+                                             "fan_manual_percents": (0, 100)}),
+            ("TIMBERLINE_PROPRIETARY", 5.0, {"message_type": "85", "system_timer": (0, 7200),
+                                             "domestic_water_timer": (0, 3600), "pump_override_timer": (0, 600)}),
+            ("TIMBERLINE_PROPRIETARY", 30.0, {"message_type": "86", "heater_minutes": (100000, 100100),
+                                              "heater_version_1st_byte": 1, "heater_version_2nd_byte": 5,
+                                              "heater_version_3rd_byte": 0, "heater_version_4th_byte": 2}),
+            ("TIMBERLINE_PROPRIETARY", 30.0, {"message_type": "87", "minutes_since_start": (0, 600),
+                                              "panel_version_1st_byte": 1, "panel_version_2nd_byte": 5,
+                                              "panel_version_3rd_byte": 0, "panel_version_4th_byte": 3}),
+            ("TIMBERLINE_PROPRIETARY", 30.0, {"message_type": "88", "hcu_version_1st_byte": 1, "hcu_version_2nd_byte": 5,
+                                              "hcu_version_3rd_byte": 0, "hcu_version_4th_byte": 1}),
+            ("TIMBERLINE_PROPRIETARY", 30.0, {"message_type": "8A", "system_limitation": 7200, "water_limitation": 60}),
+        ]},
+    "aps500": {
+        "source_id": "42",
+        "messages": [
+            ("DC_SOURCE_STATUS_1", 0.5, {"instance": INSTANCE, "device_priority": 100,
+                                         "dc_voltage": (12.0, 14.6), "dc_current": (-80.0, 80.0)}),
+            ("DC_SOURCE_STATUS_2", 2.0, {"instance": INSTANCE, "device_priority": 100,
+                                         "source_temperature": (5.0, 45.0), "state_of_charge": (10.0, 100.0),
+                                         "time_remaining": (0, 6000)}),
+            ("DC_SOURCE_STATUS_3", 5.0, {"instance": INSTANCE, "device_priority": 100,
+                                         "state_of_health": (80.0, 100.0), "capacity_remaining": (50, 600),
+                                         "relative_capacity": (10.0, 100.0)}),
+            ("CHARGER_STATUS", 1.0, {"instance": INSTANCE, "charge_voltage": (13.0, 14.6),
+                                     "charge_current": (0.0, 100.0), "charge_current_percent_of_maximum": (0.0, 100.0),
+                                     "operating_state": (2, 6)}),
+            ("DM_RV", 5.0, {"operating_status": "0101", "yellow_lamp_status": 0, "red_lamp_status": 0, "dsa": 0x42}),
+        ]},
+    "inverter": {
+        "source_id": "43",
+        "messages": [
+            ("INVERTER_STATUS", 1.0, {"instance": INSTANCE, "status": (1, 2)}),
+            ("INVERTER_AC_STATUS_1", 0.5, {"instance": INSTANCE, "line": 0, "input_output": 1,
+                                           "rms_voltage": (115.0, 125.0), "rms_current": (0.0, 30.0),
+                                           "frequency": (59.5, 60.5)}),
+            ("INVERTER_DC_STATUS", 1.0, {"instance": INSTANCE, "dc_voltage": (11.8, 14.4),
+                                         "dc_amperage": (-150.0, 20.0)}),
+        ]},
+    "solar_controller": {
+        "source_id": "A0",
+        "messages": [
+            ("SOLAR_CONTROLLER_STATUS", 1.0, {"instance": INSTANCE, "charge_voltage": (13.0, 14.6),
+                                              "charge_current": (0.0, 30.0),
+                                              "charge_current_percent_of_maximum": (0, 100),
+                                              "operating_state": (2, 6)}),
+            ("SOLAR_CONTROLLER_BATTERY_STATUS", 2.0, {"instance": INSTANCE, "measured_voltage": (12.0, 14.6),
+                                                      "measured_current": (0.0, 30.0),
+                                                      "measured_temperature": (5, 40)}),
+            ("SOLAR_CONTROLLER_SOLAR_ARRAY_STATUS", 1.0, {"instance": INSTANCE,
+                                                          "solar_array_measured_voltage": (0.0, 40.0),
+                                                          "solar_array_measured_current": (0.0, 20.0)}),
+        ]},
+}
+
+# a coach with a bit of everything
+DEFAULT_DEVICES = [
+    {"type": "tank", "instance": 0},
+    {"type": "tank", "instance": 1},
+    {"type": "tank", "instance": 2},
+    {"type": "tank", "instance": 3},
+    {"type": "dc_source", "instance": 1},
+    {"type": "dc_source", "instance": 2, "source_id": "46"},
+    {"type": "thermostat", "instance": 0},
+    {"type": "thermostat", "instance": 1},
+    {"type": "timberline", "instance": 1},
+    {"type": "aps500", "instance": 1},
+    {"type": "inverter", "instance": 1},
+    {"type": "solar_controller", "instance": 1},
+]
+
+
+class SimulatedMessage(object):
+    """ One periodic message of a simulated device """
+
+    def __init__(self, decoder: RVC_Decoder, name: str, period: float, values: dict, instance: int,
+                 source_id: str, priority: int = 6):
+        self.name = name
+        self.period = period
+        self.dgn = decoder.find_dgn(name)
+        if self.dgn is None:
+            raise ValueError(f"Unknown message {name}")
+        self.arbitration_id = decoder._rvc_to_can_frame(
+            {"dgn": self.dgn, "priority": str(priority), "source_id": source_id})
+        self.ranges = {}
+        self.values = {}
+        for (key, value) in values.items():
+            if value == INSTANCE:
+                value = instance
+            if isinstance(value, (tuple, list)):
+                self.ranges[key] = (value[0], value[1])
+            else:
+                self.values[key] = value
+        self._data = None
+
+    def update(self, decoder: RVC_Decoder, rng: random.Random, change_probability: float) -> bytes:
+        """ data for the next send.  Values drift with change_probability """
+        if self._data is None or (self.ranges and rng.random() < change_probability):
+            for (key, (low, high)) in self.ranges.items():
+                current = self.values.get(key)
+                whole = isinstance(low, int) and isinstance(high, int)
+                if current is None:
+                    value = rng.randint(low, high) if whole else rng.uniform(low, high)
+                elif whole:
+                    value = current + rng.choice((-1, 1))
+                else:
+                    value = current + rng.uniform(-0.05, 0.05) * (high - low)
+                value = min(max(value, low), high)
+                self.values[key] = value if whole else round(value, 2)
+            self._data = bytes.fromhex(decoder.rvc_encode(self.dgn, self.values))
+        return self._data
+
+
+class TrafficGenerator(object):
+    """ Timestamped frames for a set of simulated devices """
+
+    def __init__(self, decoder: RVC_Decoder, devices: list = None, rate_scale: float = 1.0,
+                 change_probability: float = 0.2, burst_interval: float = 0, burst_size: int = 0,
+                 malformed_probability: float = 0.0, seed: int = None):
+        self.Logger = logging.getLogger(__name__)
+        self.decoder = decoder
+        self.rate_scale = rate_scale
+        self.change_probability = change_probability
+        self.burst_interval = burst_interval
+        self.burst_size = burst_size
+        self.malformed_probability = malformed_probability
+        self.rng = random.Random(seed)
+        self.messages = []
+        for device in (devices if devices is not None else DEFAULT_DEVICES):
+            self.add_device(device)
+        self.frame_count = 0
+        self.malformed_count = 0
+
+    def add_device(self, device: dict):
+        """ device is a dict with type, instance and optional source_id and rate_scale """
+        template = DEVICE_TYPES.get(device["type"])
+        if template is None:
+            raise ValueError(f"Unknown device type {device['type']}")
+        source_id = str(device.get("source_id", template["source_id"]))
+        scale = float(device.get("rate_scale", 1.0))
+        for (name, period, values) in template["messages"]:
+            self.messages.append(SimulatedMessage(self.decoder, name, period / scale, values,
+                                                  device.get("instance", 0), source_id))
+
+    def frames_per_second(self) -> float:
+        """ expected average frame rate not counting bursts """
+        return sum(1.0 / m.period for m in self.messages) * self.rate_scale
+
+    def frames(self, duration: float = None, start_time: float = 0.0):
+        """ yield can.Message in timestamp order from start_time for duration seconds (forever if None) """
+        schedule = []
+        for (index, m) in enumerate(self.messages):
+            # spread the first sends over one period so devices don't all send at once
+            heapq.heappush(schedule, (start_time + self.rng.uniform(0, m.period / self.rate_scale), index))
+        next_burst = start_time + self.burst_interval if self.burst_interval > 0 and self.burst_size > 0 else None
+        end = start_time + duration if duration is not None else None
+
+        while schedule:
+            (due, index) = schedule[0]
+            if next_burst is not None and next_burst <= due:
+                if end is not None and next_burst >= end:
+                    return
+                for n in range(self.burst_size):
+                    m = self.messages[self.rng.randrange(len(self.messages))]
+                    yield self._frame(m, next_burst + n * 0.0005)
+                next_burst += self.burst_interval
+                continue
+            if end is not None and due >= end:
+                return
+            m = self.messages[index]
+            heapq.heapreplace(schedule, (due + m.period / self.rate_scale, index))
+            yield self._frame(m, due)
+
+    def _frame(self, m: SimulatedMessage, timestamp: float) -> can.Message:
+        self.frame_count += 1
+        arbitration_id = m.arbitration_id
+        data = m.update(self.decoder, self.rng, self.change_probability)
+        if self.malformed_probability > 0 and self.rng.random() < self.malformed_probability:
+            self.malformed_count += 1
+            kind = self.rng.randrange(3)
+            if kind == 0:
+                data = data[:self.rng.randrange(0, 8)]                              # short frame
+            elif kind == 1:
+                arbitration_id = (arbitration_id & ~(0x1FFFF << 8)) | (0x1FF00 << 8)   # DGN not in spec
+            else:
+                data = bytes(self.rng.randrange(256) for _ in range(8))             # random payload
+        return can.Message(timestamp=timestamp, arbitration_id=arbitration_id, is_extended_id=True, data=data)
+
+
+class TrafficSimulator(threading.Thread):
+    """ Send a generator's frames onto a python-can bus in real time """
+
+    def __init__(self, generator: TrafficGenerator, bus: can.BusABC, duration: float = None):
+        threading.Thread.__init__(self, name="traffic_simulator", daemon=True)
+        self.Logger = logging.getLogger(__name__)
+        self.generator = generator
+        self.bus = bus
+        self.duration = duration
+        self.sent = 0
+        self.send_errors = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        for message in self.generator.frames(self.duration, time.time()):
+            delay = message.timestamp - time.time()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+            if self._stop_event.is_set():
+                break
+            try:
+                self.bus.send(message)
+                self.sent += 1
+            except can.CanError as e:
+                self.send_errors += 1
+                self.Logger.debug(f"Send failed: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def load_devices(config_file: os.PathLike) -> list:
+    """ device list from the devices entry of a yaml file """
+    with open(config_file, "r") as f:
+        content = YAML.YAML(typ="safe").load(f.read())
+    return content["devices"]
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog="rvc2mqtt simulate", description="Generate synthetic RV-C traffic")
+    parser.add_argument("-i", "--interface", dest="interface", default="vcan0", help="can channel to send on")
+    parser.add_argument("-b", "--bustype", dest="bustype", default="socketcan", help="python-can interface type")
+    parser.add_argument("-c", "--config", dest="config", help="yaml file with a devices list.  Default is a typical coach")
+    parser.add_argument("-d", "--duration", dest="duration", type=float, help="seconds to run.  Default forever")
+    parser.add_argument("--rate_scale", dest="rate_scale", type=float, default=1.0,
+                        help="multiplier of every device's message rate")
+    parser.add_argument("--change_probability", dest="change_probability", type=float, default=0.2,
+                        help="probability a message's values change each time it is sent")
+    parser.add_argument("--burst_interval", dest="burst_interval", type=float, default=0,
+                        help="seconds between bursts.  0 for no bursts")
+    parser.add_argument("--burst_size", dest="burst_size", type=int, default=100, help="frames in a burst")
+    parser.add_argument("--malformed", dest="malformed", type=float, default=0.0,
+                        help="probability a frame is malformed")
+    parser.add_argument("--seed", dest="seed", type=int, help="random seed for repeatable traffic")
+    parser.add_argument("--log", dest="log", help="write frames to this log file (.log, .asc, .blf) instead of a bus")
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="%(levelname)s %(asctime)s - %(message)s", level=logging.INFO)
+
+    decoder = RVC_Decoder()
+    decoder.load_rvc_spec(os.path.join(PATH_TO_FOLDER, "rvc-spec.yml"))
+    devices = load_devices(args.config) if args.config is not None else None
+    generator = TrafficGenerator(decoder, devices, args.rate_scale, args.change_probability,
+                                 args.burst_interval, args.burst_size, args.malformed, args.seed)
+    logging.info(f"Simulating {len(generator.messages)} messages at {generator.frames_per_second():.1f} frames/s")
+
+    if args.log is not None:
+        if args.duration is None:
+            parser.error("--duration is required with --log")
+        with can.Logger(args.log) as writer:
+            for message in generator.frames(args.duration, time.time()):
+                writer.on_message_received(message)
+        logging.info(f"Wrote {generator.frame_count} frames to {args.log}")
+        return 0
+
+    with can.Bus(channel=args.interface, interface=args.bustype) as bus:
+        simulator = TrafficSimulator(generator, bus, args.duration)
+        simulator.start()
+        try:
+            while simulator.is_alive():
+                simulator.join(1)
+        except KeyboardInterrupt:
+            simulator.stop()
+            simulator.join()
+        logging.info(f"Sent {simulator.sent} frames ({generator.malformed_count} malformed, "
+                     f"{simulator.send_errors} send errors)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
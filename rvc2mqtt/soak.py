@@ -0,0 +1,410 @@
+"""
+Long run soak test with memory growth detection
+
+Drives simulated coach traffic (and optionally looped can logs) thru the full
+bridge pipeline as fast as possible, so hours of coach time run in minutes.
+Every `sample_interval` seconds of simulated time the process RSS, a
+tracemalloc snapshot (grouped by allocation site) and a set of suspect gauges
+are recorded:
+
+  - rx_queue, tx_queue and tx_rvc_buffer depth (unbounded queue.Queue)
+  - mqtt_out_messages / mqtt_out_packet: paho's outbound buffers.  qos 1 and 2
+    publishes are kept there without limit while not connected
+  - <entity>._terminalmessage length for APS-500 entities.  Unsolicited
+    terminal output is only cleared by an AOK/NAK/RST or a tail request
+
+After the warmup samples, anything that grew in (nearly) every sample and by
+more than a threshold is flagged with its growth per simulated hour.
+
+    rvc2mqtt soak --hours 6 --sample_interval 600
+    python -m rvc2mqtt.soak --hours 24 --mqtt offline --log coach.log --report soak.json
+
+`--mqtt offline` publishes thru a real paho client that never connects, like a
+bridge whose broker is down.  Exit code is 1 when growth was flagged.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+import can
+import paho.mqtt.client as mqc
+from rvc2mqtt.app import app, configure_logging, load_floorplans
+from rvc2mqtt.mqtt import MQTT_Support, MQTT_Client
+from rvc2mqtt.mqtt_fake import make_fake_mqtt_support
+from rvc2mqtt.replay import Replay, open_log
+from rvc2mqtt.simulator import TrafficGenerator, DEVICE_TYPES, load_devices
+
+# entities for the simulator's default coach (simulator.DEFAULT_DEVICES)
+DEFAULT_FLOORPLAN = [
+    {"name": "TANK_STATUS", "type": "tank_level", "instance": 0, "instance_name": "fresh water"},
+    {"name": "TANK_STATUS", "type": "tank_level", "instance": 1, "instance_name": "black waste"},
+    {"name": "TANK_STATUS", "type": "tank_level", "instance": 2, "instance_name": "grey waste"},
+    {"name": "TANK_STATUS", "type": "tank_level", "instance": 3, "instance_name": "lpg"},
+    {"name": "APS-500", "type": "dc_system", "instance": 1, "instance_name": "house battery charger",
+     "source_id": DEVICE_TYPES["aps500"]["source_id"], "command_topic": "aps500/set", "status_topic": "aps500"},
+    {"name": "DC_SOURCE_STATUS_1", "type": "dc_system", "instance": 1, "instance_name": "house battery"},
+    {"name": "DC_SOURCE_STATUS_1", "type": "dc_system", "instance": 2, "instance_name": "chassis battery"},
+    {"name": "THERMOSTAT_AMBIENT_STATUS", "type": "temperature", "instance": 0, "instance_name": "front temperature"},
+    {"name": "THERMOSTAT_AMBIENT_STATUS", "type": "temperature", "instance": 1, "instance_name": "rear temperature"},
+    {"name": "THERMOSTAT_STATUS_1", "type": "hvac", "instance": 0, "instance_name": "front thermostat"},
+    {"name": "TIMBERLINE_CONTROLLER", "type": "hvac", "instance": 1, "instance_name": "timberline",
+     "source_id": DEVICE_TYPES["timberline"]["source_id"], "command_topic": "timberline/set",
+     "status_topic": "timberline"},
+    {"name": "INVERTER_STATUS", "type": "inverter", "instance": 1, "instance_name": "inverter",
+     "command_topic": "inverter/set", "status_topic": "inverter"},
+    {"name": "SOLAR_CONTROLLER_STATUS", "type": "solar", "instance": 1, "instance_name": "solar"},
+]
+
+# unsolicited APS-500 terminal output, one line per period
+TERMINAL_DGN_H = 0x17E
+TERMINAL_TEXT = "V=13.52 A=12.4 T=25 SOC=87\r\n"
+
+# our own bookkeeping is not what we are looking for
+TRACE_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__),
+                 tracemalloc.Filter(False, __file__),
+                 tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                 tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                 tracemalloc.Filter(False, "<unknown>")]
+
+
+def rss_bytes() -> int:
+    """ resident set size of this process or None if it can't be read """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # peak, not current, but still shows growth
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def find_growth(times: list, series: list, min_growth: float, monotonic_fraction: float = 0.9) -> dict:
+    """ growth of a sampled value or None.  Grows when the value went up or stayed
+    the same in at least monotonic_fraction of the steps and ended more than
+    min_growth above where it started """
+    if len(series) < 3:
+        return None
+    steps = [b - a for (a, b) in zip(series, series[1:])]
+    not_down = sum(1 for s in steps if s >= 0)
+    growth = series[-1] - series[0]
+    if growth <= min_growth or not_down < monotonic_fraction * len(steps):
+        return None
+    span = times[-1] - times[0]
+    return {"first": series[0],
+            "last": series[-1],
+            "growth": growth,
+            "per_hour": round(growth * 3600.0 / span, 1) if span > 0 else None,
+            "increasing_steps": sum(1 for s in steps if s > 0),
+            "steps": len(steps)}
+
+
+class MemorySampler(object):
+    """ RSS, tracemalloc allocation sites and suspect gauges sampled over time """
+
+    def __init__(self, gauges: dict = None, trace_frames: int = 1):
+        self.Logger = logging.getLogger(__name__)
+        self.gauges = gauges if gauges is not None else {}
+        self.trace_frames = trace_frames
+        self.samples = []
+        self.sites = {}     # allocation site -> bytes per sample (0 when not present)
+        self._started_tracemalloc = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+            self._started_tracemalloc = True
+
+    def stop(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def sample(self, sim_time: float):
+        index = len(self.samples)
+        snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+        traced = 0
+        for stat in snapshot.statistics("lineno"):
+            frame = stat.traceback[0]
+            site = f"{frame.filename}:{frame.lineno}"
+            sizes = self.sites.get(site)
+            if sizes is None:
+                sizes = self.sites[site] = [0] * index
+            sizes.append(stat.size)
+            traced += stat.size
+        for sizes in self.sites.values():
+            if len(sizes) == index:
+                sizes.append(0)
+
+        gauges = {}
+        for (name, func) in self.gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                self.Logger.debug(f"Gauge {name} failed: {e}")
+                gauges[name] = None
+        self.samples.append({"sim_time_s": round(sim_time, 1),
+                             "rss_bytes": rss_bytes(),
+                             "traced_bytes": traced,
+                             "gauges": gauges})
+
+    def growth(self, warmup: int = 2, min_site_bytes: int = 16 * 1024, min_rss_bytes: int = 4 * 1024 * 1024,
+               min_gauge: float = 100) -> dict:
+        """ what grew after the first `warmup` samples """
+        samples = self.samples[warmup:]
+        times = [s["sim_time_s"] for s in samples]
+        result = {"rss": None, "sites": [], "gauges": []}
+
+        rss = [s["rss_bytes"] for s in samples]
+        if None not in rss:
+            result["rss"] = find_growth(times, rss, min_rss_bytes)
+
+        for (site, sizes) in self.sites.items():
+            g = find_growth(times, sizes[warmup:], min_site_bytes)
+            if g is not None:
+                g["site"] = site
+                result["sites"].append(g)
+        result["sites"].sort(key=lambda g: g["growth"], reverse=True)
+
+        for name in self.gauges:
+            values = [s["gauges"].get(name) for s in samples]
+            if None in values:
+                continue
+            g = find_growth(times, values, min_gauge)
+            if g is not None:
+                g["gauge"] = name
+                result["gauges"].append(g)
+        return result
+
+
+def terminal_frames(source_id: str, period: float, duration: float, start_time: float = 0.0):
+    """ can.Message for APS-500 terminal output (8 ascii bytes per frame) every period seconds """
+    arbitration_id = (6 << 26) | (TERMINAL_DGN_H << 16) | (0xFF << 8) | int(source_id, 16)
+    text = TERMINAL_TEXT.encode("ascii")
+    chunks = [text[i:i + 8].ljust(8, b" ") for i in range(0, len(text), 8)]
+    t = start_time + period
+    while t < start_time + duration:
+        for (n, chunk) in enumerate(chunks):
+            yield can.Message(timestamp=t + n * 0.001, arbitration_id=arbitration_id, is_extended_id=True,
+                              data=chunk)
+        t += period
+
+
+def looped_log(path: os.PathLike, duration: float, start_time: float = 0.0, gap: float = 1.0):
+    """ frames of a can log repeated back to back (gap seconds apart) for duration seconds.
+    Timestamps are moved to start at start_time """
+    end = start_time + duration
+    loop_start = start_time
+    while True:
+        first = None
+        last = None
+        for msg in open_log(path):
+            if first is None:
+                first = msg.timestamp
+            msg.timestamp = loop_start + (msg.timestamp - first)
+            if msg.timestamp >= end:
+                return
+            last = msg.timestamp
+            yield msg
+        if first is None:
+            return      # empty log
+        loop_start = last + gap
+
+
+def _offline_mqtt_support(client_id: str, topic_base: str) -> MQTT_Support:
+    """ MQTT_Support with a real paho client that is never connected """
+    support = MQTT_Support(client_id, topic_base)
+    support.set_client(MQTT_Client(support, mqc.CallbackAPIVersion.VERSION2, client_id=client_id,
+                                   protocol=mqc.MQTTv5))
+    return support
+
+
+def suspect_gauges(bridge: app) -> dict:
+    """ gauges for the known leak suspects of a bridge """
+    client = bridge.mqtt_client.client
+    gauges = {"rx_queue": bridge.rxQueue.qsize,
+              "tx_queue": bridge.txQueue.qsize,
+              "tx_rvc_buffer": bridge.tx_RVC_Buffer.qsize,
+              "mqtt_out_messages": lambda: len(client._out_messages),
+              "mqtt_out_packet": lambda: len(client._out_packet)}
+    for entity in bridge.entity_list:
+        if hasattr(entity, "_terminalmessage"):
+            gauges[f"{entity.id}._terminalmessage"] = (lambda e=entity: len(e._terminalmessage))
+    return gauges
+
+
+class Soak(object):
+    """ Run traffic thru a bridge (init_pipeline and load_entities already called)
+    and sample memory every sample_interval seconds of traffic time """
+
+    def __init__(self, bridge: app, sample_interval: float = 600.0, sampler: MemorySampler = None):
+        self.Logger = logging.getLogger(__name__)
+        self.bridge = bridge
+        self.sample_interval = sample_interval
+        self.sampler = sampler if sampler is not None else MemorySampler(suspect_gauges(bridge))
+        self.replay = Replay(bridge, speed=0)
+        self.started = None
+
+    def _sampled(self, messages, start_time: float):
+        next_sample = start_time
+        ts = start_time
+        for msg in messages:
+            ts = msg.timestamp
+            while ts >= next_sample:
+                self.sampler.sample(next_sample - start_time)
+                self.Logger.info(f"Sampled at {(next_sample - start_time) / 3600.0:.2f} h "
+                                 f"rss {self.sampler.samples[-1]['rss_bytes']}")
+                next_sample += self.sample_interval
+            yield msg
+        self.sampler.sample(ts - start_time)
+
+    def run(self, messages, start_time: float = 0.0) -> dict:
+        """ messages must be in timestamp order starting at start_time """
+        self.sampler.start()
+        try:
+            self.replay.run(self._sampled(messages, start_time))
+        finally:
+            self.sampler.stop()
+        return self.report()
+
+    def report(self, **growth_args) -> dict:
+        return {"replay": self.replay.report(),
+                "samples": self.sampler.samples,
+                "growth": self.sampler.growth(**growth_args)}
+
+
+def traffic(generator: TrafficGenerator, duration: float, logs: list = None, terminal_source: str = None,
+            terminal_period: float = 0) -> iter:
+    """ simulator frames merged with looped logs and terminal output, in timestamp order """
+    sources = [generator.frames(duration)]
+    for path in logs or []:
+        sources.append(looped_log(path, duration))
+    if terminal_source is not None and terminal_period > 0:
+        sources.append(terminal_frames(terminal_source, terminal_period, duration))
+    if len(sources) == 1:
+        return sources[0]
+    return heapq.merge(*sources, key=lambda m: m.timestamp)
+
+
+def has_growth(growth: dict) -> bool:
+    return growth["rss"] is not None or len(growth["sites"]) > 0 or len(growth["gauges"]) > 0
+
+
+def format_report(report: dict, top: int = 10) -> str:
+    samples = report["samples"]
+    replay = report["replay"]
+    growth = report["growth"]
+    hours = samples[-1]["sim_time_s"] / 3600.0 if samples else 0
+    lines = [f"Soaked {replay['frames']} frames ({hours:.2f} h of traffic) in {replay['elapsed_s']} s, "
+             f"{len(samples)} samples"]
+    if samples and samples[0]["rss_bytes"] is not None:
+        lines.append(f"rss {samples[0]['rss_bytes'] / 1048576:.1f} MiB -> {samples[-1]['rss_bytes'] / 1048576:.1f} MiB  "
+                     f"traced {samples[0]['traced_bytes'] / 1048576:.1f} MiB -> "
+                     f"{samples[-1]['traced_bytes'] / 1048576:.1f} MiB")
+    if not has_growth(growth):
+        lines.append("no growth found")
+        return "\n".join(lines)
+    if growth["rss"] is not None:
+        lines.append(f"GROWTH rss +{growth['rss']['growth']} bytes ({growth['rss']['per_hour']} per hour)")
+    for g in growth["gauges"]:
+        lines.append(f"GROWTH {g['gauge']} {g['first']} -> {g['last']} ({g['per_hour']} per hour)")
+    for g in growth["sites"][:top]:
+        lines.append(f"GROWTH {g['site']} +{g['growth']} bytes ({g['per_hour']} per hour)")
+    return "\n".join(lines)
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog="rvc2mqtt soak",
+                                     description="Long run soak of the rvc2mqtt pipeline with memory growth detection")
+    parser.add_argument("--hours", dest="hours", type=float, default=6.0, help="hours of simulated traffic")
+    parser.add_argument("--sample_interval", dest="sample_interval", type=float, default=600.0,
+                        help="seconds of simulated traffic between memory samples")
+    parser.add_argument("--warmup", dest="warmup", type=int, default=2,
+                        help="samples ignored while caches fill")
+    parser.add_argument("-f", "--floorplan", dest="floorplan",
+                        help="floorplan file path.  Default matches the simulator's default coach")
+    parser.add_argument("-g", "--floorplan2", dest="floorplan2", help="filepath to more floorplan")
+    parser.add_argument("-p", "--plugin_path", dest="plugin_paths",
+                        action="append", help="path to directory to load plugins", default=[])
+    parser.add_argument("-c", "--config", dest="config", help="simulator yaml file with a devices list")
+    parser.add_argument("--rate_scale", dest="rate_scale", type=float, default=1.0,
+                        help="multiplier of every simulated device's message rate")
+    parser.add_argument("--malformed", dest="malformed", type=float, default=0.0,
+                        help="probability a simulated frame is malformed")
+    parser.add_argument("--log", dest="logs", action="append", default=[],
+                        help="can log to loop for the whole run in addition to the simulator.  Can be given more than once")
+    parser.add_argument("--terminal_period", dest="terminal_period", type=float, default=60.0,
+                        help="seconds between unsolicited APS-500 terminal lines.  0 for none")
+    parser.add_argument("--mqtt", dest="mqtt", choices=["fake", "offline"], default="fake",
+                        help="fake: in-process client.  offline: paho client that never connects")
+    parser.add_argument("--seed", dest="seed", type=int, default=1)
+    parser.add_argument("--report", dest="report_file", help="also write the report as json to this file")
+    parser.add_argument("-v", "--verbose", dest="verbose", action="count", default=0,
+                        help="Increase verbosity of stdout logger. Add multiple times to increase")
+    args = parser.parse_args(argv)
+    configure_logging(args.verbose, None)
+
+    bridge = app()
+    bridge.init_pipeline()
+    if args.mqtt == "offline":
+        bridge.mqtt_client = _offline_mqtt_support("soak", "rvc2mqtt")
+    else:
+        # only keep a few publishes.  An unbounded record would be the biggest leak
+        bridge.mqtt_client = make_fake_mqtt_support("soak", "rvc2mqtt", keep=100)
+    bridge.mqtt_client.set_metrics(bridge.metrics)
+    bridge.mqtt_client.set_latency_tracer(bridge.latency_tracer)
+    bridge.mqtt_client.set_cpu_accounting(bridge.entity_cpu)
+    if args.floorplan is not None:
+        floorplan = load_floorplans(args.floorplan, args.floorplan2)
+    else:
+        floorplan = [dict(e) for e in DEFAULT_FLOORPLAN]
+    bridge.load_entities(floorplan, args.plugin_paths)
+
+    devices = load_devices(args.config) if args.config is not None else None
+    generator = TrafficGenerator(bridge.rvc_decoder, devices, args.rate_scale, malformed_probability=args.malformed,
+                                 seed=args.seed)
+    duration = args.hours * 3600.0
+    soak = Soak(bridge, args.sample_interval)
+    start = time.perf_counter()
+    try:
+        soak.run(traffic(generator, duration, args.logs, DEVICE_TYPES["aps500"]["source_id"], args.terminal_period))
+    except KeyboardInterrupt:
+        pass
+    report = soak.report(warmup=args.warmup)
+    report["settings"] = {"hours": args.hours, "sample_interval": args.sample_interval, "mqtt": args.mqtt,
+                          "logs": args.logs, "rate_scale": args.rate_scale, "seed": args.seed,
+                          "wall_time_s": round(time.perf_counter() - start, 1)}
+
+    print(format_report(report))
+    if args.report_file is not None:
+        with open(args.report_file, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 1 if has_growth(report["growth"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Startup phase timing
+
+Restart time is downtime for the coach, so the bridge times each phase of
+startup (spec load, plugin registration, entity creation, mqtt connect, ...),
+logs the breakdown once startup is done and keeps it in the metrics under
+`startup`.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import contextlib
+import os
+import time
+
+
+def seconds_since_process_start() -> float:
+    """ seconds since this process started (includes interpreter start and imports)
+    or None if it can't be read (not linux) """
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # the command name can contain spaces.  Fields after it are space separated
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        start_ticks = int(fields[19])
+        return round(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 3)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer(object):
+    """ seconds spent in named startup phases.  A phase entered more than once
+    (like initializing each entity) accumulates """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}        # name -> seconds, in the order phases first ran
+        self.total = None
+        self.process_age = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - t0)
+
+    def finish(self):
+        """ startup is done """
+        self.total = time.perf_counter() - self.start
+        self.process_age = seconds_since_process_start()
+
+    def report(self) -> dict:
+        total = self.total if self.total is not None else time.perf_counter() - self.start
+        phases = {name: round(s, 4) for (name, s) in self.phases.items()}
+        phases["other"] = round(max(0.0, total - sum(self.phases.values())), 4)
+        return {"total_s": round(total, 4),
+                "process_age_s": self.process_age,
+                "phases": phases}
+
+    def format(self) -> str:
+        r = self.report()
+        text = f"{r['total_s']:.3f} s (" + ", ".join(f"{n} {s:.3f}" for (n, s) in r["phases"].items()) + ")"
+        if r["process_age_s"] is not None:
+            text += f", {r['process_age_s']:.3f} s since process start"
+        return text
@@ -0,0 +1,78 @@
+"""
+Low overhead tracing for the per frame hot path
+
+`logging.getLogger("rvc_bus_trace").debug(str(msg))` builds the string for
+every frame even when nothing will ever be emitted.  A Tracer resolves once
+whether its logger is enabled for DEBUG and keeps that in the `enabled`
+attribute, so the hot path is a single attribute check:
+
+    if bus_trace.enabled:
+        bus_trace.trace("%s", msg_dict)
+
+Formatting is left to logging (lazy %-style args) and can be sampled so only
+every Nth event is emitted.  When the logging config changes call
+refresh_tracers() (configure_logging does) to re-resolve every tracer.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import threading
+import weakref
+
+_tracers = weakref.WeakSet()
+_tracers_lock = threading.Lock()
+
+
+class Tracer(object):
+    """ Cached enabled check, sampling and lazy formatting for a debug logger """
+
+    def __init__(self, name: str, sample_every: int = 1):
+        self.logger = logging.getLogger(name)
+        self.sample_every = max(1, int(sample_every))
+        self.enabled = False
+        self._count = 0
+        self.refresh()
+        with _tracers_lock:
+            _tracers.add(self)
+
+    def refresh(self):
+        """ re-resolve the enabled state from the current logging config """
+        self.enabled = self.logger.isEnabledFor(logging.DEBUG)
+
+    def set_sample_every(self, sample_every: int):
+        self.sample_every = max(1, int(sample_every))
+        self._count = 0
+
+    def trace(self, msg: str, *args):
+        """ emit a debug record if enabled and selected by the sample rate.
+        args are only formatted if a handler actually emits the record """
+        if not self.enabled:
+            return
+        if self.sample_every > 1:
+            self._count += 1
+            if self._count < self.sample_every:
+                return
+            self._count = 0
+        self.logger.debug(msg, *args)
+
+
+def refresh_tracers():
+    """ call after the logging configuration changes """
+    with _tracers_lock:
+        tracers = list(_tracers)
+    for t in tracers:
+        t.refresh()
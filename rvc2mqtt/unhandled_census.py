@@ -0,0 +1,155 @@
+"""
+Census of rvc messages that no entity handled
+
+Instead of logging every unhandled frame, count them by (DGN, instance, source)
+with first/last seen times and a sample of the last decoded message.  The
+census is published to `<root>/admin/unhandled` on an interval and on request
+(`report` to `<root>/admin/unhandled/set`, `reset` clears it).  The report
+includes floorplan stubs for frequent messages an entity plugin could handle.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import datetime
+import json
+import logging
+import threading
+import time
+from rvc2mqtt.mqtt import MQTT_Support
+
+
+class UnhandledCensus(object):
+    """ Count unhandled messages by (dgn, instance, source_id) """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.entries = {}       # key -> [count, first_seen, last_seen, sample]
+        self.dropped = 0        # messages not counted because the census was full
+        self._lock = threading.Lock()
+
+    def record(self, msg_dict: dict) -> bool:
+        """ count msg_dict.  Returns True the first time its key is seen """
+        key = (msg_dict.get("dgn"), msg_dict.get("instance"), msg_dict.get("source_id"))
+        now = time.time()
+        with self._lock:
+            e = self.entries.get(key)
+            if e is not None:
+                e[0] += 1
+                e[2] = now
+                e[3] = msg_dict
+                return False
+            if len(self.entries) >= self.max_entries:
+                self.dropped += 1
+                return False
+            self.entries[key] = [1, now, now, msg_dict]
+            return True
+
+    def reset(self):
+        with self._lock:
+            self.entries = {}
+            self.dropped = 0
+
+    def totals(self) -> tuple:
+        """ (unique keys, total messages counted) """
+        with self._lock:
+            return (len(self.entries), sum(e[0] for e in self.entries.values()))
+
+    def report(self, top: int = 50) -> list:
+        """ the most frequent entries, most frequent first """
+        with self._lock:
+            items = [(k, list(v)) for (k, v) in self.entries.items()]
+        items.sort(key=lambda kv: kv[1][0], reverse=True)
+        result = []
+        for ((dgn, instance, source_id), (count, first, last, sample)) in items[:top]:
+            result.append({"dgn": dgn,
+                           "name": sample.get("name"),
+                           "instance": instance,
+                           "source_id": source_id,
+                           "count": count,
+                           "first_seen": datetime.datetime.fromtimestamp(first).isoformat(timespec="seconds"),
+                           "last_seen": datetime.datetime.fromtimestamp(last).isoformat(timespec="seconds"),
+                           "sample": sample})
+        return result
+
+    def floorplan_stubs(self, entity_factory_list: list, min_count: int = 10) -> list:
+        """ floorplan entries for frequent messages that a loaded entity plugin matches by name """
+        types = {}
+        for (fma, cls) in entity_factory_list:
+            if "name" in fma and "type" in fma:
+                types.setdefault(fma["name"], fma["type"])
+
+        stubs = []
+        seen = set()
+        for e in self.report(top=self.max_entries):
+            if e["count"] < min_count or e["name"] not in types:
+                continue
+            key = (e["name"], e["instance"])
+            if key in seen:
+                continue
+            seen.add(key)
+            stub = {"name": e["name"], "type": types[e["name"]]}
+            if e["instance"] is not None:
+                stub["instance"] = e["instance"]
+                stub["instance_name"] = f"{e['name'].lower()} {e['instance']}"
+            else:
+                stub["instance_name"] = e["name"].lower()
+            stubs.append(stub)
+        return stubs
+
+
+class UnhandledCensusControl(object):
+    """ Publish the census on an interval and when requested over mqtt """
+
+    def __init__(self, census: UnhandledCensus, mqtt_support: MQTT_Support, interval: float = 300.0,
+                 entity_factory_list: list = None):
+        self.Logger = logging.getLogger(__name__)
+        self.census = census
+        self.mqtt_support = mqtt_support
+        self.interval = interval
+        self.entity_factory_list = entity_factory_list if entity_factory_list is not None else []
+        self.state_topic = mqtt_support.root_topic + "/admin/unhandled"
+        self.command_topic = self.state_topic + "/set"
+        self._next_publish = time.monotonic() + interval
+        self._requested = False
+
+        mqtt_support.register(self.command_topic, self.process_mqtt_msg)
+
+    def process_mqtt_msg(self, topic, payload, properties=None):
+        command = payload.strip().lower()
+        if command == "report":
+            self._requested = True
+        elif command == "reset":
+            self.census.reset()
+            self._requested = True
+        else:
+            self.Logger.warning(f"Invalid payload {payload} for topic {topic}")
+
+    def poll(self):
+        """ called from the main loop """
+        now = time.monotonic()
+        if self._requested or (self.interval > 0 and now >= self._next_publish):
+            self._requested = False
+            self._next_publish = now + self.interval
+            self.publish()
+
+    def publish(self):
+        (unique, total) = self.census.totals()
+        report = {"unique": unique,
+                  "total": total,
+                  "dropped": self.census.dropped,
+                  "top": self.census.report(),
+                  "floorplan_stubs": self.census.floorplan_stubs(self.entity_factory_list)}
+        self.mqtt_support.client.publish(self.state_topic, json.dumps(report, default=str), retain=False)
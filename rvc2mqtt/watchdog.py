@@ -0,0 +1,157 @@
+"""
+Loop lag measurement and stall watchdog
+
+A LoopMonitor is ticked once per iteration of a processing loop (the app main
+loop and the can watcher).  It records how late each iteration ran compared to
+the loop's planned period in a `<name>_lag` histogram.
+
+The StallWatchdog thread checks every monitor.  A loop that hasn't ticked for
+stall_timeout seconds is reported once with the stack of its thread so it is
+clear what blocked it.  When running under systemd with WatchdogSec= set, the
+watchdog is only notified while no loop is stalled, so systemd restarts a
+bridge that has gone quiet.
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+from rvc2mqtt.metrics import Metrics
+
+
+def sd_notify(state: str) -> bool:
+    """ send a state (like READY=1 or WATCHDOG=1) to systemd if NOTIFY_SOCKET is set """
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address[0] == "@":
+        address = "\0" + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as s:
+            s.connect(address)
+            s.sendall(state.encode("utf-8"))
+        return True
+    except OSError as e:
+        logging.getLogger(__name__).debug(f"sd_notify failed: {e}")
+        return False
+
+
+class LoopMonitor(object):
+    """ Measure scheduling lag of a loop that should iterate every period seconds """
+
+    def __init__(self, name: str, metrics: Metrics, period: float):
+        self.name = name
+        self.metrics = metrics
+        self.period = period
+        self.histogram = metrics.histogram(name + "_lag")
+        self.thread_id = None
+        self.last_tick = None
+        self.iterations = 0
+
+    def tick(self):
+        """ call at the start of every iteration from the loop's thread """
+        now = time.monotonic()
+        last = self.last_tick
+        self.last_tick = now
+        self.iterations += 1
+        if last is None:
+            self.thread_id = threading.get_ident()
+            return
+        lag = now - last - self.period
+        self.histogram.observe(lag if lag > 0 else 0.0)
+
+    def age(self) -> float:
+        """ seconds since the last tick.  None if it never ticked """
+        if self.last_tick is None:
+            return None
+        return time.monotonic() - self.last_tick
+
+
+class StallWatchdog(threading.Thread):
+    """ Report loops that stop ticking and feed the systemd watchdog while healthy """
+
+    def __init__(self, monitors: list, metrics: Metrics, stall_timeout: float = 10.0):
+        threading.Thread.__init__(self, name="stall_watchdog", daemon=True)
+        self.Logger = logging.getLogger(__name__)
+        self.monitors = monitors
+        self.metrics = metrics
+        self.stall_timeout = stall_timeout
+        self.stalled = set()
+        self._stop_event = threading.Event()
+
+        # systemd sets WATCHDOG_USEC when WatchdogSec= is configured.  Notify at twice the rate
+        self.systemd_interval = None
+        usec = os.environ.get("WATCHDOG_USEC")
+        if usec and os.environ.get("NOTIFY_SOCKET"):
+            try:
+                self.systemd_interval = int(usec) / 2000000.0
+            except ValueError:
+                self.Logger.error(f"Invalid WATCHDOG_USEC {usec}")
+
+        self.check_interval = min(1.0, stall_timeout / 4)
+        if self.systemd_interval is not None:
+            self.check_interval = min(self.check_interval, self.systemd_interval)
+
+        metrics.add_provider("watchdog", self.get_metrics)
+
+    def run(self):
+        sd_notify("READY=1")
+        last_notify = 0
+        while not self._stop_event.wait(self.check_interval):
+            healthy = self.check()
+            now = time.monotonic()
+            if healthy and self.systemd_interval is not None and now - last_notify >= self.systemd_interval:
+                sd_notify("WATCHDOG=1")
+                last_notify = now
+
+    def stop(self):
+        self._stop_event.set()
+
+    def check(self) -> bool:
+        """ returns True if no loop is stalled """
+        healthy = True
+        for m in self.monitors:
+            age = m.age()
+            if age is None or age < self.stall_timeout:
+                if m.name in self.stalled:
+                    self.stalled.discard(m.name)
+                    self.Logger.warning(f"{m.name} recovered")
+                continue
+
+            healthy = False
+            if m.name not in self.stalled:
+                self.stalled.add(m.name)
+                self.metrics.inc("loop_stalls", m.name)
+                self.Logger.error(f"{m.name} stalled.  No iteration for {age:.1f} seconds\n{self._stack(m.thread_id)}")
+        return healthy
+
+    def _stack(self, thread_id: int) -> str:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            return "thread not found"
+        return "".join(traceback.format_stack(frame))
+
+    def get_metrics(self) -> dict:
+        result = {"stalled": sorted(self.stalled)}
+        for m in self.monitors:
+            age = m.age()
+            result[m.name + "_age_s"] = round(age, 3) if age is not None else None
+        return result
@@ -34,7 +34,13 @@ setuptools.setup(
     license='Apache-2',
     packages=setuptools.find_packages(),
     include_package_data=True,
-    package_data={'rvc2mqtt': ['rvc-spec.yml']},
+    package_data={'rvc2mqtt': ['rvc-spec.yml'], 'rvc2mqtt.benchmark': ['*.yaml', '*.json']},
+    entry_points={
+        'console_scripts': [
+            'rvc2mqtt=rvc2mqtt.__main__:main',
+            'rvc2mqtt-decode=rvc2mqtt.decode:main',
+        ]
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: Apache2 License",
@@ -46,5 +52,8 @@ setuptools.setup(
         'ruyaml',
         'paho-mqtt'
     ],
+    extras_require={
+        'parquet': ['pyarrow']
+    },
     python_requires='>=3.8'
 )
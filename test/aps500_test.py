@@ -21,6 +21,7 @@ limitations under the License.
 import unittest
 from unittest.mock import MagicMock
 import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.mqtt import MQTT_Support
 from rvc2mqtt.entity.aps500 import DcSystemSensor_DC_SOURCE_STATUS_1 as Aps500
 
 def _make_mock():
@@ -34,6 +35,12 @@ def _make_mock():
     return mock
 
 
+def _dm_rv(fault_code: int, red: str, yellow: str) -> dict:
+    spn = 0x7F000 + fault_code
+    return {'name': 'DM_RV', 'source_id': '80', 'red_lamp_status': red, 'yellow_lamp_status': yellow,
+            'spn-msb': spn >> 11, 'spn-isb': (spn >> 3) & 0xFF, 'spn-lsb': spn & 0x07}
+
+
 _APS_DATA = {'instance': 1, 'instance_name': "test aps", 'source_id': '80',
              'command_topic': 'aps500/set', 'status_topic': 'aps500/status'}
 
@@ -57,5 +64,25 @@ class Test_Aps500(unittest.TestCase):
             self.assertFalse(kwargs.get('retain', False),
                              f"Discovery config published with retain=True: {call}")
 
+    def test_fault_reported_when_lamp_lights(self):
+        mqs = MQTT_Support("bridge", "rvc2mqtt")
+        mqs.client = MagicMock()
+        faults = []
+        mqs.add_fault_listener(lambda source, reason: faults.append((source, reason)))
+        entity = Aps500(_APS_DATA, mqs)
+
+        self.assertTrue(entity.process_rvc_msg(_dm_rv(4095, '00', '00')))
+        self.assertEqual(faults, [])
+        self.assertTrue(entity.process_rvc_msg(_dm_rv(12, '01', '00')))
+        self.assertEqual(faults, [(entity.id, Aps500.apcfaults["12"])])
+        # still lit or changing color is the same fault
+        entity.process_rvc_msg(_dm_rv(12, '01', '00'))
+        entity.process_rvc_msg(_dm_rv(12, '00', '01'))
+        self.assertEqual(len(faults), 1)
+        entity.process_rvc_msg(_dm_rv(4095, '00', '00'))
+        entity.process_rvc_msg(_dm_rv(43, '00', '01'))
+        self.assertEqual(faults[-1], (entity.id, Aps500.apcfaults["43"]))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,214 @@
+"""
+Unit tests for the benchmark suites
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import json
+import os
+import re
+import unittest
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.rvc import RVC_Decoder
+from rvc2mqtt.benchmark import RVC_SPEC_FILE, percentile, timing_summary
+from rvc2mqtt.benchmark import decoder as decoder_bench
+from rvc2mqtt.benchmark import entities as entity_bench
+from rvc2mqtt.benchmark import gate
+from rvc2mqtt.benchmark import startup as startup_bench
+from rvc2mqtt.startup_timing import StartupTimer
+
+
+class Test_Helpers(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_timing_summary(self):
+        s = timing_summary([1000, 2000, 3000])
+        self.assertEqual(s["count"], 3)
+        self.assertEqual(s["mean_us"], 2.0)
+        self.assertEqual(s["max_us"], 3.0)
+
+
+class Test_DecoderBenchmark(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.rvc = RVC_Decoder()
+        cls.rvc.load_rvc_spec(RVC_SPEC_FILE)
+
+    def test_corpus_covers_spec(self):
+        corpus = decoder_bench.build_corpus(self.rvc, payloads_per_variant=2)
+        dgns = {f.dgn for f in corpus}
+        self.assertIn("1EF65", dgns)    # timberline
+        self.assertIn("0BFC1", dgns)    # g12
+        self.assertIn("0E8", dgns)      # dgn_h only
+        self.assertNotIn("Z0000", dgns)
+        variants = {f.variant for f in corpus if f.dgn == "1EF65"}
+        self.assertIn("firstbyte:86", variants)
+        vendors = {f.vendor for f in corpus}
+        self.assertEqual(vendors, {"rvc", "timberline", "g12", "aps500"})
+
+        # every frame is found in the spec by the decoder
+        for f in corpus:
+            self.assertEqual(self.rvc.rvc_decode(f.arbitration_id, f.data)["name"], f.name)
+
+    def test_run(self):
+        result = decoder_bench.run(self.rvc, rounds=1, payloads_per_variant=1)
+        json.dumps(result)
+        self.assertEqual(result["benchmark"], "decoder")
+        self.assertGreater(result["summary"]["frames_per_sec"], 0)
+        self.assertEqual(result["summary"]["variant_count"], len(result["dgns"]))
+        d = result["dgns"][0]
+        for key in ("dgn", "name", "variant", "vendor", "p99_us", "peak_alloc_bytes"):
+            self.assertIn(key, d)
+
+
+class Test_EntityBenchmark(unittest.TestCase):
+
+    def test_every_plugin_has_a_fixture(self):
+        entity_dir = os.path.join(os.path.dirname(RVC_SPEC_FILE), "entity")
+        plugins = set()
+        for f in os.listdir(entity_dir):
+            if f.endswith(".py"):
+                with open(os.path.join(entity_dir, f)) as src:
+                    # source scan because not every plugin imports on every python.
+                    # a class that defines FACTORY_MATCH_ATTRIBUTES is a plugin
+                    current = None
+                    for line in src:
+                        m = re.match(r"class (\w+)\(", line)
+                        if m:
+                            current = m.group(1)
+                        elif current and re.match(r"\s+FACTORY_MATCH_ATTRIBUTES\s*=", line):
+                            plugins.add((f[:-3], current))
+        fixtures = {(f["module"], f["class"]) for f in entity_bench.load_fixtures()}
+        self.assertGreater(len(plugins), 15)
+        self.assertEqual(plugins - fixtures, set())
+
+    def test_run(self):
+        result = entity_bench.run(rounds=1, only=["hvac", "timberline", "tank_level_sensor"])
+        json.dumps(result)
+        self.assertEqual(len(result["entities"]), 3)
+        for e in result["entities"]:
+            self.assertNotIn("error", e)
+            self.assertGreater(e["rvc"]["processed"], 0)
+            self.assertGreater(e["rvc"]["ops_per_sec"], 0)
+        hvac = next(e for e in result["entities"] if e["class"] == "HvacClass")
+        self.assertEqual(hvac["mqtt"]["tx_per_command"], 1.0)
+
+
+class Test_Gate(unittest.TestCase):
+
+    BASELINE = {"tolerance": 0.25,
+                "python_version": "3.12",
+                "metrics": {"decode": {"normalized": 1.0},
+                            "dispatch": {"normalized": 2.0, "tolerance": 0.5},
+                            "startup": {"normalized": 10.0}}}
+
+    def _current(self, decode, dispatch, python_version="3.12"):
+        return {"python_version": python_version,
+                "metrics": {"decode": {"normalized": decode}, "dispatch": {"normalized": dispatch}}}
+
+    def test_compare(self):
+        results = {r["metric"]: r for r in gate.compare(self._current(1.2, 2.9), self.BASELINE)}
+        # metric missing from the measurement is not compared
+        self.assertEqual(set(results), {"decode", "dispatch"})
+        self.assertFalse(results["decode"]["regressed"])
+        self.assertEqual(results["decode"]["ratio"], 1.2)
+        self.assertFalse(results["dispatch"]["regressed"])
+        self.assertEqual(results["dispatch"]["tolerance"], 0.5)
+
+        results = {r["metric"]: r for r in gate.compare(self._current(1.3, 3.1), self.BASELINE)}
+        self.assertTrue(results["decode"]["regressed"])
+        self.assertTrue(results["dispatch"]["regressed"])
+
+        # command line tolerance overrides the baseline
+        results = gate.compare(self._current(1.3, 3.1), self.BASELINE, tolerance=1.0)
+        self.assertFalse(any(r["regressed"] for r in results))
+
+    def test_compare_refuses_other_python(self):
+        with self.assertRaises(ValueError):
+            gate.compare(self._current(1.0, 2.0, "3.11"), self.BASELINE)
+
+    def test_checked_in_baseline(self):
+        baseline = gate.load_baseline()
+        self.assertEqual(set(baseline["metrics"]), set(gate.METRICS))
+        self.assertGreater(baseline["calibration_ns"], 0)
+        self.assertEqual(baseline["python_version"], baseline["environment"]["python"].rsplit(".", 1)[0])
+
+    def test_fixture_coach(self):
+        # every fixture frame in the combined coach goes to the fixture's own entity
+        fixtures = entity_bench.load_fixtures()
+        bridge = gate._fixture_bridge(fixtures)
+        (factory_list, skipped) = entity_bench.fixture_factory_list(fixtures)
+        skipped = {s["entity"].split(".")[0] for s in skipped}
+        for fixture in fixtures:
+            if fixture["module"] in skipped:
+                continue
+            for m in entity_bench.fixture_frames([fixture]):
+                decoded = bridge.rvc_decoder.rvc_decode(m.arbitration_id, m.data.hex().upper())
+                handler = next((e for e in bridge.entity_list if e.process_rvc_msg(decoded)), None)
+                if handler is None and decoded["name"] == "DM_RV":
+                    continue    # timberline matches DM_RV but does not handle it yet
+                self.assertIsNotNone(handler, f"{fixture['class']} {decoded['name']}")
+                self.assertEqual(type(handler).__name__, fixture["class"])
+
+
+class Test_StartupBenchmark(unittest.TestCase):
+
+    IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      2000 |       2500 |     paho.mqtt.enums
+import time:      3000 |       5500 |   paho.mqtt.client
+import time:       500 |       6120 | rvc2mqtt.app
+"""
+
+    def test_timer(self):
+        timer = StartupTimer()
+        for _ in range(3):
+            with timer.phase("entity_initialize"):
+                pass
+        with timer.phase("spec_load"):
+            pass
+        timer.finish()
+        r = timer.report()
+        self.assertEqual(list(r["phases"]), ["entity_initialize", "spec_load", "other"])
+        self.assertGreaterEqual(r["total_s"], sum(r["phases"].values()) - 0.001)
+        self.assertIn("spec_load", timer.format())
+
+    def test_parse_importtime(self):
+        imports = startup_bench.parse_importtime(self.IMPORTTIME)
+        self.assertEqual(len(imports), 4)
+        self.assertEqual(imports[0], ("_io", 120, 120, 1))
+        self.assertEqual(imports[1], ("paho.mqtt.enums", 2000, 2500, 2))
+        self.assertEqual(imports[3], ("rvc2mqtt.app", 500, 6120, 0))
+
+    def test_measure_once(self):
+        result = startup_bench.measure_once()
+        json.dumps(result)
+        for phase in ("import", "floorplan_load", "spec_load", "mqtt_connect", "mqtt_connack",
+                      "plugin_register", "entity_create", "entity_initialize"):
+            self.assertIn(phase, result["phases"])
+        self.assertGreater(result["entities"], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
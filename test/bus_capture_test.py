@@ -0,0 +1,138 @@
+"""
+Unit tests for the binary bus capture format
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import can
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.bus_capture import CaptureWriter, CaptureReader, list_segments, RECORD, FLAG_TX
+
+START = 1700000000.0
+
+# 10 frames / sec alternating between two DGNs
+def _fill(writer: CaptureWriter, count: int):
+    for i in range(count):
+        arb_id = 0x19FEDA44 if i % 2 else 0x19FFB687
+        writer.record(START + i * 0.1, arb_id, bytes([i & 0xFF, 1, 2]))
+
+
+class Test_BusCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        w = CaptureWriter(self.tmp.name, block_records=100)
+        _fill(w, 1000)
+        w.record_message(can.Message(timestamp=START + 100, arbitration_id=0x18EAFF00, data=b"\x01"), tx=True)
+        w.close()
+        self.assertEqual(w.records_written, 1001)
+        self.assertLess(w.bytes_written, 1001 * RECORD.size)   # compressed
+
+        frames = list(CaptureReader(self.tmp.name).read())
+        self.assertEqual(len(frames), 1001)
+        self.assertEqual(frames[3], (START + 0.3, 0x19FEDA44, 0, bytes([3, 1, 2])))
+        self.assertEqual(frames[-1], (START + 100, 0x18EAFF00, FLAG_TX, b"\x01"))
+
+    def test_time_and_dgn_window_uses_index(self):
+        w = CaptureWriter(self.tmp.name, block_records=100)
+        _fill(w, 1000)
+        w.close()
+        r = CaptureReader(self.tmp.name)
+
+        # 10 frames/sec, 100 per block.  30.0 - 39.9 is block 3
+        self.assertEqual(len(list(r.blocks(start=START + 30, end=START + 39.9))), 1)
+        frames = list(r.read(start=START + 30, end=START + 39.9))
+        self.assertEqual(len(frames), 100)
+        self.assertEqual(frames[0][0], START + 30)
+
+        frames = list(r.read(start=START + 30, end=START + 39.9, dgns={0x1FEDA}))
+        self.assertEqual(len(frames), 50)
+        self.assertTrue(all(((f[1] >> 8) & 0x1FFFF) == 0x1FEDA for f in frames))
+        self.assertEqual(list(r.blocks(dgns={0x1FEEE})), [])
+
+        msgs = list(r.messages(start=START, end=START + 0.15))
+        self.assertEqual([m.arbitration_id for m in msgs], [0x19FFB687, 0x19FEDA44])
+
+    def test_segments_rotate_and_expire(self):
+        w = CaptureWriter(self.tmp.name, segment_seconds=10, block_records=50, max_segments=3)
+        _fill(w, 1000)  # 100 seconds
+        w.close()
+        segments = list_segments(self.tmp.name)
+        self.assertEqual(len(segments), 3)
+        frames = list(CaptureReader(self.tmp.name).read())
+        self.assertEqual(frames[-1][0], START + 99.9)
+        self.assertGreaterEqual(frames[0][0], START + 70)
+
+    def test_segments_in_same_second_sort_in_order(self):
+        for n in range(3):
+            w = CaptureWriter(self.tmp.name, block_records=10)
+            w.record(START + n * 0.1, 0x19FEDA44, bytes([n]))
+            w.close()
+        segments = list_segments(self.tmp.name)
+        self.assertEqual(len(segments), 3)
+        self.assertTrue(segments[1].endswith("Z_01.rvcc"))
+        frames = list(CaptureReader(self.tmp.name).read())
+        self.assertEqual([f[3] for f in frames], [b"\x00", b"\x01", b"\x02"])
+
+    def test_segments_ordered_by_header_time(self):
+        # local time names written before and after a DST fall back sort backwards
+        w = CaptureWriter(self.tmp.name, segment_seconds=10, block_records=10)
+        _fill(w, 300)   # 30 seconds, 3 segments
+        w.close()
+        names = ["capture-20241103-015900.rvcc", "capture-20241103-010000.rvcc", "capture-20241103-010500.rvcc"]
+        for (old, new) in zip(list_segments(self.tmp.name), names):
+            os.rename(old, os.path.join(self.tmp.name, new))
+            os.rename(old + ".idx", os.path.join(self.tmp.name, new + ".idx"))
+        self.assertEqual([os.path.basename(p) for p in list_segments(self.tmp.name)], names)
+        frames = list(CaptureReader(self.tmp.name).read())
+        self.assertEqual([f[0] for f in frames], sorted(f[0] for f in frames))
+
+        # retention removes the oldest by time, not the first by name
+        w = CaptureWriter(self.tmp.name, segment_seconds=10, block_records=10, max_segments=3)
+        w.record(START + 100, 0x19FEDA44, b"\x01")
+        w.close()
+        self.assertEqual([os.path.basename(p) for p in list_segments(self.tmp.name)][:2], names[1:])
+
+    def test_segment_names_are_utc(self):
+        w = CaptureWriter(self.tmp.name, block_records=1)
+        w.record(START, 0x19FEDA44, b"\x01")
+        w.close()
+        self.assertEqual(os.path.basename(list_segments(self.tmp.name)[0]), "capture-20231114-221320Z.rvcc")
+
+    @patch("rvc2mqtt.bus_capture.time.monotonic")
+    def test_partial_block_flushed(self, monotonic):
+        monotonic.return_value = 0
+        w = CaptureWriter(self.tmp.name, block_records=100, flush_interval=5)
+        _fill(w, 10)
+        w.poll()
+        self.assertEqual(w.records_written, 0)
+        monotonic.return_value = 6
+        w.poll()
+        self.assertEqual(len(list(CaptureReader(self.tmp.name).read())), 10)
+        w.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Unit tests for bus load statistics and the bus load entity
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.bus_stats import BusStatistics
+from rvc2mqtt.entity.bus_load import BusLoadSensor
+
+
+def _make_mock():
+    mock = MagicMock()
+    mock.make_device_topic_string.side_effect = lambda id, field, state: f"t/{id}/{field}"
+    mock.TOPIC_BASE = 'rvc2mqtt'
+    mock.client_id = 'bridge'
+    mock.get_bridge_ha_name.return_value = 'bridge'
+    mock.bridge_state_topic = 'rvc2mqtt/bridge/state'
+    mock.make_ha_auto_discovery_config_topic.return_value = 'homeassistant/sensor/test/config'
+    return mock
+
+
+class Test_BusStatistics(unittest.TestCase):
+
+    @patch("rvc2mqtt.bus_stats.time.monotonic")
+    def test_sample_rates(self, monotonic):
+        monotonic.return_value = 100.0
+        s = BusStatistics()
+        for i in range(300):
+            s.record(0x19FFB644, 8)     # DGN 1FFB6 from 44
+        for i in range(100):
+            s.record(0x19FEDA87, 8)     # DGN 1FEDA from 87
+        s.record(0x20000004, 8, True)
+
+        monotonic.return_value = 102.0
+        r = s.sample()
+        self.assertEqual(r["frames_per_sec"], 200)
+        self.assertEqual(r["error_frames"], 1)
+        self.assertEqual(r["by_source_address"], {"44": 150, "87": 50})
+        self.assertEqual(r["by_dgn"], {"1FEDA": 50, "1FFB6": 150})
+        self.assertEqual(r["top_talkers"][0], {"source_address": "44", "frames_per_sec": 150})
+        # 400 frames * 131 bits / 2 sec / 250 kbit/s
+        self.assertEqual(r["utilization_pct"], round(400 * 131 * 100 / (2 * 250000), 2))
+
+        # new interval
+        monotonic.return_value = 103.0
+        r = s.sample()
+        self.assertEqual(r["frames_per_sec"], 0)
+        self.assertEqual(r["by_dgn"], {})
+        self.assertEqual(r["total_frames"], 400)
+        self.assertEqual(r["total_error_frames"], 1)
+
+
+class Test_BusLoadSensor(unittest.TestCase):
+
+    def test_publish(self):
+        mock = _make_mock()
+        s = BusStatistics()
+        s.record(0x19FFB644, 8)
+        e = BusLoadSensor({"interface": "can0", "instance_name": "can0 bus"}, mock, s, interval=0)
+        self.assertFalse(e.process_rvc_msg({"name": "DM_RV"}))
+        e.initialize()
+        self.assertEqual(mock.client.publish.call_count, 3)
+
+        e.poll()
+        topics = {c.args[0]: c.args[1] for c in mock.client.publish.call_args_list[3:]}
+        attributes = json.loads(topics["t/bus_load-can0/attributes"])
+        self.assertEqual(attributes["total_frames"], 1)
+        self.assertIn("t/bus_load-can0/frame_rate", topics)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Unit tests for the offline decode cli
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import csv
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+import can
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.decode import (arrow_type, candump_chunks, decode_logs, format_for, is_candump, read_candump_range,
+                             SPEC_FILE)
+from rvc2mqtt.rvc import RVC_Decoder
+
+FRAMES = [(0x19FFB780, "000510FFFFFFFFFF"),       # TANK_STATUS
+          (0x19FEDA80, "0C7FC800FF05F4C8"),       # DC_DIMMER_STATUS_3
+          (0x19FFB780, "000510FFFFFFFFFF"),       # repeat
+          (0x19123480, "0102030405060708"),       # not in the spec
+          (0x19FFB780, "0103"),                   # short
+          (0x19FFB780, "010310FFFFFFFFFF")]
+
+
+def _write_log(path: str, error_frame: bool = False):
+    writer = can.Logger(path)
+    for (n, (arbitration_id, data)) in enumerate(FRAMES):
+        writer.on_message_received(can.Message(timestamp=1654041600.0 + n * 0.25, arbitration_id=arbitration_id,
+                                               is_extended_id=True, data=bytes.fromhex(data)))
+        if error_frame and n == 1:
+            writer.on_message_received(can.Message(timestamp=1654041600.1, is_error_frame=True))
+    writer.stop()
+
+
+class Test_Decode(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.decoder = RVC_Decoder()
+        cls.decoder.load_rvc_spec(SPEC_FILE)
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.candump = os.path.join(cls.tmp.name, "coach.log")
+        cls.blf = os.path.join(cls.tmp.name, "coach.blf")
+        _write_log(cls.candump, error_frame=True)
+        _write_log(cls.blf)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def _expected(self) -> list:
+        return [dict({"timestamp": 1654041600.0 + n * 0.25}, **self.decoder.rvc_decode(a, d))
+                for (n, (a, d)) in enumerate(FRAMES)]
+
+    def test_candump_ranges(self):
+        self.assertTrue(is_candump(self.candump))
+        self.assertFalse(is_candump(self.blf))
+        with open(self.candump, "rb") as f:
+            whole = f.read()
+        for size in (1, 7, 40, len(whole)):
+            chunks = candump_chunks(self.candump, size)
+            self.assertEqual(b"".join(read_candump_range(*c) for c in chunks), whole)
+
+    def test_jsonl(self):
+        for (path, jobs) in ((self.candump, 1), (self.candump, 2), (self.blf, 2)):
+            out = io.StringIO()
+            stats = decode_logs([path], out, "jsonl", jobs=jobs, chunk_bytes=64, batch=2)
+            records = [json.loads(line) for line in out.getvalue().splitlines()]
+            self.assertEqual(records, self._expected())
+            self.assertEqual(stats["decoded"], len(FRAMES))
+            self.assertEqual(stats["unknown"], 1)
+        self.assertEqual(stats["skipped"], 0)
+
+    def test_error_frames_and_names(self):
+        out = io.StringIO()
+        stats = decode_logs([self.candump], out, "jsonl", jobs=1, names=["TANK_STATUS"])
+        self.assertEqual({json.loads(line)["name"] for line in out.getvalue().splitlines()}, {"TANK_STATUS"})
+        self.assertEqual(stats["skipped"], 1)
+        self.assertEqual(stats["decoded"] + stats["filtered"] + stats["skipped"], stats["frames"])
+
+    def test_csv(self):
+        out = io.StringIO()
+        decode_logs([self.candump, self.blf], out, "csv", jobs=2, batch=4)
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 2 * len(FRAMES))
+        expected = self._expected()
+        self.assertEqual(list(rows[0].keys())[:2], ["timestamp", "arbitration_id"])
+        self.assertEqual(rows[1]["operating_status_brightness"], str(expected[1]["operating_status_brightness"]))
+        self.assertEqual(rows[0]["operating_status_brightness"], "")
+        self.assertEqual(rows[len(FRAMES)]["name"], "TANK_STATUS")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "parquet output needs pyarrow")
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+        path = os.path.join(self.tmp.name, "coach.parquet")
+        decode_logs([self.candump], path, format_for(path), jobs=2, chunk_bytes=64)
+        table = pq.read_table(path)
+        self.assertEqual(table.num_rows, len(FRAMES))
+        self.assertEqual(str(table.schema.field("instance").type), "int64")
+        self.assertEqual(table.column("name").to_pylist(), [e["name"] for e in self._expected()])
+
+    def test_types(self):
+        self.assertEqual(arrow_type({"int"}), "int64")
+        self.assertEqual(arrow_type({"int", "float"}), "float64")
+        self.assertEqual(arrow_type({"int", "str"}), "string")
+        self.assertEqual(format_for("june.CSV"), "csv")
+        self.assertEqual(format_for("-"), "jsonl")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -54,5 +54,17 @@ class Test_Diagnostic(unittest.TestCase):
             self.assertFalse(kwargs.get('retain', False),
                              f"Discovery config published with retain=True: {call}")
 
+    def test_fault_on_reported(self):
+        mock = _make_mock()
+        entity = Diagnostic({'source_id': 66, 'instance_name': "test Diagnostic Sensor"}, mock)
+        msg = {"name": "DM_RV", "source_id": 66, "red_lamp_status": "00", "yellow_lamp_status": "00",
+               "fmi": 2, "fmi_definition": "Data erratic", "operating_status_definition": "on"}
+        entity.process_rvc_msg(msg)
+        mock.report_fault.assert_not_called()
+
+        entity.process_rvc_msg(dict(msg, red_lamp_status="01"))
+        entity.process_rvc_msg(dict(msg, red_lamp_status="01"))
+        mock.report_fault.assert_called_once_with("diagnostic-s66", "Failure Mode Identifier: 2 - Data erratic")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,90 @@
+"""
+Unit tests for per entity cpu time accounting
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import can
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.app import app
+from rvc2mqtt.mqtt_fake import make_fake_mqtt_support
+from rvc2mqtt.entity_cpu import EntityCpuAccounting
+from rvc2mqtt.mqtt_dispatcher import MQTT_Dispatcher
+from rvc2mqtt.entity.light_switch import LightSwitch_DC_LOAD_STATUS as LightSwitch
+
+
+def _make_mock():
+    mock = MagicMock()
+    mock.make_device_topic_string.return_value = 'test/topic'
+    return mock
+
+
+class Test_EntityCpuAccounting(unittest.TestCase):
+
+    def test_rvc_and_mqtt(self):
+        a = EntityCpuAccounting(top_count=1)
+        l1 = LightSwitch({'instance': 1, 'instance_name': "l1"}, _make_mock())
+        l2 = LightSwitch({'instance': 2, 'instance_name': "l2"}, _make_mock())
+        a.record_rvc(l1, 0.002, False)
+        a.record_rvc(l1, 0.001, True)
+        a.record_rvc(l2, 0.0005, True)
+        a.record_mqtt(l2, 0.004)
+
+        top = a.report(top=5)
+        self.assertEqual([e["entity"] for e in top], [l2.id, l1.id])
+        self.assertEqual(top[1], {"entity": l1.id, "total_ms": 3.0, "rvc_calls": 2, "rvc_handled": 1,
+                                  "rvc_ms": 3.0, "rvc_max_ms": 2.0, "mqtt_calls": 0, "mqtt_ms": 0, "mqtt_max_ms": 0})
+        m = a.get_metrics()
+        self.assertEqual(len(m["top"]), 1)
+        self.assertEqual(m["mqtt_total_s"], 0.004)
+
+    def test_dispatcher_charges_owner(self):
+        a = EntityCpuAccounting()
+        l1 = LightSwitch({'instance': 1, 'instance_name': "l1"}, _make_mock())
+        d = MQTT_Dispatcher(1)
+        d.cpu_accounting = a
+        d.start()
+        d.submit(l1.process_mqtt_msg, "test/topic", "on")
+        d.submit(l1.process_mqtt_msg, "test/topic", "off")
+        deadline = time.monotonic() + 5
+        while d.handled < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        d.stop()
+        self.assertEqual(a.report()[0]["entity"], l1.id)
+        self.assertEqual(a.report()[0]["mqtt_calls"], 2)
+
+    def test_disabled_pipeline_skips_timing(self):
+        bridge = app()
+        bridge.init_pipeline(entity_cpu_top=0)
+        bridge.mqtt_client = make_fake_mqtt_support("cpu", "rvc2mqtt")
+        bridge.mqtt_client.set_cpu_accounting(bridge.entity_cpu)
+        self.assertIsNone(bridge.mqtt_client.dispatcher.cpu_accounting)
+        bridge.load_entities([{"name": "DC_LOAD_STATUS", "type": "light_switch", "instance": 1, "instance_name": "l1"}], [],
+                             [(LightSwitch.FACTORY_MATCH_ATTRIBUTES, LightSwitch)])
+        bridge.rxQueue.put(can.Message(arbitration_id=0x19FFBD80, data=[1, 0xFF, 0xC8, 0, 0, 0, 0xFF, 0xFF]))
+        with patch("time.thread_time") as thread_time:
+            bridge.message_rx_loop()
+        thread_time.assert_not_called()
+        self.assertEqual(bridge.metrics.snapshot()["counters"]["frames_dispatched"], {"1FFBD": 1})
+        self.assertEqual(bridge.entity_cpu.report(), [])
+        self.assertNotIn("entity_cpu", bridge.metrics.snapshot())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Unit tests for the in-process mqtt broker
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import threading
+import time
+import unittest
+import paho.mqtt.client as mqc
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.fake_broker import FakeBroker, topic_matches
+from rvc2mqtt.mqtt import MqttInitalize
+
+
+def _wait(predicate, timeout: float = 5.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class Test_TopicMatches(unittest.TestCase):
+
+    def test_wildcards(self):
+        self.assertTrue(topic_matches("a/b", "a/b"))
+        self.assertFalse(topic_matches("a/b", "a/b/c"))
+        self.assertTrue(topic_matches("a/+/c", "a/b/c"))
+        self.assertFalse(topic_matches("a/+", "a/b/c"))
+        self.assertTrue(topic_matches("a/#", "a/b/c"))
+        self.assertTrue(topic_matches("#", "a"))
+
+
+class Test_FakeBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = FakeBroker(topic_alias_maximum=10).start()
+        self.support = None
+
+    def tearDown(self):
+        if self.support is not None:
+            self.support.dispatcher.stop()
+            self.support.client.disconnect()
+            self.support.client.loop_stop()
+        self.broker.stop()
+
+    def _connect(self, topic_alias_max: int = 0):
+        self.support = MqttInitalize("127.0.0.1", self.broker.port, "user", "pass", "bridge", "rvc2mqtt",
+                                     topic_alias_max=topic_alias_max)
+        self.assertIsNotNone(self.support)
+        self.support.client.loop_start()
+        self.assertTrue(_wait(self.support.is_connected))
+        return self.support
+
+    def test_records_publish(self):
+        support = self._connect()
+        self.assertTrue(self.broker.wait_for_message(support.bridge_state_topic))
+        self.assertEqual(self.broker.client_ids(), ["bridge"])
+
+        props = Properties(PacketTypes.PUBLISH)
+        props.MessageExpiryInterval = 30
+        support.client.publish("rvc2mqtt/bridge/d/x/state", "12", qos=1, retain=True, properties=props)
+        self.assertTrue(self.broker.wait_for_message("rvc2mqtt/bridge/d/x/state"))
+        m = self.broker.messages("rvc2mqtt/bridge/d/x/state")[0]
+        self.assertEqual(m.payload, b"12")
+        self.assertEqual(m.qos, 1)
+        self.assertTrue(m.retain)
+        self.assertEqual(m.client_id, "bridge")
+        self.assertEqual(m.properties.MessageExpiryInterval, 30)
+        self.assertIn("rvc2mqtt/bridge/d/x/state", self.broker.retained)
+
+    def test_topic_alias(self):
+        support = self._connect(topic_alias_max=5)
+        for n in range(3):
+            support.client.publish("rvc2mqtt/bridge/d/alias/state", str(n))
+        self.assertTrue(self.broker.wait_for_message("rvc2mqtt/bridge/d/alias/state", 3))
+        payloads = [m.payload for m in self.broker.messages("rvc2mqtt/bridge/d/alias/state")]
+        self.assertEqual(payloads, [b"0", b"1", b"2"])
+        self.assertGreater(support.topic_aliases.get_metrics()["aliased_publishes"], 0)
+
+    def test_command_to_bridge(self):
+        support = self._connect()
+        received = threading.Event()
+        support.register("rvc2mqtt/bridge/d/x/set", lambda topic, payload, properties=None: received.set())
+        # subscription is async.  Keep publishing until it arrives
+        self.assertTrue(_wait(lambda: (self.broker.publish("rvc2mqtt/bridge/d/x/set", "on"), received.is_set())[1]))
+
+    def test_retained_and_will(self):
+        self.broker.publish("rvc2mqtt/bridge/d/y/state", "restored", retain=True)
+        support = self._connect()
+        state = support.bootstrap_retained_state([support.device_topic_base + "/#"], timeout=2, quiet_time=0.2)
+        self.assertEqual(state.get("rvc2mqtt/bridge/d/y/state"), b"restored")
+
+        self.broker.drop_clients()
+        self.assertTrue(self.broker.wait_for(
+            lambda b: b.retained.get(support.bridge_state_topic) is not None and
+            b.retained[support.bridge_state_topic].payload == b"offline"))
+
+    def test_unknown_topic_alias_disconnects(self):
+        disconnected = threading.Event()
+        reasons = []
+
+        def on_disconnect(client, userdata, flags, reason_code, properties):
+            reasons.append(reason_code)
+            disconnected.set()
+
+        client = mqc.Client(mqc.CallbackAPIVersion.VERSION2, client_id="alias", protocol=mqc.MQTTv5)
+        client.on_disconnect = on_disconnect
+        client.connect("127.0.0.1", self.broker.port)
+        client.loop_start()
+        try:
+            self.assertTrue(_wait(client.is_connected))
+            props = Properties(PacketTypes.PUBLISH)
+            props.TopicAlias = 3
+            client.publish("", "x", properties=props)
+            self.assertTrue(disconnected.wait(5))
+            self.assertEqual(reasons[0], "Protocol error")
+        finally:
+            client.loop_stop()
+
+        # the broker keeps serving other clients
+        support = self._connect()
+        self.assertTrue(self.broker.wait_for_message(support.bridge_state_topic))
+
+    def test_v311_client(self):
+        client = mqc.Client(mqc.CallbackAPIVersion.VERSION2, client_id="v311", protocol=mqc.MQTTv311)
+        client.connect("127.0.0.1", self.broker.port)
+        client.loop_start()
+        try:
+            info = client.publish("t/v311", "x", qos=2)
+            info.wait_for_publish(5)
+            self.assertTrue(info.is_published())
+            self.assertEqual(self.broker.messages("t/v311")[0].qos, 2)
+        finally:
+            client.disconnect()
+            client.loop_stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Unit tests for the can bus flight recorder
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+import can
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.mqtt import MQTT_Support
+from rvc2mqtt.flight_recorder import FlightRecorder, FlightRecorderControl
+
+
+def _fill(recorder: FlightRecorder, count: int, start_time: float = 1000.0):
+    for i in range(count):
+        recorder.record(start_time + i * 0.01, 0x19FEDA00 | (i & 0xFF), bytes([i & 0xFF] * 8))
+
+
+class Test_FlightRecorder(unittest.TestCase):
+
+    def test_ring_keeps_latest(self):
+        r = FlightRecorder(100)
+        _fill(r, 250)
+        self.assertEqual(len(r), 100)
+        self.assertEqual(r.total, 250)
+        frames = r.snapshot()
+        self.assertEqual(len(frames), 100)
+        self.assertEqual(frames[0][3], bytes([150] * 8))
+        self.assertEqual(frames[-1][1], 0x19FEDA00 | 249)
+        self.assertEqual([f[0] for f in frames], sorted(f[0] for f in frames))
+
+    def test_snapshot_seconds_and_short_frames(self):
+        r = FlightRecorder(100)
+        _fill(r, 50)
+        r.record(2000.0, 0x18EAFF00, b"\x01\x02\x03", FlightRecorder.FLAG_TX)
+        frames = r.snapshot(seconds=1)
+        self.assertEqual(frames, [(2000.0, 0x18EAFF00, FlightRecorder.FLAG_TX, b"\x01\x02\x03")])
+
+    def test_snapshot_seconds_wrapped(self):
+        r = FlightRecorder(10)
+        _fill(r, 25)
+        frames = r.snapshot(seconds=r.snapshot()[-1][0] - r.snapshot()[-4][0])
+        self.assertEqual([f[1] & 0xFF for f in frames], [21, 22, 23, 24])
+
+    def test_snapshot_does_not_change_with_later_records(self):
+        r = FlightRecorder(10)
+        _fill(r, 5)
+        frames = r.snapshot()
+        _fill(r, 10)
+        self.assertEqual([f[1] & 0xFF for f in frames], [0, 1, 2, 3, 4])
+
+    def test_record_error_frame(self):
+        r = FlightRecorder(10)
+        r.record_message(can.Message(timestamp=5.0, arbitration_id=0x20000004, is_error_frame=True, data=b"\x00" * 8))
+        self.assertEqual(r.snapshot()[0][2], FlightRecorder.FLAG_ERROR)
+
+    def test_write_candump_and_blf(self):
+        r = FlightRecorder(100)
+        _fill(r, 20)
+        with tempfile.TemporaryDirectory() as tmp:
+            log = os.path.join(tmp, "a.log")
+            self.assertEqual(r.write(log, "candump"), 20)
+            with open(log) as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines[0].startswith("(1000.000000) can0 19FEDA00#0000000000000000"))
+
+            blf = os.path.join(tmp, "a.blf")
+            r.write(blf, "blf")
+            with can.BLFReader(blf) as reader:
+                msgs = list(reader)
+            self.assertEqual(len(msgs), 20)
+            self.assertEqual(msgs[5].arbitration_id, 0x19FEDA05)
+
+
+class Test_FlightRecorderControl(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mqs = MQTT_Support("bridge", "rvc2mqtt")
+        self.mqs.client = MagicMock()
+        self.recorder = FlightRecorder(100)
+        _fill(self.recorder, 10)
+        self.control = FlightRecorderControl(self.recorder, self.mqs, self.tmp.name, min_auto_interval=60)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _wait(self):
+        self.control._thread.join(5)
+
+    def test_mqtt_dump(self):
+        self.assertIn("rvc2mqtt/bridge/admin/recorder/set", self.mqs.registered_mqtt_devices)
+        self.control.process_mqtt_msg(self.control.command_topic, "dump blf")
+        self._wait()
+        self.assertTrue(self.control.last_dump["file"].endswith(".blf"))
+        self.assertEqual(self.control.last_dump["frames"], 10)
+        (topic, payload), kwargs = self.mqs.client.publish.call_args
+        self.assertEqual(topic, "rvc2mqtt/bridge/admin/recorder")
+        self.assertEqual(json.loads(payload)["reason"], "mqtt")
+
+    def test_invalid_command(self):
+        self.control.process_mqtt_msg(self.control.command_topic, "dump mp4")
+        self.assertIsNone(self.control._thread)
+
+    def test_fault_trigger_rate_limited(self):
+        self.mqs.report_fault("diagnostic-s66", "Failure Mode Identifier: 2")
+        self._wait()
+        self.assertTrue(os.path.isfile(self.control.last_dump["file"]))
+        self.assertEqual(self.control.last_dump["reason"], "fault-diagnostic-s66")
+        self.assertFalse(self.control.trigger("decode_error"))
+        self.assertEqual(len(os.listdir(self.tmp.name)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
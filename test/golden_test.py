@@ -0,0 +1,86 @@
+"""
+Unit tests for the golden output harness
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.golden import CASE_FILE, check, diff, normalize, plugin_factory_list, read_expected, write_expected
+from rvc2mqtt.plugin_support import PluginSupport
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+CASES = sorted(d for d in os.listdir(GOLDEN_DIR) if os.path.isfile(os.path.join(GOLDEN_DIR, d, CASE_FILE)))
+
+GOOD_PLUGIN = '''
+from rvc2mqtt.entity import EntityPluginBaseClass
+
+class Good(EntityPluginBaseClass):
+    FACTORY_MATCH_ATTRIBUTES = {"type": "good"}
+'''
+
+
+class Test_Golden(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.factory_list = plugin_factory_list()
+
+    def test_cases(self):
+        self.assertGreater(len(CASES), 0)
+        for case in CASES:
+            with self.subTest(case=case):
+                self.assertEqual(check(os.path.join(GOLDEN_DIR, case), self.factory_list), "")
+
+    def test_detects_change(self):
+        with tempfile.TemporaryDirectory() as d:
+            case_dir = os.path.join(d, CASES[0])
+            shutil.copytree(os.path.join(GOLDEN_DIR, CASES[0]), case_dir)
+            lines = read_expected(case_dir)
+            (cause, kind, rest) = lines[-1].split(" ", 2)
+            lines[-1] = f"{cause} {kind} {rest}0"
+            write_expected(case_dir, lines)
+            text = check(case_dir, self.factory_list)
+        self.assertIn(f"-{lines[-1]}", text)
+        self.assertIn(f"+{lines[-1][:-1]}", text)
+
+    def test_normalize(self):
+        case = {"ignore_topics": ["/datetime"], "replace": [[r"\d+\.\d+$", "<float>"]]}
+        lines = ["init pub rvc2mqtt/golden/d/datetime/state 1 12:00",
+                 "3 pub rvc2mqtt/golden/d/tank/state 1 56.0",
+                 "3 tx 18EAFF82#DAFE010C00000000"]
+        self.assertEqual(normalize(lines, case), ["3 pub rvc2mqtt/golden/d/tank/state 1 <float>", lines[2]])
+        self.assertEqual(diff(lines, list(lines)), "")
+
+    def test_skip_failed_plugin(self):
+        with tempfile.TemporaryDirectory() as d:
+            with open(os.path.join(d, "golden_broken_plugin.py"), "w") as f:
+                f.write("def broken(:\n")
+            with open(os.path.join(d, "golden_good_plugin.py"), "w") as f:
+                f.write(GOOD_PLUGIN)
+            with self.assertRaises(SyntaxError):
+                PluginSupport(d, []).register_with_factory_the_entity_plugins([])
+            factory_list = []
+            PluginSupport(d, []).register_with_factory_the_entity_plugins(factory_list, skip_failed=True)
+        self.assertEqual([c.__name__ for (_, c) in factory_list], ["Good"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Unit tests for caching and republishing Home Assistant discovery configs
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import context  # add rvc2mqtt package to the python path using local reference
+import paho.mqtt.client as mqc
+from rvc2mqtt.mqtt import MQTT_Support, MQTT_Client
+from rvc2mqtt.entity.temperature import TemperatureSensor_THERMOSTAT_AMBIENT_STATUS as TemperatureSensor
+
+
+def _make_support():
+    mqs = MQTT_Support("bridge", "rvc2mqtt")
+    c = MQTT_Client(mqs, mqc.CallbackAPIVersion.VERSION2, client_id="test", protocol=mqc.MQTTv5)
+    mqs.set_client(c)
+    return mqs
+
+
+class Test_HA_Discovery(unittest.TestCase):
+
+    def test_discovery_cached_per_topic(self):
+        mqs = _make_support()
+        t1 = TemperatureSensor({'instance': 1, 'instance_name': "t1"}, mqs)
+        t2 = TemperatureSensor({'instance': 2, 'instance_name': "t2"}, mqs)
+        t1.publish_ha_discovery_config()
+        t2.publish_ha_discovery_config()
+        t1.publish_ha_discovery_config()
+        self.assertEqual(len(mqs.ha_discovery_cache), 2)
+
+        # state topics are not cached
+        mqs.client.publish(t1.status_topic, "{}", retain=True)
+        self.assertEqual(len(mqs.ha_discovery_cache), 2)
+
+    def test_config_change_replaces_cache(self):
+        mqs = _make_support()
+        mqs.client.publish("homeassistant/sensor/x/config", "a")
+        mqs.client.publish("homeassistant/sensor/x/config", "b")
+        self.assertEqual(mqs.ha_discovery_cache["homeassistant/sensor/x/config"], ("b", 0))
+
+    def test_republish_paced_without_rebuilding(self):
+        mqs = _make_support()
+        for i in range(5):
+            mqs.client.publish(f"homeassistant/sensor/x{i}/config", str(i), qos=1)
+
+        mqs.client = MagicMock()
+        with patch.object(TemperatureSensor, "publish_ha_discovery_config") as rebuild:
+            start = time.perf_counter()
+            mqs.republish_ha_discovery(rate=50, jitter=0)
+            mqs._ha_discovery_thread.join(5)
+            elapsed = time.perf_counter() - start
+            rebuild.assert_not_called()
+
+        self.assertEqual(mqs.client.publish.call_count, 5)
+        mqs.client.publish.assert_any_call("homeassistant/sensor/x3/config", "3", qos=1, retain=False)
+        # 5 configs at 50 per second
+        self.assertGreaterEqual(elapsed, 0.09)
+
+    def test_republish_restart_cancels_previous(self):
+        mqs = _make_support()
+        for i in range(20):
+            mqs.client.publish(f"homeassistant/sensor/x{i}/config", str(i))
+        mqs.client = MagicMock()
+        mqs.republish_ha_discovery(rate=10, jitter=0)
+        first = mqs._ha_discovery_thread
+        mqs.republish_ha_discovery(rate=1000, jitter=0)
+        self.assertFalse(first.is_alive())
+        mqs._ha_discovery_thread.join(5)
+        self.assertLess(mqs.client.publish.call_count, 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Unit tests for the latency tracer
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import time
+import unittest
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.metrics import Metrics
+from rvc2mqtt.latency_trace import LatencyTracer, TracedQueue
+from rvc2mqtt.mqtt_dispatcher import MQTT_Dispatcher
+
+
+class Test_LatencyTracer(unittest.TestCase):
+
+    def test_frame_to_publish(self):
+        m = Metrics()
+        t = LatencyTracer(m)
+        t.begin_frame(time.time() - 0.05, "1FFB7")
+        t.mark_publish()
+        t.mark_publish()
+        t.end_frame("tank-1", 0.001, 0.002)
+
+        h = m.histogram("can_to_publish_latency")
+        self.assertEqual(h.count, 1)
+        self.assertGreaterEqual(h.max, 0.05)
+        self.assertEqual(m.histogram("rx_queue_latency").count, 1)
+        self.assertEqual(t.get_metrics()["by_entity"]["tank-1"]["count"], 1)
+        slow = t.get_slowest_frames()
+        self.assertEqual(slow[0]["dgn"], "1FFB7")
+        self.assertEqual(slow[0]["entity"], "tank-1")
+
+    def test_no_publish_not_recorded(self):
+        m = Metrics()
+        t = LatencyTracer(m)
+        t.begin_frame(time.time(), "1FFB7")
+        t.end_frame(None, 0.001, 0.002)
+        self.assertEqual(m.histogram("can_to_publish_latency").count, 0)
+        # publish outside of a frame is ignored
+        t.mark_publish()
+        self.assertEqual(t.get_slowest_frames(), [])
+
+    def test_untrusted_timestamp(self):
+        m = Metrics()
+        t = LatencyTracer(m)
+        t.begin_frame(12.0, "1FFB7")   # e.g. a replayed log
+        t.mark_publish()
+        t.end_frame("x", 0, 0)
+        self.assertEqual(m.histogram("rx_queue_latency").count, 0)
+        self.assertLess(m.histogram("can_to_publish_latency").max, 1.0)
+
+    def test_slowest_frames_sorted(self):
+        t = LatencyTracer(Metrics(), recent_count=10, slowest_count=3)
+        for delay in (0.01, 0.5, 0.2, 0.05, 0.3):
+            t.begin_frame(time.time() - delay, "1FFB7")
+            t.mark_publish()
+            t.end_frame("x", 0, 0)
+        totals = [f["total_ms"] for f in t.get_slowest_frames()]
+        self.assertEqual(len(totals), 3)
+        self.assertEqual(totals, sorted(totals, reverse=True))
+        self.assertGreaterEqual(totals[0], 500)
+
+    def test_command_tagged(self):
+        m = Metrics()
+        t = LatencyTracer(m)
+        q = TracedQueue(t)
+        d = MQTT_Dispatcher()
+        d.tracer = t
+        d.start()
+
+        def handler(topic, payload, properties=None):
+            q.put({"dgn": "1FEDB", "data": b""})
+        d.submit(handler, "cmd", "on")
+
+        item = q.get(timeout=5)
+        d.stop()
+        self.assertIn("cmd_received_time", item)
+        self.assertEqual(m.histogram("cmd_to_rvc_buffer_latency").count, 1)
+
+        # not from a command - no tag
+        q.put({"dgn": "1FEDB", "data": b""})
+        self.assertNotIn("cmd_received_time", q.get())
+
+
+if __name__ == '__main__':
+    unittest.main()
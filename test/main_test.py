@@ -0,0 +1,50 @@
+"""
+Unit tests for the command line entrypoint
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import importlib
+import sys
+import unittest
+from unittest.mock import patch
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt import __main__ as entrypoint
+
+
+class Test_Main(unittest.TestCase):
+
+    def test_subcommands_documented(self):
+        for name in ["[bridge options]"] + list(entrypoint.SUBCOMMANDS):
+            self.assertIn(f"rvc2mqtt {name}", entrypoint.__doc__)
+
+    def test_dispatch(self):
+        for (name, module) in entrypoint.SUBCOMMANDS.items():
+            with self.subTest(name=name):
+                with patch.object(importlib.import_module(module), "main", return_value=3) as m, \
+                        patch.object(sys, "argv", ["rvc2mqtt", name, "a", "--b"]):
+                    self.assertEqual(entrypoint.main(), 3)
+                m.assert_called_once_with(["a", "--b"])
+
+    def test_default_is_bridge(self):
+        with patch("rvc2mqtt.app.main", return_value=0) as m, \
+                patch.object(sys, "argv", ["rvc2mqtt", "-c", "config.yaml"]):
+            self.assertEqual(entrypoint.main(), 0)
+        m.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Unit tests for the metrics support
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import json
+import unittest
+import urllib.request
+from unittest.mock import MagicMock
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.metrics import Metrics, Histogram, MetricsHttpServer
+from rvc2mqtt.mqtt import MQTT_Support
+
+
+class Test_Metrics(unittest.TestCase):
+
+    def test_counters(self):
+        m = Metrics()
+        m.inc("frames")
+        m.inc("frames")
+        m.inc("per_dgn", "1FFB7")
+        m.inc("per_dgn", "1FFB7")
+        m.inc("per_dgn", "1FEDA", 3)
+        self.assertEqual(m.get_count("frames"), 2)
+        self.assertEqual(m.get_count("per_dgn", "1FFB7"), 2)
+        self.assertEqual(m.get_count("per_dgn"), 5)
+        snap = m.snapshot()
+        self.assertEqual(snap["counters"]["frames"], 2)
+        self.assertEqual(snap["counters"]["per_dgn"], {"1FFB7": 2, "1FEDA": 3})
+        json.dumps(snap)
+
+    def test_histogram(self):
+        h = Histogram()
+        for _ in range(98):
+            h.observe(0.0002)
+        h.observe(0.02)
+        h.observe(0.3)
+        self.assertEqual(h.count, 100)
+        self.assertAlmostEqual(h.percentile(50), 0.00025)
+        self.assertAlmostEqual(h.percentile(99), 0.025)
+        self.assertAlmostEqual(h.percentile(100), 0.3)
+        d = h.to_dict()
+        self.assertEqual(d["max_ms"], 300.0)
+
+    def test_gauges_and_providers(self):
+        m = Metrics()
+        m.add_gauge("depth", lambda: 4)
+        m.add_gauge("broken", MagicMock(side_effect=Exception("x")))
+        m.add_provider("dispatch", lambda: {"handled": 3})
+        snap = m.snapshot()
+        self.assertEqual(snap["gauges"], {"depth": 4})
+        self.assertEqual(snap["dispatch"], {"handled": 3})
+
+    def test_prometheus(self):
+        m = Metrics()
+        m.inc("frames_received", "1FFB7")
+        m.observe("decode_latency", 0.001)
+        m.add_gauge("rx_queue_depth", lambda: 2)
+        text = m.to_prometheus()
+        self.assertIn('rvc2mqtt_frames_received_total{key="1FFB7"} 1', text)
+        self.assertIn('rvc2mqtt_decode_latency_seconds_count 1', text)
+        self.assertIn('rvc2mqtt_decode_latency_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn('rvc2mqtt_rx_queue_depth 2', text)
+
+    def test_http_server(self):
+        m = Metrics()
+        m.inc("frames")
+        server = MetricsHttpServer(m, 0, "127.0.0.1")
+        server.start()
+        try:
+            port = server.server.server_address[1]
+            body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+            self.assertIn("rvc2mqtt_frames_total 1", body)
+        finally:
+            server.shutdown()
+
+    def test_bridge_info_published(self):
+        mqs = MQTT_Support("bridge", "rvc2mqtt")
+        mqs.client = MagicMock()
+        mqs.send_bridge_info('{"a": 1}')
+        mqs.client.publish.assert_called_once_with("rvc2mqtt/bridge/info", '{"a": 1}', retain=False)
+        self.assertIn("mqtt_dispatch", mqs.metrics.snapshot())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+"""
+Unit tests for restoring retained state at startup
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import unittest
+from unittest.mock import MagicMock, patch
+import context  # add rvc2mqtt package to the python path using local reference
+import paho.mqtt.client as mqc
+from rvc2mqtt.mqtt import MQTT_Support, MQTT_Client
+from rvc2mqtt.entity.tank_level_sensor import TankLevelSensor_TANK_STATUS as TankLevelSensor
+from rvc2mqtt.entity.dc_system import DcSystemSensor_DC_SOURCE_STATUS_1 as DcSystemSensor
+from rvc2mqtt.entity.g12_dc_system import DcSystemSensor_DC_SOURCE_STATUS_1 as G12DcSystemSensor
+from rvc2mqtt.entity.light_switch import LightSwitch_DC_LOAD_STATUS as LightSwitch
+from rvc2mqtt.entity.dimmer_switch import DimmerSwitch_DC_DIMMER_STATUS_3 as DimmerSwitch
+from rvc2mqtt.entity.tank_warmer import TankWarmer_DC_LOAD_STATUS as TankWarmer
+from rvc2mqtt.entity.g12_tank_warmer import TankHeater_DC_DIMMER_STATUS_3 as G12TankWarmer
+
+
+def _msg(topic: str, payload: bytes, retain: bool):
+    m = MagicMock()
+    m.topic = topic
+    m.payload = payload
+    m.retain = retain
+    return m
+
+
+def _make_support():
+    mqs = MQTT_Support("bridge", "rvc2mqtt")
+    c = MQTT_Client(mqs, mqc.CallbackAPIVersion.VERSION2, client_id="test", protocol=mqc.MQTTv5)
+    mqs.set_client(c)
+    return mqs
+
+
+class Test_MQTT_Bootstrap(unittest.TestCase):
+
+    def test_collects_retained_only(self):
+        mqs = _make_support()
+        mqs._connected = True
+        mqs.client = MagicMock()
+
+        def subscribe(filters):
+            mqs.on_message(None, None, _msg("rvc2mqtt/bridge/d/a/state", b"on", True))
+            mqs.on_message(None, None, _msg("rvc2mqtt/bridge/d/b/state", b"off", False))
+            mqs.on_message(None, None, _msg("rvc2mqtt/bridge/d/c/state", b"", True))
+        mqs.client.subscribe.side_effect = subscribe
+
+        restored = mqs.bootstrap_retained_state([mqs.device_topic_base + "/#"], timeout=1, quiet_time=0.1)
+        self.assertEqual(restored, {"rvc2mqtt/bridge/d/a/state": b"on"})
+        mqs.client.unsubscribe.assert_called_once()
+
+    def test_only_state_topics_restored(self):
+        mqs = _make_support()
+        mqs._connected = True
+        mqs.client = MagicMock()
+        base = mqs.device_topic_base
+
+        def subscribe(filters):
+            for topic in [base + "/light/state", base + "/light/set", base + "/hvac/mode/state",
+                          "homeassistant/light/x/config"]:
+                if any(mqc.topic_matches_sub(f, topic) for (f, _) in filters):
+                    mqs.on_message(None, None, _msg(topic, b"on", True))
+        mqs.client.subscribe.side_effect = subscribe
+
+        restored = mqs.bootstrap_retained_state(mqs.state_topic_filters(), timeout=1, quiet_time=0.1)
+        self.assertEqual(sorted(restored), [base + "/hvac/mode/state", base + "/light/state"])
+
+        # a custom filter that matches command and discovery topics still only restores state
+        mqs.retained_state = {}
+        restored = mqs.bootstrap_retained_state(["#"], timeout=1, quiet_time=0.1)
+        self.assertEqual(sorted(restored), [base + "/hvac/mode/state", base + "/light/state"])
+
+    def test_not_connected_skips(self):
+        mqs = _make_support()
+        mqs.client = MagicMock()
+        self.assertEqual(mqs.bootstrap_retained_state(["x/#"], timeout=0.1), {})
+        mqs.client.subscribe.assert_not_called()
+
+    def test_placeholder_and_duplicate_suppressed(self):
+        mqs = _make_support()
+        mqs.retained_state = {"t/a": b"on", "t/b": b"12.5"}
+        mqs._restoring = True
+
+        # placeholder during startup
+        self.assertTrue(mqs.suppress_retained_publish("t/a", "unknown"))
+        self.assertTrue(mqs.suppress_retained_publish("t/b", 12.5))
+        mqs.finish_startup()
+
+        # same value as broker has
+        self.assertTrue(mqs.suppress_retained_publish("t/a", "on"))
+        # after that publishes are normal
+        self.assertFalse(mqs.suppress_retained_publish("t/a", "on"))
+        # unknown topic
+        self.assertFalse(mqs.suppress_retained_publish("t/c", "on"))
+        self.assertEqual(mqs.suppressed_publishes, 3)
+
+    def test_new_value_after_startup_published(self):
+        mqs = _make_support()
+        mqs.retained_state = {"t/a": b"on"}
+        mqs.finish_startup()
+        self.assertFalse(mqs.suppress_retained_publish("t/a", "off"))
+        self.assertEqual(mqs.retained_state, {})
+
+    def test_real_startup_value_published(self):
+        mqs = _make_support()
+        mqs.retained_state = {"t/a": b"12:00", "homeassistant/light/x/config": b"{}"}
+        mqs._restoring = True
+        # not a placeholder.  An entity that only publishes this in initialize must not lose it
+        self.assertFalse(mqs.suppress_retained_publish("t/a", "13:00"))
+        self.assertNotIn("t/a", mqs.retained_state)
+
+    def test_client_publish_suppressed(self):
+        mqs = _make_support()
+        mqs.retained_state = {"t/a": b"on"}
+        with patch.object(mqc.Client, "publish") as publish:
+            mqs.client.publish("t/a", "on", retain=True)
+            publish.assert_not_called()
+            mqs.client.publish("t/a", "on", retain=True)
+            publish.assert_called_once()
+
+    def test_tank_level_restore(self):
+        mqs = MagicMock()
+        mqs.make_device_topic_string.return_value = "t/tank"
+        tank = TankLevelSensor({'instance': 0, 'instance_name': "fresh"}, mqs)
+        tank.restore_retained_state({"t/tank": b"42"})
+        self.assertEqual(tank.level, 42)
+
+        tank.process_rvc_msg({"name": "TANK_STATUS", "instance": 0, "relative_level": 42, "resolution": 100})
+        mqs.client.publish.assert_not_called()
+
+    def test_dc_system_restore(self):
+        mqs = MagicMock()
+        mqs.make_device_topic_string.side_effect = ["t/state", "t/v", "t/a"]
+        dc = DcSystemSensor({'instance': 1, 'instance_name': "house"}, mqs)
+        dc.restore_retained_state({"t/v": b"13.1", "t/a": b"-2.5"})
+        dc.process_rvc_msg({"name": "DC_SOURCE_STATUS_1", "instance": 1, "dc_voltage": 13.1, "dc_current": -2.5})
+        mqs.client.publish.assert_not_called()
+
+    def test_g12_dc_system_restore(self):
+        mqs = MagicMock()
+        mqs.make_device_topic_string.side_effect = ["t/state", "t/v", "t/a"]
+        dc = G12DcSystemSensor({'instance': 1, 'instance_name': "chassis"}, mqs)
+        dc.restore_retained_state({"t/v": b"13.10", "t/a": b"-2.5"})
+        dc.process_rvc_msg({"name": "DC_SOURCE_STATUS_G12", "instance": 1, "dc_voltage": 13.1, "dc_current": -2.5})
+        mqs.client.publish.assert_not_called()
+
+    def test_light_switch_restore(self):
+        mqs = MagicMock()
+        mqs.make_device_topic_string.return_value = "t/light"
+        light = LightSwitch({'instance': 1, 'instance_name': "awning"}, mqs)
+        light.restore_retained_state({"t/light": b"on"})
+        self.assertEqual(light.state, "on")
+        light.restore_retained_state({"t/light": b"UNEXPECTED(50.0)"})
+        self.assertEqual(light.state, "on")
+
+    def test_on_off_restore(self):
+        for (cls, data) in [(DimmerSwitch, {'instance': 12, 'group': '01111111', 'instance_name': "galley"}),
+                            (TankWarmer, {'instance': 20, 'instance_name': "waste heater"}),
+                            (G12TankWarmer, {'instance': 30, 'group': '01111111', 'instance_name': "fresh heater"})]:
+            with self.subTest(entity=cls.__name__):
+                mqs = MagicMock()
+                mqs.make_device_topic_string.return_value = "t/switch"
+                entity = cls(data, mqs)
+                entity.restore_retained_state({"t/switch": b"unknown"})
+                self.assertEqual(entity.state, "unknown")
+                entity.restore_retained_state({"t/other": b"on"})
+                self.assertEqual(entity.state, "unknown")
+                entity.restore_retained_state({"t/switch": b"off"})
+                self.assertEqual(entity.state, "off")
+                entity.restore_retained_state({"t/switch": b"UNEXPECTED(50.0)"})
+                self.assertEqual(entity.state, "off")
+                entity.restore_retained_state({"t/switch": b"\xff"})
+                self.assertEqual(entity.state, "off")
+                entity.restore_retained_state({"t/switch": b"on"})
+                self.assertEqual(entity.state, "on")
+
+
+if __name__ == '__main__':
+    unittest.main()
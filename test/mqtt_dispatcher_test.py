@@ -0,0 +1,111 @@
+"""
+Unit tests for the mqtt dispatcher
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.mqtt_dispatcher import MQTT_Dispatcher
+from rvc2mqtt.mqtt import MQTT_Support
+
+
+class recorder(object):
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.calls = []
+        self.done = threading.Event()
+
+    def handler(self, topic, payload, properties=None):
+        if self.delay:
+            time.sleep(self.delay)
+        self.calls.append(payload)
+        self.done.set()
+
+
+def _wait_for(dispatcher: MQTT_Dispatcher, count: int):
+    end = time.time() + 5
+    while dispatcher.get_metrics()["handled"] < count and time.time() < end:
+        time.sleep(0.005)
+
+
+class Test_MQTT_Dispatcher(unittest.TestCase):
+
+    def test_order_kept_per_entity(self):
+        d = MQTT_Dispatcher(3)
+        d.start()
+        a = recorder()
+        b = recorder()
+        for i in range(50):
+            d.submit(a.handler, "a", str(i))
+            d.submit(b.handler, "b", str(i))
+        _wait_for(d, 100)
+        d.stop()
+        self.assertEqual(a.calls, [str(i) for i in range(50)])
+        self.assertEqual(b.calls, [str(i) for i in range(50)])
+
+    def test_slow_handler_does_not_block_submit(self):
+        d = MQTT_Dispatcher(2)
+        d.start()
+        slow = recorder(0.2)
+        fast = recorder()
+        start = time.perf_counter()
+        d.submit(slow.handler, "slow", "1")
+        d.submit(fast.handler, "fast", "1")
+        self.assertLess(time.perf_counter() - start, 0.1)
+        # fast entity is on another worker so finishes before the slow one
+        self.assertTrue(fast.done.wait(0.15))
+        _wait_for(d, 2)
+        d.stop()
+        self.assertEqual(slow.calls, ["1"])
+
+    def test_handler_exception_counted(self):
+        d = MQTT_Dispatcher()
+        d.start()
+        d.submit(MagicMock(side_effect=Exception("boom")), "t", "p")
+        _wait_for(d, 1)
+        d.stop()
+        m = d.get_metrics()
+        self.assertEqual(m["handled"], 1)
+        self.assertEqual(m["failed"], 1)
+        self.assertEqual(m["queue_depth"], 0)
+
+    def test_on_message_uses_dispatcher(self):
+        mqs = MQTT_Support("bridge", "rvc2mqtt")
+        r = recorder()
+        mqs.register("rvc2mqtt/bridge/d/x/set", r.handler)
+
+        msg = MagicMock()
+        msg.topic = "rvc2mqtt/bridge/d/x/set"
+        msg.payload = b"on"
+
+        # not started - handled inline
+        mqs.on_message(None, None, msg)
+        self.assertEqual(r.calls, ["on"])
+
+        mqs.dispatcher.start()
+        mqs.on_message(None, None, msg)
+        _wait_for(mqs.dispatcher, 1)
+        mqs.dispatcher.stop()
+        self.assertEqual(r.calls, ["on", "on"])
+        self.assertEqual(mqs.dispatcher.get_metrics()["enqueued"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Unit tests for the mqtt spool
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+import context  # add rvc2mqtt package to the python path using local reference
+import paho.mqtt.client as mqc
+from rvc2mqtt.mqtt_spool import MQTT_Spool
+from rvc2mqtt.mqtt import MQTT_Support, MQTT_Client
+
+
+def _wait_for_replay(spool: MQTT_Spool):
+    end = time.time() + 5
+    while spool._replay_thread.is_alive() and time.time() < end:
+        time.sleep(0.01)
+
+
+class Test_MQTT_Spool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "spool.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_latest_value_per_topic(self):
+        s = MQTT_Spool(self.path, flush_interval=60)
+        for i in range(100):
+            s.store("a", str(i))
+            s.store("b", str(i))
+        self.assertEqual(len(s), 2)
+        s.close()
+
+        # reload from disk
+        s = MQTT_Spool(self.path, replay_rate=1000)
+        published = []
+        s.start_replay(lambda t, p, q, r: published.append((t, p, r)), lambda: True)
+        _wait_for_replay(s)
+        self.assertEqual(sorted(published), [("a", b"99", True), ("b", b"99", True)])
+        self.assertEqual(len(s), 0)
+        s.close()
+
+    def test_bounded(self):
+        s = MQTT_Spool(self.path, max_topics=3)
+        for i in range(10):
+            s.store(f"t{i}", "x")
+        self.assertEqual(len(s), 3)
+        self.assertEqual(s.get_metrics()["dropped"], 7)
+        s.close()
+
+    def test_batched_flush(self):
+        s = MQTT_Spool(self.path, flush_interval=60)
+        for i in range(50):
+            s.store(f"t{i}", "x")
+        self.assertEqual(s.get_metrics()["flushes"], 0)
+        s.flush()
+        self.assertEqual(s.get_metrics()["flushes"], 1)
+        s.close()
+
+    def test_live_publish_discards_spooled(self):
+        s = MQTT_Spool(self.path, replay_rate=1000)
+        s.store("a", "old")
+        s.store("b", "old")
+        s.discard("a")
+        published = []
+        s.start_replay(lambda t, p, q, r: published.append((t, p)), lambda: True)
+        _wait_for_replay(s)
+        self.assertEqual(published, [("b", b"old")])
+        s.close()
+
+    def test_live_publish_waits_for_replay_publish(self):
+        s = MQTT_Spool(self.path, replay_rate=1000)
+        s.store("a", "old")
+        events = []
+        live = []
+
+        def live_publish(topic):
+            s.discard(topic)
+            events.append(f"live {topic}")
+
+        def replay_publish(topic, payload, qos, retain):
+            # a live publish of the same topic starts while the spooled value is being queued
+            live.append(threading.Thread(target=live_publish, args=(topic,)))
+            live[-1].start()
+            time.sleep(0.05)
+            events.append(f"replay {topic}")
+
+        s.start_replay(replay_publish, lambda: True)
+        _wait_for_replay(s)
+        live[0].join(1.0)
+        self.assertEqual(events, ["replay a", "live a"])
+        self.assertEqual(s.get_metrics()["replayed"], 1)
+        s.close()
+
+    def test_poll_flushes_after_interval(self):
+        s = MQTT_Spool(self.path, flush_interval=0.05)
+        s.store("a", "1")
+        s.poll()
+        self.assertEqual(s.get_metrics()["flushes"], 0)
+        time.sleep(0.06)
+        s.poll()
+        self.assertEqual(s.get_metrics()["flushes"], 1)
+        # on disk without close, as after a crash
+        other = MQTT_Spool(self.path)
+        self.assertEqual(len(other), 1)
+        other.close()
+        s.close()
+
+    def test_replay_stops_when_disconnected(self):
+        s = MQTT_Spool(self.path, replay_rate=1000)
+        s.store("a", "1")
+        s.start_replay(lambda t, p, q, r: None, lambda: False)
+        _wait_for_replay(s)
+        self.assertEqual(len(s), 1)
+        s.close()
+
+    def test_client_spools_retained_when_disconnected(self):
+        mqs = MQTT_Support("bridge", "rvc2mqtt")
+        c = MQTT_Client(mqs, mqc.CallbackAPIVersion.VERSION2, client_id="test", protocol=mqc.MQTTv5)
+        mqs.set_client(c)
+        s = MQTT_Spool(self.path)
+        mqs.set_spool(s)
+
+        c.publish("rvc2mqtt/bridge/d/x/state", "on", retain=True)
+        c.publish("rvc2mqtt/bridge/d/x/other", "on", retain=False)
+        c.publish(mqs.bridge_state_topic, "offline", retain=True)
+        self.assertEqual(len(s), 1)
+        s.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
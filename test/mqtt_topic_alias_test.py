@@ -0,0 +1,141 @@
+"""
+Unit tests for the mqtt topic alias support
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import threading
+import time
+import unittest
+import context  # add rvc2mqtt package to the python path using local reference
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+from rvc2mqtt.mqtt_topic_alias import MQTT_TopicAliases
+from rvc2mqtt.mqtt_fake import FakeMqttClient, make_fake_mqtt_support
+
+TOPIC = "rvc2mqtt/bridge/d/tanklevel-1ffb7-i0/state"
+
+
+def _connack(maximum: int) -> Properties:
+    p = Properties(PacketTypes.CONNACK)
+    p.TopicAliasMaximum = maximum
+    return p
+
+
+class Test_MQTT_TopicAliases(unittest.TestCase):
+
+    def test_disabled_until_connected(self):
+        ta = MQTT_TopicAliases(10)
+        for _ in range(5):
+            self.assertEqual(ta.apply(TOPIC, 0, None), (TOPIC, None))
+
+    def test_broker_without_aliases(self):
+        ta = MQTT_TopicAliases(10)
+        ta.connected(Properties(PacketTypes.CONNACK))
+        self.assertEqual(ta.maximum, 0)
+        for _ in range(5):
+            self.assertEqual(ta.apply(TOPIC, 0, None), (TOPIC, None))
+
+    def test_alias_assigned_then_used(self):
+        ta = MQTT_TopicAliases(10)
+        ta.connected(_connack(5))
+
+        # first publish - not yet frequent
+        self.assertEqual(ta.apply(TOPIC, 0, None), (TOPIC, None))
+
+        # second publish - alias set along with topic
+        (t, p) = ta.apply(TOPIC, 0, None)
+        self.assertEqual(t, TOPIC)
+        self.assertEqual(p.TopicAlias, 1)
+
+        # now only the alias
+        (t, p) = ta.apply(TOPIC, 0, None)
+        self.assertEqual(t, "")
+        self.assertEqual(p.TopicAlias, 1)
+        self.assertEqual(ta.get_metrics()["bytes_saved"], len(TOPIC))
+
+    def test_respects_broker_maximum(self):
+        ta = MQTT_TopicAliases(10)
+        ta.connected(_connack(2))
+        for i in range(4):
+            topic = TOPIC + str(i)
+            ta.apply(topic, 0, None)
+            ta.apply(topic, 0, None)
+        self.assertEqual(ta.get_metrics()["assigned"], 2)
+        self.assertEqual(ta.apply(TOPIC + "3", 0, None), (TOPIC + "3", None))
+
+    def test_respects_local_maximum(self):
+        ta = MQTT_TopicAliases(1)
+        ta.connected(_connack(100))
+        self.assertEqual(ta.maximum, 1)
+
+    def test_qos_and_properties_not_aliased(self):
+        ta = MQTT_TopicAliases(10)
+        ta.connected(_connack(5))
+        for _ in range(3):
+            self.assertEqual(ta.apply(TOPIC, 1, None), (TOPIC, None))
+        props = Properties(PacketTypes.PUBLISH)
+        for _ in range(3):
+            self.assertEqual(ta.apply(TOPIC, 0, props), (TOPIC, props))
+
+    def test_reconnect_reassigns(self):
+        ta = MQTT_TopicAliases(10)
+        ta.connected(_connack(5))
+        for _ in range(3):
+            ta.apply(TOPIC, 0, None)
+
+        ta.disconnected()
+        self.assertEqual(ta.apply(TOPIC, 0, None), (TOPIC, None))
+
+        ta.connected(_connack(5))
+        ta.apply(TOPIC, 0, None)
+        # full topic must be sent again on the new connection
+        (t, p) = ta.apply(TOPIC, 0, None)
+        self.assertEqual(t, TOPIC)
+        self.assertEqual(p.TopicAlias, 1)
+
+
+class _SlowFirstAliasClient(FakeMqttClient):
+    """ takes a while to queue the packet that introduces an alias """
+
+    def _deliver_publish(self, topic, payload, qos, retain, properties):
+        if topic and properties is not None:
+            time.sleep(0.05)
+        return super()._deliver_publish(topic, payload, qos, retain, properties)
+
+
+class Test_MQTT_Client_Aliases(unittest.TestCase):
+
+    def test_full_topic_queued_first_across_threads(self):
+        support = make_fake_mqtt_support()
+        client = _SlowFirstAliasClient(support)
+        support.set_client(client)
+        support.topic_aliases.local_maximum = 5
+        support.topic_aliases.connected(_connack(5))
+        client.publish(TOPIC, "1")
+
+        first = threading.Thread(target=client.publish, args=(TOPIC, "2"))
+        first.start()
+        time.sleep(0.01)
+        client.publish(TOPIC, "3")      # another thread publishing the same topic
+        first.join()
+
+        aliased = [p for p in client.messages() if p.properties is not None]
+        self.assertEqual([(p.topic, p.payload) for p in aliased], [(TOPIC, b"2"), ("", b"3")])
+
+
+if __name__ == '__main__':
+    unittest.main()
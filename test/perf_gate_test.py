@@ -0,0 +1,40 @@
+"""
+Performance regression gate.  Opt in with RVC2MQTT_PERF_GATE=1
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import os
+import unittest
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.benchmark import gate
+
+
+@unittest.skipUnless(os.environ.get("RVC2MQTT_PERF_GATE"), "set RVC2MQTT_PERF_GATE=1 to run the performance gate")
+class Test_PerfGate(unittest.TestCase):
+
+    def test_no_regression(self):
+        baseline = gate.load_baseline()
+        if baseline.get("python_version") != gate.python_version():
+            self.skipTest(f"baseline was recorded on python {baseline.get('python_version')}")
+        results = gate.compare(gate.measure(), baseline)
+        regressed = [r for r in results if r["regressed"]]
+        self.assertEqual(regressed, [], "\n" + gate.format_comparison(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
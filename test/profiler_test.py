@@ -0,0 +1,155 @@
+"""
+Unit tests for the on demand profiler
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.mqtt import MQTT_Support
+from rvc2mqtt.profiler import ProfilerControl, SamplingProfiler
+from rvc2mqtt.entity.temperature import TemperatureSensor_THERMOSTAT_AMBIENT_STATUS as TemperatureSensor
+
+
+def _make_support():
+    mqs = MQTT_Support("bridge", "rvc2mqtt")
+    mqs.client = MagicMock()
+    return mqs
+
+
+def _busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class Test_Profiler(unittest.TestCase):
+
+    def test_registers_admin_topic(self):
+        mqs = _make_support()
+        p = ProfilerControl(mqs)
+        self.assertEqual(p.command_topic, "rvc2mqtt/bridge/admin/profiler/set")
+        self.assertIn(p.command_topic, mqs.registered_mqtt_devices)
+
+    def test_invalid_commands_ignored(self):
+        p = ProfilerControl(_make_support())
+        for payload in ("", "go", "start bogus", "start sample abc"):
+            p.process_mqtt_msg(p.command_topic, payload)
+            p.poll()
+            self.assertFalse(p.running)
+
+    def test_cprofile_start_stop(self):
+        mqs = _make_support()
+        with tempfile.TemporaryDirectory() as tmp:
+            p = ProfilerControl(mqs, tmp)
+            p.process_mqtt_msg(p.command_topic, "start cprofile 30")
+            self.assertFalse(p.running)  # only started from the main loop
+            p.poll()
+            self.assertTrue(p.running)
+            mqs2 = MagicMock()
+            mqs2.make_device_topic_string.return_value = 't'
+            t = TemperatureSensor({'instance': 1, 'instance_name': "t"}, mqs2)
+            for i in range(100):
+                t.process_rvc_msg({"name": "THERMOSTAT_AMBIENT_STATUS", "instance": 1, "ambient_temp": i})
+            p.process_mqtt_msg(p.command_topic, "stop")
+            p.poll()
+            self.assertFalse(p.running)
+
+            report = p.last_report
+            self.assertEqual(report["mode"], "cprofile")
+            self.assertIn("temperature", report["by_entity_module_s"])
+            self.assertIn("entity_rvc", report["by_stage_cumulative_s"])
+            files = os.listdir(tmp)
+            self.assertEqual(len([f for f in files if f.endswith(".prof")]), 1)
+            self.assertEqual(len([f for f in files if f.endswith(".json")]), 1)
+
+        topics = [c.args[0] for c in mqs.client.publish.call_args_list]
+        self.assertIn(p.report_topic, topics)
+        json.loads(mqs.client.publish.call_args_list[-2].args[1])
+
+    def test_duration_auto_stop(self):
+        p = ProfilerControl(_make_support())
+        p.start("sample", 1)
+        p._stop_time = time.monotonic() - 1
+        p.poll()
+        self.assertFalse(p.running)
+        self.assertEqual(p.last_report["mode"], "sample")
+
+    def test_sampler_classifies(self):
+        s = SamplingProfiler()
+        mqs = MagicMock()
+        mqs.make_device_topic_string.return_value = 't'
+        t = TemperatureSensor({'instance': 1, 'instance_name': "t"}, mqs)
+
+        def publish(*args, **kwargs):
+            s.sample_frame(sys._getframe())
+        mqs.client.publish.side_effect = publish
+        t.process_rvc_msg({"name": "THERMOSTAT_AMBIENT_STATUS", "instance": 1, "ambient_temp": 20})
+
+        r = s.report()
+        self.assertEqual(r["samples"], 1)
+        self.assertEqual(r["by_stage_pct"], {"mqtt_publish": 100.0})
+        self.assertEqual(r["by_entity_pct"], {"TemperatureSensor_THERMOSTAT_AMBIENT_STATUS": 100.0})
+
+    def test_sampler_thread(self):
+        s = SamplingProfiler(0.001)
+        s.start()
+        _busy(0.1)
+        r = s.stop()
+        self.assertGreater(r["samples"], 0)
+
+    def test_sampler_one_thread(self):
+        s = SamplingProfiler(0.001, threading.get_ident())
+        s.start()
+        _busy(0.1)
+        r = s.stop()
+        self.assertGreater(r["samples"], 0)
+        self.assertIn("profiler_test.py:_busy", [f for (f, pct) in r["top_functions_pct"]])
+
+    def test_sampler_skips_idle_thread(self):
+        stop = threading.Event()
+        t = threading.Thread(target=stop.wait, daemon=True)
+        t.start()
+        s = SamplingProfiler(0.001, t.ident)
+        s.start()
+        time.sleep(0.1)
+        r = s.stop()
+        stop.set()
+        t.join()
+        self.assertEqual(r["samples"], 0)
+        self.assertGreater(r["idle_samples"], 0)
+
+    def test_sample_command_defaults_to_main_loop(self):
+        p = ProfilerControl(_make_support())
+        p.process_mqtt_msg(p.command_topic, "start sample 5")
+        p.poll()
+        self.assertEqual(p._profiler.thread_ident, threading.get_ident())
+        p.stop()
+        p.process_mqtt_msg(p.command_topic, "start sample 5 all")
+        p.poll()
+        self.assertIsNone(p._profiler.thread_ident)
+        p.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
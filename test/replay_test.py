@@ -0,0 +1,134 @@
+"""
+Unit tests for log replay and the fake mqtt client
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+import can
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.app import app
+from rvc2mqtt.bus_capture import CaptureWriter
+from rvc2mqtt.mqtt_fake import make_fake_mqtt_support
+from rvc2mqtt.replay import Replay, open_log, format_report
+from rvc2mqtt.entity.temperature import TemperatureSensor_THERMOSTAT_AMBIENT_STATUS as TemperatureSensor
+
+# THERMOSTAT_AMBIENT_STATUS (1FF9C) from source 0x80
+AMBIENT_ID = (6 << 26) | (0x1FF9C << 8) | 0x80
+FLOORPLAN = [{"name": "THERMOSTAT_AMBIENT_STATUS", "type": "temperature",
+              "instance": 1, "instance_name": "bedroom temperature"}]
+
+
+def _ambient_frame(timestamp: float, instance: int, celsius: float) -> can.Message:
+    raw = int((celsius + 273) / 0.03125)
+    return can.Message(timestamp=timestamp, arbitration_id=AMBIENT_ID, is_extended_id=True,
+                       data=bytes([instance, raw & 0xFF, raw >> 8, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]))
+
+
+def _write_log(path: str, messages: list):
+    writer = can.CanutilsLogWriter(path, channel="can0")
+    for m in messages:
+        writer.on_message_received(m)
+    writer.stop()
+
+
+def _make_bridge() -> app:
+    bridge = app()
+    bridge.init_pipeline()
+    bridge.mqtt_client = make_fake_mqtt_support("bridge", "rvc2mqtt")
+    bridge.mqtt_client.set_metrics(bridge.metrics)
+    bridge.mqtt_client.set_latency_tracer(bridge.latency_tracer)
+    bridge.load_entities(FLOORPLAN, [], [(TemperatureSensor.FACTORY_MATCH_ATTRIBUTES, TemperatureSensor)])
+    return bridge
+
+
+class Test_FakeMqttClient(unittest.TestCase):
+
+    def test_records_publish(self):
+        support = make_fake_mqtt_support("bridge", "rvc2mqtt")
+        client = support.client
+        self.assertEqual(client.last_payload(support.bridge_state_topic), "online")
+        info = client.publish("rvc2mqtt/bridge/d/x/state", 12, retain=True)
+        self.assertEqual(info.rc, 0)
+        p = client.messages("rvc2mqtt/bridge/d/x/state")[0]
+        self.assertEqual(p.payload, b"12")
+        self.assertTrue(p.retain)
+
+    def test_inject_runs_handler(self):
+        support = make_fake_mqtt_support("bridge", "rvc2mqtt")
+        received = []
+        support.register("rvc2mqtt/bridge/d/x/set", lambda topic, payload, properties=None: received.append(payload))
+        self.assertIn("rvc2mqtt/bridge/d/x/set", support.client.subscriptions)
+        support.client.inject("rvc2mqtt/bridge/d/x/set", "on")
+        self.assertEqual(received, ["on"])
+
+
+class Test_Replay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.tmp.name, "bus.log")
+        t = 1600000000.0
+        _write_log(self.log, [_ambient_frame(t, 1, 20.0),
+                              _ambient_frame(t + 0.1, 1, 20.0),
+                              _ambient_frame(t + 0.2, 1, 22.0),
+                              _ambient_frame(t + 0.3, 2, 18.0)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_max_speed(self):
+        bridge = _make_bridge()
+        report = Replay(bridge, speed=0).run(open_log(self.log))
+
+        self.assertEqual(report["frames"], 4)
+        self.assertEqual(report["decoded"], 4)
+        self.assertEqual(report["dispatched"], 3)
+        self.assertEqual(report["unhandled"], 1)
+        self.assertGreater(report["frames_per_sec"], 0)
+        self.assertEqual(report["latency"]["can_to_publish_latency"]["count"], 2)
+
+        entity = bridge.entity_list[0]
+        payloads = [json.loads(p.payload) for p in bridge.mqtt_client.client.messages(entity.status_topic)]
+        self.assertEqual([p["c"] for p in payloads], [20.0, 22.0])
+
+    def test_paced_by_log_time(self):
+        bridge = _make_bridge()
+        start = time.perf_counter()
+        report = Replay(bridge, speed=2).run(open_log(self.log))
+        self.assertGreaterEqual(time.perf_counter() - start, 0.14)
+        self.assertAlmostEqual(report["log_duration_s"], 0.3, places=2)
+
+    def test_capture_and_report(self):
+        capture_dir = os.path.join(self.tmp.name, "capture")
+        writer = CaptureWriter(capture_dir)
+        for m in open_log(self.log):
+            writer.record_message(m)
+        writer.close()
+
+        bridge = _make_bridge()
+        report = Replay(bridge, speed=0).run(open_log(capture_dir))
+        self.assertEqual(report["frames"], 4)
+        self.assertIn("Replayed 4 frames", format_report(report))
+
+
+if __name__ == '__main__':
+    unittest.main()
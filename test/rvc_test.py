@@ -95,6 +95,33 @@ class Test_RVC_Decoder(unittest.TestCase):
         # source address default is 0x82  
         self.assertEqual(arbitration_id, int("19FFBC82", 16))
 
+    def test_encode_round_trip(self):
+        rvc = RVC_Decoder()
+        rvc.load_rvc_spec(rvc_spec_file_path)
+        for (arbid, data) in (("19ffe259", "0215C84724472400"), ("19fff780", "0100000000000000"),
+                              ("19feca80", "0540FFFFFFFFFFFF"), ("19fffd42", "01786401E0FD1F00")):
+            decoded = rvc.rvc_decode(int(arbid, 16), data)
+            encoded = rvc.rvc_encode(decoded["name"], decoded)
+            self.assertEqual(rvc.rvc_decode(int(arbid, 16), encoded), dict(decoded, data=encoded))
+
+    def test_encode_values(self):
+        rvc = RVC_Decoder()
+        rvc.load_rvc_spec(rvc_spec_file_path)
+        self.assertEqual(rvc.find_dgn("TANK_STATUS"), "1FFB7")
+        data = rvc.rvc_encode("THERMOSTAT_AMBIENT_STATUS", {"instance": 2, "ambient_temp": 20.0})
+        self.assertEqual(data, "02A024FFFFFFFFFF")
+        result = rvc.rvc_decode(0x19FF9C80, data)
+        self.assertEqual(result["ambient_temp"], 20.0)
+
+        # bit fields take binary strings like the decoder returns
+        data = rvc.rvc_encode("1FFE2", {"instance": 1, "operating_mode": "0010", "fan_mode": "01"})
+        result = rvc.rvc_decode(0x19FFE280, data)
+        self.assertEqual(result["operating_mode_definition"], "heat")
+        self.assertEqual(result["fan_mode_definition"], "on")
+
+        with self.assertRaises(Exception):
+            rvc.rvc_encode("NOT_A_MESSAGE", {})
+
     # -------------------
     # Test Byte Function
     # -------------------
@@ -0,0 +1,118 @@
+"""
+Unit tests for the synthetic traffic generator and simulator
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import os
+import queue
+import time
+import unittest
+import can
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.rvc import RVC_Decoder
+from rvc2mqtt.can_support import CAN_Watcher
+from rvc2mqtt.simulator import TrafficGenerator, TrafficSimulator, DEVICE_TYPES
+
+rvc_spec_file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'rvc2mqtt', 'rvc-spec.yml'))
+
+
+def _decoder() -> RVC_Decoder:
+    rvc = RVC_Decoder()
+    rvc.load_rvc_spec(rvc_spec_file_path)
+    return rvc
+
+
+class Test_TrafficGenerator(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.rvc = _decoder()
+
+    def test_every_device_type_decodes(self):
+        devices = [{"type": t, "instance": 1} for t in DEVICE_TYPES]
+        gen = TrafficGenerator(self.rvc, devices, change_probability=1.0, seed=1)
+        names = set()
+        for m in gen.frames(duration=10):
+            result = self.rvc.rvc_decode(m.arbitration_id, m.data.hex().upper())
+            self.assertFalse(result["name"].startswith("UNKNOWN"))
+            names.add(result["name"])
+        expected = {name for t in DEVICE_TYPES.values() for (name, _, _) in t["messages"]}
+        self.assertEqual(names, expected)
+
+    def test_values_in_range(self):
+        gen = TrafficGenerator(self.rvc, [{"type": "thermostat", "instance": 3, "source_id": "9E"}],
+                               change_probability=1.0, seed=2)
+        for m in gen.frames(duration=30):
+            result = self.rvc.rvc_decode(m.arbitration_id, m.data.hex().upper())
+            self.assertEqual(result["instance"], 3)
+            self.assertEqual(result["source_id"], "9E")
+            if result["name"] == "THERMOSTAT_AMBIENT_STATUS":
+                self.assertTrue(10.0 <= result["ambient_temp"] <= 32.0)
+
+    def test_rate_and_ordering(self):
+        gen = TrafficGenerator(self.rvc, [{"type": "dc_source", "instance": 1}], rate_scale=2.0, seed=3)
+        self.assertAlmostEqual(gen.frames_per_second(), (2 + 0.2 + 0.2) * 2)
+        frames = list(gen.frames(duration=100))
+        self.assertAlmostEqual(len(frames) / 100, gen.frames_per_second(), delta=0.2)
+        timestamps = [m.timestamp for m in frames]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_no_change(self):
+        gen = TrafficGenerator(self.rvc, [{"type": "tank", "instance": 0}], change_probability=0.0, seed=4)
+        payloads = {bytes(m.data) for m in gen.frames(duration=60)}
+        self.assertEqual(len(payloads), 1)
+
+    def test_bursts_and_malformed(self):
+        gen = TrafficGenerator(self.rvc, [{"type": "tank", "instance": 0}], burst_interval=10, burst_size=50,
+                               malformed_probability=0.5, seed=5)
+        frames = list(gen.frames(duration=25))
+        # 5 regular frames and 2 bursts
+        self.assertEqual(len(frames), 5 + 100)
+        self.assertGreater(gen.malformed_count, 0)
+        self.assertTrue(any(len(m.data) < 8 for m in frames) or
+                        any(((m.arbitration_id >> 8) & 0x1FFFF) == 0x1FF00 for m in frames))
+
+
+class Test_TrafficSimulator(unittest.TestCase):
+
+    def test_can_watcher_receives(self):
+        rx = queue.Queue()
+        watcher = CAN_Watcher("simulator_test", rx, queue.Queue(), bustype="virtual")
+        watcher.start()
+        bus = can.Bus(channel="simulator_test", interface="virtual")
+        try:
+            gen = TrafficGenerator(_decoder(), [{"type": "dc_source", "instance": 1}], rate_scale=20, seed=6)
+            sim = TrafficSimulator(gen, bus, duration=0.5)
+            sim.start()
+            sim.join(5)
+            self.assertFalse(sim.is_alive())
+            self.assertGreater(sim.sent, 0)
+            end = time.monotonic() + 2
+            while rx.qsize() < sim.sent and time.monotonic() < end:
+                time.sleep(0.01)
+            self.assertEqual(rx.qsize(), sim.sent)
+            self.assertEqual(watcher.metrics.get_count("can_rx_frames"), sim.sent)
+        finally:
+            watcher.kill_received = True
+            watcher.join(2)
+            watcher.bus.shutdown()
+            bus.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
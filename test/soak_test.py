@@ -0,0 +1,160 @@
+"""
+Unit tests for the soak harness
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+import can
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.app import app
+from rvc2mqtt.mqtt_fake import make_fake_mqtt_support
+from rvc2mqtt.simulator import TrafficGenerator
+from rvc2mqtt.soak import (MemorySampler, Soak, find_growth, format_report, has_growth, looped_log, main,
+                           suspect_gauges, terminal_frames, traffic, TERMINAL_TEXT, _offline_mqtt_support)
+from rvc2mqtt.entity.temperature import TemperatureSensor_THERMOSTAT_AMBIENT_STATUS as TemperatureSensor
+from rvc2mqtt.entity.tank_level_sensor import TankLevelSensor_TANK_STATUS as TankLevelSensor
+
+FLOORPLAN = [{"name": "THERMOSTAT_AMBIENT_STATUS", "type": "temperature", "instance": 0,
+              "instance_name": "front temperature"},
+             {"name": "TANK_STATUS", "type": "tank_level", "instance": 0, "instance_name": "fresh water"}]
+DEVICES = [{"type": "thermostat", "instance": 0}, {"type": "tank", "instance": 0}]
+
+
+def _make_bridge(offline: bool = False) -> app:
+    bridge = app()
+    bridge.init_pipeline()
+    if offline:
+        bridge.mqtt_client = _offline_mqtt_support("soak", "rvc2mqtt")
+    else:
+        bridge.mqtt_client = make_fake_mqtt_support("soak", "rvc2mqtt", keep=10)
+    bridge.mqtt_client.set_metrics(bridge.metrics)
+    bridge.mqtt_client.set_latency_tracer(bridge.latency_tracer)
+    bridge.load_entities([dict(e) for e in FLOORPLAN], [],
+                         [(TemperatureSensor.FACTORY_MATCH_ATTRIBUTES, TemperatureSensor),
+                          (TankLevelSensor.FACTORY_MATCH_ATTRIBUTES, TankLevelSensor)])
+    return bridge
+
+
+class Test_FindGrowth(unittest.TestCase):
+
+    def test_growth(self):
+        times = [0, 3600, 7200, 10800, 14400]
+        g = find_growth(times, [100, 200, 200, 300, 500], 100)
+        self.assertEqual(g["growth"], 400)
+        self.assertEqual(g["per_hour"], 100.0)
+        self.assertEqual(g["increasing_steps"], 3)
+
+    def test_no_growth(self):
+        times = [0, 1, 2, 3, 4]
+        self.assertIsNone(find_growth(times, [100, 300, 100, 300, 100], 10))     # noise
+        self.assertIsNone(find_growth(times, [100, 101, 102, 103, 104], 10))     # too small
+        self.assertIsNone(find_growth(times, [500, 400, 300, 200, 600], 10))     # not monotonic
+        self.assertIsNone(find_growth(times[:2], [0, 1000], 10))                 # too few samples
+
+
+class Test_MemorySampler(unittest.TestCase):
+
+    def test_flags_leak(self):
+        leak = []
+        sampler = MemorySampler({"leak_items": lambda: len(leak), "flat": lambda: 3})
+        sampler.start()
+        try:
+            for n in range(6):
+                sampler.sample(n * 600.0)
+                leak.extend(bytes(1024) for _ in range(64))
+        finally:
+            sampler.stop()
+        self.assertEqual(len(sampler.samples), 6)
+        growth = sampler.growth(warmup=1, min_site_bytes=16 * 1024, min_gauge=100)
+        self.assertTrue(has_growth(growth))
+        self.assertEqual([g["gauge"] for g in growth["gauges"]], ["leak_items"])
+        self.assertTrue(any(g["site"].startswith(__file__.rstrip("c")) for g in growth["sites"]))
+
+
+class Test_Traffic(unittest.TestCase):
+
+    def test_looped_log(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "loop.log")
+            writer = can.CanutilsLogWriter(path, channel="can0")
+            for n in range(3):
+                writer.on_message_received(can.Message(timestamp=1000.0 + n * 0.5, arbitration_id=0x19FFB780 + n,
+                                                       is_extended_id=True, data=bytes(8)))
+            writer.stop()
+            frames = list(looped_log(path, 5.0, gap=1.0))
+        # 1 second of log plus 1 second gap.  Loops start at 0, 2 and 4
+        self.assertEqual([round(m.timestamp, 3) for m in frames], [0, 0.5, 1, 2, 2.5, 3, 4, 4.5])
+
+    def test_terminal_frames(self):
+        frames = list(terminal_frames("42", 60.0, 200.0))
+        lines = len(frames) // ((len(TERMINAL_TEXT) + 7) // 8)
+        self.assertEqual(lines, 3)
+        bridge = _make_bridge()
+        decoded = [bridge.rvc_decoder.rvc_decode(m.arbitration_id, m.data.hex().upper()) for m in frames]
+        self.assertEqual({d["name"] for d in decoded}, {"TERMINAL"})
+        self.assertEqual({d["source_id"] for d in decoded}, {"42"})
+        text = bytes.fromhex("".join(d["data"] for d in decoded[:len(frames) // lines])).decode()
+        self.assertEqual(text.rstrip(" "), TERMINAL_TEXT)
+
+
+class Test_Soak(unittest.TestCase):
+
+    def test_run(self):
+        bridge = _make_bridge()
+        generator = TrafficGenerator(bridge.rvc_decoder, DEVICES, seed=1)
+        soak = Soak(bridge, sample_interval=60.0)
+        report = soak.run(traffic(generator, 600.0, terminal_source="42", terminal_period=60.0))
+        json.dumps(report, default=str)
+        self.assertEqual(len(report["samples"]), 11)
+        self.assertGreater(report["replay"]["frames"], 800)
+        self.assertGreater(report["replay"]["mqtt_published"], 0)
+        self.assertEqual(report["growth"]["gauges"], [])
+        self.assertIn("rx_queue", report["samples"][-1]["gauges"])
+        self.assertIn("samples", format_report(report))
+
+    def test_offline_gauges(self):
+        bridge = _make_bridge(offline=True)
+        gauges = suspect_gauges(bridge)
+        self.assertFalse(bridge.mqtt_client.is_connected())
+        # paho keeps qos 1 publishes while not connected
+        for n in range(5):
+            bridge.mqtt_client.client.publish("rvc2mqtt/soak/d/x/state", str(n), qos=1)
+        self.assertEqual(gauges["mqtt_out_messages"](), 5)
+
+    def test_main_default_coach(self):
+        # every entity in the default floorplan gets traffic from the simulator's default coach
+        with tempfile.TemporaryDirectory() as tmp:
+            report_file = os.path.join(tmp, "soak.json")
+            with contextlib.redirect_stdout(io.StringIO()):
+                rc = main(["--hours", "0.002", "--sample_interval", "2", "--report", report_file])
+            with open(report_file, "r") as f:
+                report = json.load(f)
+        self.assertEqual(rc, 0)
+        self.assertEqual(report["replay"]["decode_failed"], 0)
+        handled = {e["entity"]: e["rvc_handled"] for e in report["replay"]["entity_cpu"]}
+        self.assertGreater(handled["solar-charge-controller-1FEB3-i1"], 0)
+        self.assertGreater(handled["aps-500-i1"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -36,6 +36,29 @@ class Test_SolarController(unittest.TestCase):
         l = SolarController({'instance': 2, 'instance_name': "test solar controller chassis battery", 'type': 'solar', 'status_topic': 'rvc/state/solar'}, mock)
         self.assertTrue(type(l), SolarController)
 
+    def test_default_topics(self):
+        # without a status_topic every topic comes from make_device_topic_string
+        mock = MagicMock()
+        mock.make_device_topic_string.side_effect = lambda id, name, state: f"{id}/{name}"
+
+        l = SolarController({'instance': 1, 'instance_name': "test solar controller", 'type': 'solar'}, mock)
+        self.assertTrue(l.process_rvc_msg({'name': "SOLAR_CONTROLLER_SOLAR_ARRAY_STATUS", 'instance': 1,
+                                           'solar_array_measured_voltage': 20.0,
+                                           'solar_array_measured_current': 5.0}))
+        self.assertTrue(l.process_rvc_msg({'name': "SOLAR_CONTROLLER_BATTERY_STATUS", 'instance': 1,
+                                           'measured_voltage': 13.0, 'measured_current': 2.0,
+                                           'measured_temperature': 25}))
+
+        published = {c.args[0]: c.args[1] for c in mock.client.publish.call_args_list}
+        self.assertEqual(published, {
+            "solar-charge-controller-1FEB3-i1/solar-array-voltage": 20.0,
+            "solar-charge-controller-1FEB3-i1/solar-array-current": 5.0,
+            "solar-charge-controller-1FEB3-i1/solar-array-power": "100.0",
+            "solar-charge-controller-1FEB3-i1/battery-voltage": 13.0,
+            "solar-charge-controller-1FEB3-i1/battery-current": 2.0,
+            "solar-charge-controller-1FEB3-i1/battery-temperature": 25,
+            "solar-charge-controller-1FEB3-i1/battery-power": "26.0"})
+
 
 if __name__ == '__main__':
     unittest.main()
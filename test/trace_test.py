@@ -0,0 +1,67 @@
+"""
+Unit tests for the hot path tracer
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import logging
+import unittest
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.trace import Tracer, refresh_tracers
+
+
+class _NoStr(dict):
+    """ fails if formatted """
+    def __str__(self):
+        raise AssertionError("formatted")
+    __repr__ = __str__
+
+
+class Test_Tracer(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("test_trace")
+        self.logger.propagate = False
+        self.logger.handlers = []
+        self.logger.setLevel(logging.INFO)
+
+    def test_disabled_does_not_format(self):
+        t = Tracer("test_trace")
+        self.assertFalse(t.enabled)
+        t.trace("%s", _NoStr(a=1))
+
+    def test_refresh_after_config_change(self):
+        t = Tracer("test_trace")
+        self.assertFalse(t.enabled)
+        self.logger.setLevel(logging.DEBUG)
+        self.assertFalse(t.enabled)   # cached until refreshed
+        refresh_tracers()
+        self.assertTrue(t.enabled)
+        with self.assertLogs("test_trace", logging.DEBUG) as cm:
+            t.trace("Msg %s", {"name": "DC_DIMMER_STATUS_3"})
+        self.assertEqual(cm.records[0].getMessage(), "Msg {'name': 'DC_DIMMER_STATUS_3'}")
+
+    def test_sampling(self):
+        self.logger.setLevel(logging.DEBUG)
+        t = Tracer("test_trace", sample_every=10)
+        with self.assertLogs("test_trace", logging.DEBUG) as cm:
+            for i in range(35):
+                t.trace("%d", i)
+        self.assertEqual([r.getMessage() for r in cm.records], ["9", "19", "29"])
+
+
+if __name__ == '__main__':
+    unittest.main()
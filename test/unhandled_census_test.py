@@ -0,0 +1,97 @@
+"""
+Unit tests for the census of unhandled messages
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import json
+import unittest
+from unittest.mock import MagicMock
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.mqtt import MQTT_Support
+from rvc2mqtt.unhandled_census import UnhandledCensus, UnhandledCensusControl
+from rvc2mqtt.entity.temperature import TemperatureSensor_THERMOSTAT_AMBIENT_STATUS as TemperatureSensor
+
+
+def _msg(dgn: str, name: str, instance, source_id: str, **kwargs) -> dict:
+    m = {"dgn": dgn, "name": name, "source_id": source_id}
+    if instance is not None:
+        m["instance"] = instance
+    m.update(kwargs)
+    return m
+
+
+class Test_UnhandledCensus(unittest.TestCase):
+
+    def test_counts_by_key(self):
+        c = UnhandledCensus()
+        self.assertTrue(c.record(_msg("1FF9C", "THERMOSTAT_AMBIENT_STATUS", 1, "9E", ambient_temp=20)))
+        for i in range(4):
+            self.assertFalse(c.record(_msg("1FF9C", "THERMOSTAT_AMBIENT_STATUS", 1, "9E", ambient_temp=21 + i)))
+        self.assertTrue(c.record(_msg("1FF9C", "THERMOSTAT_AMBIENT_STATUS", 2, "9E")))
+        self.assertTrue(c.record(_msg("1FFFF", "DATE_TIME_STATUS", None, "80")))
+
+        self.assertEqual(c.totals(), (3, 7))
+        r = c.report()
+        self.assertEqual(r[0]["count"], 5)
+        self.assertEqual(r[0]["instance"], 1)
+        self.assertEqual(r[0]["sample"]["ambient_temp"], 24)
+
+    def test_max_entries(self):
+        c = UnhandledCensus(max_entries=2)
+        for i in range(5):
+            c.record(_msg("1FF9C", "X", i, "9E"))
+        self.assertEqual(c.totals(), (2, 2))
+        self.assertEqual(c.dropped, 3)
+
+    def test_floorplan_stubs(self):
+        c = UnhandledCensus()
+        for i in range(10):
+            c.record(_msg("1FF9C", "THERMOSTAT_AMBIENT_STATUS", 1, "9E"))
+            c.record(_msg("1FFFF", "DATE_TIME_STATUS", None, "80"))
+        c.record(_msg("1FF9C", "THERMOSTAT_AMBIENT_STATUS", 2, "9E"))
+        factory = [(TemperatureSensor.FACTORY_MATCH_ATTRIBUTES, TemperatureSensor)]
+        self.assertEqual(c.floorplan_stubs(factory, min_count=5),
+                         [{"name": "THERMOSTAT_AMBIENT_STATUS", "type": "temperature", "instance": 1,
+                           "instance_name": "thermostat_ambient_status 1"}])
+
+
+class Test_UnhandledCensusControl(unittest.TestCase):
+
+    def test_report_on_request(self):
+        mqs = MQTT_Support("bridge", "rvc2mqtt")
+        mqs.client = MagicMock()
+        c = UnhandledCensus()
+        c.record(_msg("1FF9C", "THERMOSTAT_AMBIENT_STATUS", 1, "9E"))
+        control = UnhandledCensusControl(c, mqs, interval=0)
+        self.assertIn("rvc2mqtt/bridge/admin/unhandled/set", mqs.registered_mqtt_devices)
+
+        control.poll()
+        mqs.client.publish.assert_not_called()
+
+        control.process_mqtt_msg(control.command_topic, "report")
+        control.poll()
+        (topic, payload), kwargs = mqs.client.publish.call_args
+        self.assertEqual(topic, "rvc2mqtt/bridge/admin/unhandled")
+        self.assertEqual(json.loads(payload)["total"], 1)
+
+        control.process_mqtt_msg(control.command_topic, "reset")
+        control.poll()
+        self.assertEqual(json.loads(mqs.client.publish.call_args.args[1])["total"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
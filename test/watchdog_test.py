@@ -0,0 +1,89 @@
+"""
+Unit tests for loop lag measurement and the stall watchdog
+
+Copyright 2022 Sean Brogan
+SPDX-License-Identifier: Apache-2.0
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+"""
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+import context  # add rvc2mqtt package to the python path using local reference
+from rvc2mqtt.metrics import Metrics
+from rvc2mqtt.watchdog import LoopMonitor, StallWatchdog, sd_notify
+
+
+class Test_LoopMonitor(unittest.TestCase):
+
+    @patch("rvc2mqtt.watchdog.time.monotonic")
+    def test_lag(self, monotonic):
+        m = Metrics()
+        lm = LoopMonitor("main_loop", m, 0.001)
+        for t in (10.0, 10.001, 10.002, 10.502):
+            monotonic.return_value = t
+            lm.tick()
+        h = m.histogram("main_loop_lag")
+        self.assertEqual(h.count, 3)
+        self.assertAlmostEqual(h.max, 0.499, places=6)
+        self.assertEqual(lm.thread_id, threading.get_ident())
+
+
+class Test_StallWatchdog(unittest.TestCase):
+
+    @patch("rvc2mqtt.watchdog.time.monotonic")
+    def test_stall_reported_once(self, monotonic):
+        m = Metrics()
+        lm = LoopMonitor("main_loop", m, 0.001)
+        wd = StallWatchdog([lm], m, stall_timeout=5)
+
+        monotonic.return_value = 100.0
+        self.assertTrue(wd.check())   # never ticked
+        lm.tick()
+        monotonic.return_value = 104.0
+        self.assertTrue(wd.check())
+
+        monotonic.return_value = 106.0
+        with self.assertLogs("rvc2mqtt.watchdog", "ERROR") as cm:
+            self.assertFalse(wd.check())
+            self.assertFalse(wd.check())
+        self.assertEqual(len(cm.records), 1)
+        self.assertIn("test_stall_reported_once", cm.output[0])   # stack of the stalled thread
+        self.assertEqual(m.get_count("loop_stalls", "main_loop"), 1)
+        self.assertEqual(m.snapshot()["watchdog"]["stalled"], ["main_loop"])
+
+        lm.tick()
+        self.assertTrue(wd.check())
+        self.assertEqual(wd.stalled, set())
+
+    def test_sd_notify(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "notify")
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as s:
+                s.bind(path)
+                with patch.dict(os.environ, {"NOTIFY_SOCKET": path, "WATCHDOG_USEC": "2000000"}):
+                    self.assertTrue(sd_notify("WATCHDOG=1"))
+                    wd = StallWatchdog([], Metrics(), stall_timeout=10)
+                self.assertEqual(s.recv(64), b"WATCHDOG=1")
+                self.assertEqual(wd.systemd_interval, 1.0)
+
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertFalse(sd_notify("READY=1"))
+
+
+if __name__ == '__main__':
+    unittest.main()